@@ -89,7 +89,7 @@ class BookingAdmin(admin.ModelAdmin):
     status_badge.short_description = 'Статус'
 
     def partners_count(self, obj):
-        return obj.partners.count()
+        return obj.participants_count - 1
     partners_count.short_description = 'Партнёров'
 
     def total_price_display(self, obj):
@@ -7,12 +7,13 @@ from django.shortcuts import render, get_object_or_404
 from django.contrib.admin.views.decorators import staff_member_required
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
+from django.db import IntegrityError
 from django.utils import timezone
-from django.db.models import Q
 from datetime import datetime, timedelta
 import json
 
 from .models import Booking, Court, BookingHistory
+from .utils import has_time_conflict
 from django.contrib.auth.models import User
 
 
@@ -108,7 +109,7 @@ def bookings_list_api(request):
                     'status': booking.status,
                     'total_price': str(booking.total_price),
                     'coach_name': booking.coach.get_full_name() if booking.coach else None,
-                    'partners_count': booking.partners.count(),
+                    'partners_count': booking.participants_count - 1,
                 }
             }
             events.append(event)
@@ -151,15 +152,7 @@ def booking_quick_create_api(request):
         end_time = datetime.strptime(data['end_time'], '%H:%M').time()
 
         # Проверка пересечений
-        overlapping = Booking.objects.filter(
-            court=court,
-            date=booking_date,
-            status__in=['pending', 'confirmed']
-        ).filter(
-            Q(start_time__lt=end_time, end_time__gt=start_time)
-        )
-
-        if overlapping.exists():
+        if has_time_conflict(court, booking_date, start_time, end_time):
             return JsonResponse({
                 'error': 'Это время уже занято'
             }, status=400)
@@ -197,6 +190,10 @@ def booking_quick_create_api(request):
             'message': 'Бронирование создано'
         })
 
+    except IntegrityError:
+        return JsonResponse({
+            'error': 'Это время уже занято'
+        }, status=400)
     except Exception as e:
         import logging
         logger = logging.getLogger(__name__)
@@ -244,15 +241,10 @@ def booking_update_api(request, booking_id):
             booking.status = data['status']
 
         # Проверка пересечений (исключая само бронирование)
-        overlapping = Booking.objects.filter(
-            court=booking.court,
-            date=booking.date,
-            status__in=['pending', 'confirmed']
-        ).exclude(id=booking.id).filter(
-            Q(start_time__lt=booking.end_time, end_time__gt=booking.start_time)
-        )
-
-        if overlapping.exists():
+        if booking.status != 'cancelled' and has_time_conflict(
+            booking.court, booking.date, booking.start_time, booking.end_time,
+            exclude_booking_id=booking.id
+        ):
             return JsonResponse({
                 'error': 'Это время уже занято'
             }, status=400)
@@ -277,6 +269,10 @@ def booking_update_api(request, booking_id):
             'message': 'Бронирование обновлено'
         })
 
+    except IntegrityError:
+        return JsonResponse({
+            'error': 'Это время уже занято'
+        }, status=400)
     except Exception as e:
         import logging
         logger = logging.getLogger(__name__)
@@ -3,38 +3,109 @@
 Финансы, загруженность, операционные метрики
 """
 
-from django.db.models import Count, Sum, Avg, Q, F, DecimalField
-from django.db.models.functions import TruncDate, TruncMonth, ExtractHour, ExtractWeekDay
+from django.contrib.auth.models import User
+from django.db.models import Count, Sum, Avg, Q, F, DecimalField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, TruncDate, TruncMonth, ExtractHour, ExtractWeekDay
 from django.utils import timezone
 from datetime import datetime, timedelta
-from .models import Booking, Court, Payment
+from decimal import Decimal
+from .models import Booking, Court, DailyCourtStats, DailyCourtTotals, Payment
+from . import rollups
+from .analytics_cache import cached_analytics
 
 
-def get_financial_stats(start_date=None, end_date=None):
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+# Всего возможных часов в день (8:00-22:00 = 14 часов)
+WORKING_HOURS = 14
+
+
+def _default_period(start_date, end_date):
+    today = timezone.now().date()
+    return start_date or today - timedelta(days=30), end_date or today
+
+
+@cached_analytics('period_stats')
+def compute_period_stats(start_date=None, end_date=None):
     """
-    Финансовая статистика
+    Единый расчёт финансов и загруженности за период
+
+    Итоги по кортам - разность накопленных сумм DailyCourtTotals (не зависит
+    от длины периода), дневные ряды и дни недели - строки того же индекса,
+    распределение по часам - агрегат DailyCourtStats. Бронирования читаются
+    только для загрузки тренеров.
 
     Returns:
-        - Доход (revenue)
-        - Прибыль (profit)
-        - Прогнозы (forecast)
-        - Динамика по дням/месяцам
+        dict с ключами financial и occupancy (формат get_financial_stats / get_occupancy_stats)
+
+    Результат кэшируется (booking.analytics_cache).
     """
+    start_date, end_date = _default_period(start_date, end_date)
     today = timezone.now().date()
 
-    if not start_date:
-        start_date = today - timedelta(days=30)
-    if not end_date:
-        end_date = today
+    totals = rollups.range_totals(start_date, end_date)
+
+    total_revenue = sum((court['revenue'] for court in totals.values()), Decimal('0'))
+    booked_minutes = sum(court['booked_minutes'] for court in totals.values())
+    total_bookings = sum(court['bookings_count'] for court in totals.values())
 
-    # Подтвержденные бронирования за период
-    bookings = Booking.objects.filter(
+    court_load = {
+        court_id: [court['booked_minutes'], court['bookings_count']]
+        for court_id, court in totals.items()
+        if court['bookings_count']
+    }
+    revenue_by_court = {
+        court_id: [court['revenue'], court['confirmed_count']]
+        for court_id, court in totals.items()
+        if court['confirmed_count']
+    }
+
+    daily = {}
+    weekday = {}
+    for court_id, day, minutes, bookings, confirmed, revenue in rollups.daily_totals(start_date, end_date):
+        weekday_stats = weekday.setdefault(day.isoweekday(), [0, 0])  # 1=Monday, 7=Sunday
+        weekday_stats[0] += bookings
+        weekday_stats[1] += minutes
+
+        if confirmed:
+            day_stats = daily.setdefault(day, [Decimal('0'), 0])
+            day_stats[0] += revenue
+            day_stats[1] += confirmed
+
+    hourly = dict(
+        DailyCourtStats.objects.filter(
+            date__range=[start_date, end_date],
+            bookings_count__gt=0
+        ).values('hour').annotate(count=Sum('bookings_count')).order_by().values_list('hour', 'count')
+    )
+
+    coaches = {}
+    coach_names = {}
+    for coach_id, first_name, last_name, sessions, minutes in Booking.objects.filter(
         date__range=[start_date, end_date],
-        status='confirmed'
-    ).select_related('court')
+        status__in=ACTIVE_STATUSES,
+        coach__isnull=False
+    ).values('coach_id', 'coach__first_name', 'coach__last_name').annotate(
+        sessions=Count('id'),
+        minutes=Sum('duration_minutes')
+    ).order_by().values_list('coach_id', 'coach__first_name', 'coach__last_name', 'sessions', 'minutes'):
+        coaches[coach_id] = [sessions, minutes]
+        coach_names[coach_id] = (first_name, last_name)
+
+    courts = Court.objects.in_bulk(totals)
+    courts_count = Court.objects.filter(is_available=True).count()
 
-    # Общий доход
-    total_revenue = sum(float(booking.total_price) for booking in bookings)
+    return {
+        'financial': _financial_view(start_date, end_date, today, total_revenue, daily, revenue_by_court, courts),
+        'occupancy': _occupancy_view(
+            start_date, end_date, courts_count, booked_minutes, total_bookings,
+            court_load, hourly, weekday, coaches, courts, coach_names
+        ),
+    }
+
+
+def _financial_view(start_date, end_date, today, total_revenue, daily, revenue_by_court, courts):
+    total_revenue = float(total_revenue)
 
     # Оплаченные платежи
     paid_payments = Payment.objects.filter(
@@ -46,79 +117,53 @@ def get_financial_stats(start_date=None, end_date=None):
         count=Count('id')
     )
 
-    # Динамика дохода по дням (вычисляем в Python из-за ограничений SQLite)
-    daily_data = {}
-    for booking in bookings:
-        day = booking.date
-        hours = (booking.end_time.hour - booking.start_time.hour)
-        revenue = float(booking.court.price_per_hour) * hours
-
-        if day not in daily_data:
-            daily_data[day] = {'day': day, 'revenue': 0, 'bookings_count': 0}
-        daily_data[day]['revenue'] += revenue
-        daily_data[day]['bookings_count'] += 1
-
-    daily_revenue = sorted(daily_data.values(), key=lambda x: x['day'])
-
-    # Динамика по месяцам (последние 12) - также вычисляем в Python
+    # Динамика по месяцам (последние 12) - из итогов DailyCourtTotals, не зависит от периода
     twelve_months_ago = today - timedelta(days=365)
-    monthly_bookings = Booking.objects.filter(
-        date__gte=twelve_months_ago,
-        status='confirmed'
-    ).select_related('court').order_by('date')
-
-    monthly_data = {}
-    for booking in monthly_bookings:
-        month = booking.date.replace(day=1)  # Первый день месяца
-        hours = (booking.end_time.hour - booking.start_time.hour)
-        revenue = float(booking.court.price_per_hour) * hours
-
-        if month not in monthly_data:
-            monthly_data[month] = {'month': month, 'revenue': 0, 'bookings_count': 0}
-        monthly_data[month]['revenue'] += revenue
-        monthly_data[month]['bookings_count'] += 1
-
-    monthly_revenue = sorted(monthly_data.values(), key=lambda x: x['month'])
+    monthly_revenue = [
+        {'month': row['month'], 'revenue': float(row['month_revenue'] or 0), 'bookings_count': row['month_count']}
+        for row in DailyCourtTotals.objects.filter(
+            date__gte=twelve_months_ago,
+            confirmed_count__gt=0
+        ).annotate(month=TruncMonth('date')).values('month').annotate(
+            month_revenue=Sum('revenue'),
+            month_count=Sum('confirmed_count')
+        ).order_by('month')
+    ]
 
     # Прогноз на следующий месяц (средний доход * 30 дней)
     days_in_period = max((end_date - start_date).days, 1)
     avg_daily_revenue = total_revenue / days_in_period
     forecast_next_month = avg_daily_revenue * 30
 
-    # Топ источники дохода (корты) - вычисляем в Python
-    court_data = {}
-    for booking in bookings:
-        court_id = booking.court.id
-        court_name = booking.court.name
-        hours = (booking.end_time.hour - booking.start_time.hour)
-        revenue = float(booking.court.price_per_hour) * hours
-
-        if court_id not in court_data:
-            court_data[court_id] = {
-                'court__id': court_id,
-                'court__name': court_name,
-                'revenue': 0,
-                'bookings_count': 0
-            }
-        court_data[court_id]['revenue'] += revenue
-        court_data[court_id]['bookings_count'] += 1
-
-    revenue_by_court = sorted(court_data.values(), key=lambda x: x['revenue'], reverse=True)
-
     return {
-        'total_revenue': float(total_revenue),
+        'total_revenue': total_revenue,
         'paid_amount': float(paid_payments['total_paid'] or 0),
-        'unpaid_amount': float(total_revenue - (paid_payments['total_paid'] or 0)),
+        'unpaid_amount': float(total_revenue - float(paid_payments['total_paid'] or 0)),
         'avg_payment': float(paid_payments['avg_payment'] or 0),
         'payments_count': paid_payments['count'],
 
-        'daily_revenue': list(daily_revenue),
-        'monthly_revenue': list(monthly_revenue),
+        'daily_revenue': [
+            {'day': day, 'revenue': float(revenue), 'bookings_count': count}
+            for day, (revenue, count) in sorted(daily.items())
+        ],
+        'monthly_revenue': monthly_revenue,
 
         'forecast_next_month': float(forecast_next_month),
         'avg_daily_revenue': float(avg_daily_revenue),
 
-        'revenue_by_court': list(revenue_by_court),
+        'revenue_by_court': sorted(
+            (
+                {
+                    'court__id': court_id,
+                    'court__name': courts[court_id].name,
+                    'revenue': float(revenue),
+                    'bookings_count': count
+                }
+                for court_id, (revenue, count) in revenue_by_court.items()
+            ),
+            key=lambda x: x['revenue'],
+            reverse=True
+        ),
 
         'period': {
             'start': start_date.isoformat(),
@@ -128,116 +173,64 @@ def get_financial_stats(start_date=None, end_date=None):
     }
 
 
-def get_occupancy_stats(start_date=None, end_date=None):
-    """
-    Статистика загруженности кортов и тренеров
-    """
-    today = timezone.now().date()
-
-    if not start_date:
-        start_date = today - timedelta(days=30)
-    if not end_date:
-        end_date = today
-
-    # Всего возможных часов (8:00-22:00 = 14 часов)
-    WORKING_HOURS = 14
+def _occupancy_view(start_date, end_date, courts_count, booked_minutes, total_bookings,
+                    court_load, hourly, weekday, coaches, courts, coach_names):
     days_in_period = (end_date - start_date).days + 1
-    courts_count = Court.objects.filter(is_available=True).count()
-
     total_possible_hours = WORKING_HOURS * days_in_period * courts_count
-
-    # Занятые часы
-    bookings = Booking.objects.filter(
-        date__range=[start_date, end_date],
-        status__in=['pending', 'confirmed']
-    ).select_related('court')
-
-    total_booked_hours = sum(
-        (booking.end_time.hour - booking.start_time.hour)
-        for booking in bookings
-    )
+    total_booked_hours = booked_minutes / 60
 
     # Процент загруженности
     occupancy_rate = (total_booked_hours / total_possible_hours * 100) if total_possible_hours > 0 else 0
 
-    # Загруженность по кортам - вычисляем в Python
-    court_stats = {}
-    for booking in bookings:
-        court_id = booking.court.id
-        court_name = booking.court.name
-        hours = (booking.end_time.hour - booking.start_time.hour)
-
-        if court_id not in court_stats:
-            court_stats[court_id] = {
+    # Загруженность по кортам
+    possible = WORKING_HOURS * days_in_period
+    court_occupancy_list = sorted(
+        (
+            {
                 'court__id': court_id,
-                'court__name': court_name,
-                'booked_hours': 0,
-                'bookings_count': 0
+                'court__name': courts[court_id].name,
+                'booked_hours': minutes / 60,
+                'bookings_count': count,
+                'occupancy_rate': (minutes / 60 / possible * 100) if possible > 0 else 0
             }
-        court_stats[court_id]['booked_hours'] += hours
-        court_stats[court_id]['bookings_count'] += 1
-
-    # Добавляем процент для каждого корта
-    court_occupancy_list = []
-    for court in court_stats.values():
-        possible = WORKING_HOURS * days_in_period
-        court['occupancy_rate'] = (court['booked_hours'] / possible * 100) if possible > 0 else 0
-        court_occupancy_list.append(court)
-
-    court_occupancy_list.sort(key=lambda x: x['booked_hours'], reverse=True)
-
-    # Загруженность по часам (пиковые часы) - вычисляем в Python
-    hourly_stats = {}
-    for booking in bookings:
-        hour = booking.start_time.hour
-        if hour not in hourly_stats:
-            hourly_stats[hour] = {'hour': hour, 'bookings_count': 0}
-        hourly_stats[hour]['bookings_count'] += 1
-
-    hourly_occupancy = sorted(hourly_stats.values(), key=lambda x: x['hour'])
-
-    # Загруженность по дням недели - вычисляем в Python
-    weekday_stats = {}
-    for booking in bookings:
-        weekday = booking.date.isoweekday()  # 1=Monday, 7=Sunday
-        hours = (booking.end_time.hour - booking.start_time.hour)
-
-        if weekday not in weekday_stats:
-            weekday_stats[weekday] = {'weekday': weekday, 'bookings_count': 0, 'hours': 0}
-        weekday_stats[weekday]['bookings_count'] += 1
-        weekday_stats[weekday]['hours'] += hours
-
-    weekday_occupancy = sorted(weekday_stats.values(), key=lambda x: x['weekday'])
-
-    # Загруженность тренеров - вычисляем в Python
-    coach_stats = {}
-    for booking in bookings.filter(coach__isnull=False):
-        coach_id = booking.coach.id
-        hours = (booking.end_time.hour - booking.start_time.hour)
-
-        if coach_id not in coach_stats:
-            coach_stats[coach_id] = {
+            for court_id, (minutes, count) in court_load.items()
+        ),
+        key=lambda x: x['booked_hours'],
+        reverse=True
+    )
+
+    # Загруженность тренеров
+    coach_occupancy = sorted(
+        (
+            {
                 'coach__id': coach_id,
-                'coach__first_name': booking.coach.first_name,
-                'coach__last_name': booking.coach.last_name,
-                'sessions_count': 0,
-                'total_hours': 0
+                'coach__first_name': coach_names.get(coach_id, ('', ''))[0],
+                'coach__last_name': coach_names.get(coach_id, ('', ''))[1],
+                'sessions_count': sessions,
+                'total_hours': minutes / 60
             }
-        coach_stats[coach_id]['sessions_count'] += 1
-        coach_stats[coach_id]['total_hours'] += hours
-
-    coach_occupancy = sorted(coach_stats.values(), key=lambda x: x['sessions_count'], reverse=True)
+            for coach_id, (sessions, minutes) in coaches.items()
+        ),
+        key=lambda x: x['sessions_count'],
+        reverse=True
+    )
 
     return {
         'overall_occupancy_rate': round(occupancy_rate, 2),
         'total_booked_hours': total_booked_hours,
         'total_possible_hours': total_possible_hours,
-        'total_bookings': bookings.count(),
+        'total_bookings': total_bookings,
 
         'court_occupancy': court_occupancy_list,
-        'hourly_occupancy': list(hourly_occupancy),
-        'weekday_occupancy': list(weekday_occupancy),
-        'coach_occupancy': list(coach_occupancy),
+        'hourly_occupancy': [
+            {'hour': hour, 'bookings_count': count}
+            for hour, count in sorted(hourly.items())
+        ],
+        'weekday_occupancy': [
+            {'weekday': day, 'bookings_count': count, 'hours': minutes / 60}
+            for day, (count, minutes) in sorted(weekday.items())
+        ],
+        'coach_occupancy': coach_occupancy,
 
         'period': {
             'start': start_date.isoformat(),
@@ -247,6 +240,38 @@ def get_occupancy_stats(start_date=None, end_date=None):
     }
 
 
+def get_financial_stats(start_date=None, end_date=None):
+    """
+    Финансовая статистика
+
+    Returns:
+        - Доход (revenue)
+        - Прибыль (profit)
+        - Прогнозы (forecast)
+        - Динамика по дням/месяцам
+    """
+    return compute_period_stats(start_date, end_date)['financial']
+
+
+def get_occupancy_stats(start_date=None, end_date=None):
+    """
+    Статистика загруженности кортов и тренеров
+    """
+    return compute_period_stats(start_date, end_date)['occupancy']
+
+
+def get_dashboard_stats(start_date=None, end_date=None):
+    """Финансы, загруженность и клиенты за период (бронирования читаются один раз)"""
+    start_date, end_date = _default_period(start_date, end_date)
+    stats = compute_period_stats(start_date, end_date)
+    return {
+        'financial': stats['financial'],
+        'occupancy': stats['occupancy'],
+        'clients': get_clients_stats(start_date, end_date),
+    }
+
+
+@cached_analytics('clients_stats')
 def get_clients_stats(start_date=None, end_date=None):
     """
     Статистика клиентов
@@ -256,8 +281,6 @@ def get_clients_stats(start_date=None, end_date=None):
         - Удержание (retention)
         - LTV (Lifetime Value)
     """
-    from django.contrib.auth.models import User
-
     today = timezone.now().date()
 
     if not start_date:
@@ -270,74 +293,76 @@ def get_clients_stats(start_date=None, end_date=None):
         date_joined__date__range=[start_date, end_date]
     ).count()
 
+    # Бронирования периода: созданные пользователем и те, где он партнёр
+    period_bookings = Booking.objects.filter(date__range=[start_date, end_date])
+    partner_links = Booking.partners.through.objects.filter(booking__date__range=[start_date, end_date])
+
     # Активные пользователи (сделали хотя бы одно бронирование)
-    active_users = User.objects.filter(
-        Q(bookings_created__date__range=[start_date, end_date]) |
-        Q(bookings_as_partner__date__range=[start_date, end_date])
-    ).distinct().count()
-
-    # Топ активные клиенты
-    top_clients_qs = User.objects.filter(
-        Q(bookings_created__date__range=[start_date, end_date]) |
-        Q(bookings_as_partner__date__range=[start_date, end_date])
+    active_users_qs = User.objects.filter(
+        Q(id__in=period_bookings.values('user_id')) |
+        Q(id__in=partner_links.values('user_id'))
+    )
+    active_users = active_users_qs.count()
+
+    # Топ активные клиенты: счётчики и траты считаются подзапросами по user_id
+    top_clients_qs = active_users_qs.annotate(
+        created_count=Coalesce(Subquery(
+            period_bookings.filter(user_id=OuterRef('pk')).order_by().values('user_id').annotate(
+                total=Count('id')
+            ).values('total')
+        ), 0),
+        partner_count=Coalesce(Subquery(
+            partner_links.filter(user_id=OuterRef('pk')).order_by().values('user_id').annotate(
+                total=Count('id')
+            ).values('total')
+        ), 0),
+        spent=Coalesce(Subquery(
+            period_bookings.filter(user_id=OuterRef('pk'), status='confirmed').order_by().values('user_id').annotate(
+                total=Sum('total_amount')
+            ).values('total')
+        ), Value(Decimal('0')), output_field=DecimalField(max_digits=12, decimal_places=2)),
     ).annotate(
-        bookings_count=Count('bookings_created', distinct=True) + Count('bookings_as_partner', distinct=True)
-    ).order_by('-bookings_count')[:10]
-
-    top_clients = []
-    for user in top_clients_qs:
-        # Считаем потраченные деньги
-        user_bookings = Booking.objects.filter(
-            user=user,
-            date__range=[start_date, end_date],
-            status='confirmed'
-        )
-        total_spent = sum(float(b.total_price) for b in user_bookings)
+        bookings_count=F('created_count') + F('partner_count')
+    ).order_by('-bookings_count', 'id')[:10]
 
-        top_clients.append({
+    top_clients = [
+        {
             'id': user.id,
             'name': user.get_full_name() or user.username,
             'bookings_count': user.bookings_count,
-            'total_spent': total_spent
-        })
-
-    # LTV (средняя сумма потраченная пользователем)
-    all_users_with_bookings = User.objects.filter(
-        bookings_created__date__range=[start_date, end_date],
-        bookings_created__status='confirmed'
-    ).distinct()
-
-    total_ltv = 0
-    users_count = 0
-    for user in all_users_with_bookings:
-        user_bookings = Booking.objects.filter(
-            user=user,
-            date__range=[start_date, end_date],
-            status='confirmed'
-        )
-        total_ltv += sum(float(b.total_price) for b in user_bookings)
-        users_count += 1
+            'total_spent': float(user.spent)
+        }
+        for user in top_clients_qs
+    ]
+
+    # LTV (средняя сумма, потраченная пользователем с подтверждёнными бронированиями)
+    ltv = period_bookings.filter(status='confirmed').aggregate(
+        total=Sum('total_amount'),
+        users=Count('user_id', distinct=True)
+    )
+    avg_ltv = float(ltv['total'] or 0) / ltv['users'] if ltv['users'] else 0
 
-    avg_ltv = (total_ltv / users_count) if users_count > 0 else 0
+    # Распределение по частоте игр (количество созданных бронирований на пользователя)
+    bookings_per_user = period_bookings.order_by().values('user_id').annotate(
+        bookings_count=Count('id')
+    ).values_list('bookings_count', flat=True)
+
+    distribution = {}
+    for bookings_count in bookings_per_user:
+        distribution[bookings_count] = distribution.get(bookings_count, 0) + 1
+
+    frequency_distribution = [
+        {'bookings_count': bookings_count, 'users_count': users_count}
+        for bookings_count, users_count in sorted(distribution.items())
+    ]
 
     # Retention (повторные бронирования)
-    users_with_multiple_bookings = User.objects.filter(
-        bookings_created__date__range=[start_date, end_date]
-    ).annotate(
-        bookings_count=Count('bookings_created')
-    ).filter(bookings_count__gt=1).count()
+    users_with_multiple_bookings = sum(
+        users_count for bookings_count, users_count in distribution.items() if bookings_count > 1
+    )
 
     retention_rate = (users_with_multiple_bookings / active_users * 100) if active_users > 0 else 0
 
-    # Распределение по частоте игр
-    frequency_distribution = User.objects.filter(
-        bookings_created__date__range=[start_date, end_date]
-    ).annotate(
-        bookings_count=Count('bookings_created')
-    ).values('bookings_count').annotate(
-        users_count=Count('id')
-    ).order_by('bookings_count')
-
     return {
         'new_users': new_users,
         'active_users': active_users,
@@ -0,0 +1,108 @@
+"""
+Кэш аналитики со stale-while-revalidate
+Ключ - (функция, начало, конец). Устаревшее значение отдаётся, пока один
+процесс пересчитывает его под блокировкой cache.add (защита от dogpile).
+Изменение бронирований сдвигает версию данных (invalidate), и все
+сохранённые значения считаются устаревшими.
+"""
+from django.core.cache import cache
+from django.utils import timezone
+from datetime import timedelta
+from functools import wraps
+import time
+import logging
+
+from .constants import (
+    ANALYTICS_CACHE_PAST_TIMEOUT,
+    ANALYTICS_CACHE_TODAY_TIMEOUT,
+    ANALYTICS_CACHE_STALE_TIMEOUT,
+    ANALYTICS_CACHE_LOCK_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'analytics_data_version'
+
+
+def _cache_key(name, start_date, end_date):
+    return f'analytics_{name}_{start_date.isoformat()}_{end_date.isoformat()}'
+
+
+def _get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def invalidate():
+    """Помечает все закэшированные значения аналитики устаревшими"""
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, int(time.time() * 1000), None)
+
+
+def _fresh_timeout(end_date):
+    """Прошедшие диапазоны кэшируются надолго, диапазоны с сегодняшним днём - коротко"""
+    if end_date < timezone.now().date():
+        return ANALYTICS_CACHE_PAST_TIMEOUT
+    return ANALYTICS_CACHE_TODAY_TIMEOUT
+
+
+def _store(key, value, end_date, version):
+    fresh_timeout = _fresh_timeout(end_date)
+    cache.set(
+        key,
+        {'value': value, 'fresh_until': time.time() + fresh_timeout, 'version': version},
+        fresh_timeout + ANALYTICS_CACHE_STALE_TIMEOUT
+    )
+
+
+def _recompute(key, lock_key, func, start_date, end_date, version):
+    try:
+        value = func(start_date, end_date)
+        _store(key, value, end_date, version)
+        return value
+    finally:
+        cache.delete(lock_key)
+
+
+def cached_analytics(name):
+    """
+    Декоратор функций аналитики вида func(start_date=None, end_date=None)
+
+    Период по умолчанию - последние 30 дней (как в самих функциях).
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(start_date=None, end_date=None):
+            today = timezone.now().date()
+            start_date = start_date or today - timedelta(days=30)
+            end_date = end_date or today
+
+            key = _cache_key(name, start_date, end_date)
+            lock_key = f'{key}_lock'
+
+            version = _get_version()
+            entry = cache.get(key)
+            if entry is not None and entry['version'] == version and entry['fresh_until'] > time.time():
+                return entry['value']
+
+            # Пересчитывает только тот, кто взял блокировку
+            if cache.add(lock_key, 1, ANALYTICS_CACHE_LOCK_TIMEOUT):
+                if entry is not None:
+                    logger.debug(f"Analytics cache stale, recomputing {key}")
+                return _recompute(key, lock_key, func, start_date, end_date, version)
+
+            # Пересчёт уже идёт - отдаём устаревшее значение
+            if entry is not None:
+                return entry['value']
+
+            # Отдать нечего - считаем без кэша, не дожидаясь чужого пересчёта
+            return func(start_date, end_date)
+
+        wrapper.uncached = func
+        return wrapper
+    return decorator
@@ -0,0 +1,225 @@
+"""
+Когорты пользователей
+(месяц регистрации, месяц активности) -> число активных пользователей.
+При изменении бронирования пересчитывается активность только затронутых
+пар (пользователь, месяц), ячейки когорт меняются на +1/-1
+"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from .models import Booking, CohortCell, UserMonthActivity
+
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+
+def month_start(value):
+    return value.replace(day=1)
+
+
+def next_month(month):
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def months_between(first, second):
+    """Смещение в месяцах от first до second"""
+    return (second.year - first.year) * 12 + second.month - first.month
+
+
+def cohort_month(date_joined):
+    """Месяц регистрации в локальной временной зоне"""
+    return month_start(timezone.localtime(date_joined).date())
+
+
+def _count_bookings(user_ids, month):
+    """Действующие бронирования пользователей за месяц (создатель или партнёр): {user_id: count}"""
+    month_range = [month, next_month(month) - timedelta(days=1)]
+    counts = defaultdict(int)
+
+    created = Booking.objects.filter(
+        user_id__in=user_ids,
+        date__range=month_range,
+        status__in=ACTIVE_STATUSES
+    ).values('user_id').annotate(total=Count('id')).order_by()
+
+    as_partner = Booking.partners.through.objects.filter(
+        user_id__in=user_ids,
+        booking__date__range=month_range,
+        booking__status__in=ACTIVE_STATUSES
+    ).values('user_id').annotate(total=Count('id')).order_by()
+
+    for queryset in (created, as_partner):
+        for user_id, total in queryset.values_list('user_id', 'total'):
+            counts[user_id] += total
+
+    return counts
+
+
+def _bump(cohort, month, delta):
+    cell, _ = CohortCell.objects.get_or_create(cohort_month=cohort, activity_month=month)
+    CohortCell.objects.filter(pk=cell.pk).update(users_count=F('users_count') + delta)
+
+
+def refresh(user_ids, months):
+    """
+    Пересчитывает активность пользователей в месяцах и ячейки их когорт
+
+    Args:
+        user_ids: ID пользователей
+        months: Даты внутри затронутых месяцев
+    """
+    months = {month_start(month) for month in months if month}
+    cohorts = {
+        user_id: cohort_month(date_joined)
+        for user_id, date_joined in User.objects.filter(
+            id__in={user_id for user_id in user_ids if user_id}
+        ).values_list('id', 'date_joined')
+    }
+
+    if not cohorts or not months:
+        return
+
+    with transaction.atomic():
+        for month in months:
+            counts = _count_bookings(list(cohorts), month)
+            existing = {
+                activity.user_id: activity
+                for activity in UserMonthActivity.objects.select_for_update().filter(
+                    user_id__in=list(cohorts), month=month
+                )
+            }
+
+            for user_id, cohort in cohorts.items():
+                count = counts.get(user_id, 0)
+                activity = existing.get(user_id)
+
+                if activity is None:
+                    if count:
+                        UserMonthActivity.objects.create(user_id=user_id, month=month, bookings_count=count)
+                        _bump(cohort, month, 1)
+                elif not count:
+                    activity.delete()
+                    _bump(cohort, month, -1)
+                elif activity.bookings_count != count:
+                    activity.bookings_count = count
+                    activity.save(update_fields=['bookings_count'])
+
+
+def remove_user(user):
+    """Убирает пользователя из когорт (перед удалением)"""
+    cohort = cohort_month(user.date_joined)
+    with transaction.atomic():
+        activities = UserMonthActivity.objects.select_for_update().filter(user=user)
+        for month in activities.values_list('month', flat=True):
+            _bump(cohort, month, -1)
+        activities.delete()
+
+
+def rebuild():
+    """
+    Пересчитывает активность и когорты целиком
+
+    Returns:
+        (количество строк активности, количество ячеек когорт)
+    """
+    counts = defaultdict(int)
+
+    created = Booking.objects.filter(status__in=ACTIVE_STATUSES).annotate(
+        month=TruncMonth('date')
+    ).values('user_id', 'month').annotate(total=Count('id')).order_by()
+
+    as_partner = Booking.partners.through.objects.filter(
+        booking__status__in=ACTIVE_STATUSES
+    ).annotate(month=TruncMonth('booking__date')).values('user_id', 'month').annotate(
+        total=Count('id')
+    ).order_by()
+
+    for queryset in (created, as_partner):
+        for user_id, month, total in queryset.values_list('user_id', 'month', 'total'):
+            counts[(user_id, month)] += total
+
+    cohorts = {
+        user_id: cohort_month(date_joined)
+        for user_id, date_joined in User.objects.filter(
+            id__in={user_id for user_id, _ in counts}
+        ).values_list('id', 'date_joined')
+    }
+
+    cells = defaultdict(int)
+    activities = []
+    for (user_id, month), total in counts.items():
+        activities.append(UserMonthActivity(user_id=user_id, month=month, bookings_count=total))
+        cells[(cohorts[user_id], month)] += 1
+
+    with transaction.atomic():
+        UserMonthActivity.objects.all().delete()
+        CohortCell.objects.all().delete()
+        UserMonthActivity.objects.bulk_create(activities, batch_size=1000)
+        CohortCell.objects.bulk_create(
+            [
+                CohortCell(cohort_month=cohort, activity_month=month, users_count=users)
+                for (cohort, month), users in cells.items()
+            ],
+            batch_size=1000
+        )
+
+    return len(activities), len(cells)
+
+
+def get_cohort_matrix(months=12):
+    """
+    Матрица удержания по месячным когортам
+
+    Args:
+        months: Сколько последних месяцев регистрации показать
+
+    Returns:
+        dict: cohorts - список {cohort, size, active, retention}, где active[i] -
+        активные пользователи когорты через i месяцев после регистрации
+    """
+    current = month_start(timezone.localdate())
+    first = current
+    for _ in range(months - 1):
+        first = month_start(first - timedelta(days=1))
+
+    first_joined = timezone.make_aware(datetime.combine(first, datetime.min.time()))
+    sizes = {
+        month_start(timezone.localtime(month).date()): size
+        for month, size in User.objects.filter(
+            date_joined__gte=first_joined
+        ).annotate(month=TruncMonth('date_joined')).values('month').annotate(
+            size=Count('id')
+        ).order_by().values_list('month', 'size')
+    }
+
+    active = defaultdict(dict)
+    for cohort, month, users in CohortCell.objects.filter(
+        cohort_month__gte=first,
+        activity_month__lte=current,
+        users_count__gt=0
+    ).values_list('cohort_month', 'activity_month', 'users_count'):
+        offset = months_between(cohort, month)
+        if offset >= 0:
+            active[cohort][offset] = users
+
+    cohorts = []
+    cohort = first
+    while cohort <= current:
+        size = sizes.get(cohort, 0)
+        counts = [active[cohort].get(offset, 0) for offset in range(months_between(cohort, current) + 1)]
+        cohorts.append({
+            'cohort': cohort.strftime('%Y-%m'),
+            'size': size,
+            'active': counts,
+            'retention': [round(count / size * 100, 2) if size else 0 for count in counts],
+        })
+        cohort = next_month(cohort)
+
+    return {
+        'months': months,
+        'cohorts': cohorts,
+    }
@@ -22,8 +22,17 @@ MIN_CANCEL_HOURS = 1  # Минимальное количество часов 
 # Конвертация времени
 SECONDS_PER_HOUR = 3600  # Секунд в часе
 
-
-
-
-
-
+# Индекс занятости кортов
+OCCUPANCY_SLOT_MINUTES = 30  # Разрешение битовой карты занятости (в минутах)
+OCCUPANCY_CACHE_TIMEOUT = 60 * 60 * 24  # Время жизни битовой карты в кэше (сутки)
+SLOTS_CACHE_TIMEOUT = 60 * 60  # Время жизни закэшированных свободных слотов (час)
+AVAILABILITY_MATRIX_MAX_DAYS = 31  # Максимальный диапазон матрицы доступности (в днях)
+SLOT_SEARCH_HORIZON_DAYS = 14  # Глубина поиска ближайших свободных слотов (в днях)
+SLOT_SEARCH_MAX_RESULTS = 20  # Максимальное количество слотов в ответе поиска
+SLOT_HOLD_TIMEOUT = 60 * 5  # Время удержания слота на время оформления бронирования (5 минут)
+
+# Кэш аналитики
+ANALYTICS_CACHE_PAST_TIMEOUT = 60 * 60 * 24  # Диапазоны в прошлом (данные почти не меняются)
+ANALYTICS_CACHE_TODAY_TIMEOUT = 60  # Диапазоны, включающие сегодня (свежесть данных)
+ANALYTICS_CACHE_STALE_TIMEOUT = 60 * 10  # Сколько отдавать устаревшие данные, пока идёт пересчёт
+ANALYTICS_CACHE_LOCK_TIMEOUT = 60  # Блокировка пересчёта (защита от одновременных пересчётов)
@@ -0,0 +1,115 @@
+"""
+Тепловая карта загруженности кортов
+Массив NumPy (корт, день, час рабочего дня) с занятыми минутами
+"""
+from datetime import timedelta
+
+from .analytics_cache import cached_analytics
+from .constants import WORKING_HOURS_START, WORKING_HOURS_END
+from .models import Court, DailyCourtStats
+
+HOURS = WORKING_HOURS_END - WORKING_HOURS_START
+
+
+def build_occupancy_cube(start_date, end_date):
+    """
+    Занятые минуты по (корт, день, час) за период
+
+    Источник - агрегат DailyCourtStats: в нём бронирование уже разложено
+    по всем часам, которые оно пересекает, а не только по часу начала.
+
+    Returns:
+        (courts, days, cube): список (id, name) кортов, список дат
+        и массив shape (len(courts), len(days), HOURS)
+    """
+    import numpy as np
+
+    courts = list(Court.objects.order_by('name').values_list('id', 'name'))
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    cube = np.zeros((len(courts), len(days), HOURS))
+
+    rows = list(
+        DailyCourtStats.objects.filter(
+            date__range=[start_date, end_date],
+            hour__gte=WORKING_HOURS_START,
+            hour__lt=WORKING_HOURS_END,
+            booked_minutes__gt=0
+        ).values_list('court_id', 'date', 'hour', 'booked_minutes')
+    )
+    if not rows:
+        return courts, days, cube
+
+    court_index = {court_id: i for i, (court_id, _) in enumerate(courts)}
+    court_ids, dates, hours, minutes = zip(*rows)
+
+    # Ячейки агрегата уникальны по (дата, корт, час) - раскладываем одним присваиванием
+    cube[
+        np.fromiter((court_index[court_id] for court_id in court_ids), dtype=np.intp, count=len(rows)),
+        np.fromiter(((day - start_date).days for day in dates), dtype=np.intp, count=len(rows)),
+        np.array(hours, dtype=np.intp) - WORKING_HOURS_START,
+    ] = minutes
+
+    return courts, days, cube
+
+
+def _percent(values):
+    return [round(float(value) * 100, 2) for value in values]
+
+
+@cached_analytics('occupancy_heatmap')
+def get_occupancy_heatmap(start_date=None, end_date=None):
+    """
+    Загруженность (%) по кортам, часам, дням недели и датам
+
+    Returns:
+        dict с одномерными разрезами и матрицами корт×час и день недели×час.
+        День недели - isoweekday (1 - понедельник, 7 - воскресенье).
+    """
+    import numpy as np
+
+    courts, days, cube = build_occupancy_cube(start_date, end_date)
+    # Доля занятости ячейки: 60 минут - час занят полностью
+    utilization = np.minimum(cube / 60, 1)
+
+    weekdays = np.array([day.isoweekday() for day in days])
+    by_day_hour = utilization.mean(axis=0) if courts else np.zeros((len(days), HOURS))
+    weekday_hour = {
+        weekday: by_day_hour[weekdays == weekday].mean(axis=0)
+        for weekday in range(1, 8)
+        if (weekdays == weekday).any()
+    }
+
+    hours = list(range(WORKING_HOURS_START, WORKING_HOURS_END))
+    return {
+        'hours': hours,
+        'overall_occupancy_rate': round(float(utilization.mean()) * 100, 2) if utilization.size else 0,
+        'by_court': [
+            {'court_id': court_id, 'court_name': name, 'occupancy_rate': rate}
+            for (court_id, name), rate in zip(courts, _percent(utilization.mean(axis=(1, 2))))
+        ],
+        'by_hour': [
+            {'hour': hour, 'occupancy_rate': rate}
+            for hour, rate in zip(hours, _percent(by_day_hour.mean(axis=0) if days else np.zeros(HOURS)))
+        ],
+        'by_weekday': [
+            {'weekday': weekday, 'occupancy_rate': round(float(values.mean()) * 100, 2)}
+            for weekday, values in weekday_hour.items()
+        ],
+        'by_date': [
+            {'date': day.isoformat(), 'occupancy_rate': rate}
+            for day, rate in zip(days, _percent(by_day_hour.mean(axis=1)))
+        ],
+        'court_hour': {
+            'courts': [{'court_id': court_id, 'court_name': name} for court_id, name in courts],
+            'values': [_percent(row) for row in utilization.mean(axis=1)],
+        },
+        'weekday_hour': {
+            'weekdays': list(weekday_hour.keys()),
+            'values': [_percent(row) for row in weekday_hour.values()],
+        },
+        'period': {
+            'start': start_date.isoformat(),
+            'end': end_date.isoformat(),
+            'days': len(days)
+        }
+    }
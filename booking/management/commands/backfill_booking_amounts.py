@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand
+from booking.models import Booking
+from booking import analytics_cache, rollups
+
+
+class Command(BaseCommand):
+    help = 'Заполняет продолжительность и сумму (duration_minutes, total_amount) бронирований'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Пересчитать все бронирования по текущим ценам кортов (иначе только незаполненные)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество бронирований в одном UPDATE'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+
+        bookings = Booking.objects.select_related('court').order_by('pk')
+        if not options['all']:
+            bookings = bookings.filter(duration_minutes=0)
+
+        batch = []
+        updated = 0
+        changed_dates = []
+        confirmed_changed = False
+        for booking in bookings.iterator(chunk_size=batch_size):
+            amounts = booking.calculate_amounts()
+            if amounts == (booking.duration_minutes, booking.total_amount):
+                continue
+
+            booking.duration_minutes, booking.total_amount = amounts
+            batch.append(booking)
+            changed_dates.append(booking.date)
+            confirmed_changed = confirmed_changed or booking.status == 'confirmed'
+
+            if len(batch) >= batch_size:
+                updated += Booking.objects.bulk_update(batch, ['duration_minutes', 'total_amount'])
+                batch = []
+
+        if batch:
+            updated += Booking.objects.bulk_update(batch, ['duration_minutes', 'total_amount'])
+
+        self.stdout.write(self.style.SUCCESS(f'Обновлено бронирований: {updated}'))
+        if not updated:
+            return
+
+        # bulk_update не вызывает сигналы - производные данные пересчитываем сами
+        start_date, end_date = min(changed_dates), max(changed_dates)
+        rows = rollups.rebuild_range(start_date, end_date)
+        self.stdout.write(self.style.SUCCESS(f'Агрегаты пересчитаны за {start_date} - {end_date}: {rows} строк'))
+
+        if confirmed_changed:
+            from users import player_stats
+
+            snapshots = player_stats.rebuild_all()
+            self.stdout.write(self.style.SUCCESS(f'Снимки статистики игроков пересчитаны: {snapshots}'))
+
+        analytics_cache.invalidate()
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from booking.models import Booking, refresh_participants_count
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчик участников (participants_count) для бронирований'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Количество бронирований в одном UPDATE'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        booking_ids = list(Booking.objects.order_by('pk').values_list('pk', flat=True))
+
+        updated = 0
+        for i in range(0, len(booking_ids), batch_size):
+            updated += refresh_participants_count(booking_ids[i:i + batch_size])
+
+        self.stdout.write(self.style.SUCCESS(f'Пересчитано бронирований: {updated}'))
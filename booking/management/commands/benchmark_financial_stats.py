@@ -0,0 +1,98 @@
+import time
+from datetime import time as dt_time, timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from booking.analytics import compute_period_stats
+from booking.models import Booking, Court
+from booking import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер времени get_financial_stats при росте числа бронирований. '
+        'Тестовые данные создаются в транзакции и откатываются.'
+    )
+
+    COURTS = 5
+    BOOKINGS_PER_COURT_PER_DAY = 14  # Полная загрузка 8:00-22:00 по часу
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            default='10000,100000,300000',
+            help='Объёмы бронирований через запятую'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Сколько раз запускать расчёт на каждом объёме (берётся лучшее время)'
+        )
+
+    def handle(self, *args, **options):
+        sizes = sorted(int(size) for size in options['sizes'].split(',') if size.strip())
+
+        with transaction.atomic():
+            user = User.objects.create_user(username='benchmark_financial_stats')
+            courts = [
+                Court.objects.create(
+                    name=f'Benchmark {i + 1}',
+                    description='',
+                    price_per_hour=Decimal('1000.00') + i * 250
+                )
+                for i in range(self.COURTS)
+            ]
+
+            # История растёт в прошлое с постоянной плотностью бронирований в день:
+            # объём за период отчёта не меняется, растёт только общий размер таблицы
+            created = 0
+            day_offset = 0
+            today = timezone.now().date()
+            for size in sizes:
+                first_offset = day_offset
+                while created < size:
+                    batch = self._day_bookings(user, courts, today - timedelta(days=day_offset))
+                    Booking.objects.bulk_create(batch)
+                    created += len(batch)
+                    day_offset += 1
+
+                # bulk_create не вызывает сигналы - агрегаты аналитики строим явно
+                rollups.rebuild_range(
+                    today - timedelta(days=day_offset - 1),
+                    today - timedelta(days=first_offset),
+                    court_ids=[court.id for court in courts]
+                )
+
+                elapsed = min(self._measure() for _ in range(options['repeat']))
+                self.stdout.write(f'{created:>9} бронирований: {elapsed * 1000:8.1f} мс')
+
+            transaction.set_rollback(True)
+
+        self.stdout.write(self.style.SUCCESS('Тестовые данные откатаны'))
+
+    def _day_bookings(self, user, courts, day):
+        bookings = []
+        for court in courts:
+            for hour in range(8, 8 + self.BOOKINGS_PER_COURT_PER_DAY):
+                bookings.append(Booking(
+                    user=user,
+                    court=court,
+                    date=day,
+                    start_time=dt_time(hour, 0),
+                    end_time=dt_time(hour + 1, 0),
+                    status='confirmed',
+                    duration_minutes=60,
+                    total_amount=court.price_per_hour
+                ))
+        return bookings
+
+    def _measure(self):
+        started = time.perf_counter()
+        # Замеряем сам расчёт, без кэша аналитики
+        compute_period_stats.uncached()
+        return time.perf_counter() - started
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from booking import cohorts
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает активность пользователей по месяцам и когорты (UserMonthActivity, CohortCell)'
+
+    def handle(self, *args, **options):
+        activities, cells = cohorts.rebuild()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Когорты пересчитаны: {activities} строк активности, {cells} ячеек'
+        ))
@@ -0,0 +1,53 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Max, Min
+
+from booking.models import Booking
+from booking import rollups
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает агрегаты аналитики DailyCourtStats за диапазон дат'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start',
+            help='Начальная дата YYYY-MM-DD (по умолчанию - дата самого раннего бронирования)'
+        )
+        parser.add_argument(
+            '--end',
+            help='Конечная дата YYYY-MM-DD включительно (по умолчанию - дата самого позднего бронирования)'
+        )
+        parser.add_argument(
+            '--court',
+            type=int,
+            action='append',
+            dest='courts',
+            help='ID корта (можно указать несколько раз)'
+        )
+
+    def handle(self, *args, **options):
+        bounds = Booking.objects.aggregate(first=Min('date'), last=Max('date'))
+
+        try:
+            start_date = self._parse_date(options['start']) or bounds['first']
+            end_date = self._parse_date(options['end']) or bounds['last']
+        except ValueError:
+            raise CommandError('Даты должны быть в формате YYYY-MM-DD')
+
+        if not start_date or not end_date:
+            self.stdout.write('Бронирований нет - пересчитывать нечего')
+            return
+
+        if start_date > end_date:
+            raise CommandError('Начальная дата позже конечной')
+
+        created = rollups.rebuild_range(start_date, end_date, court_ids=options['courts'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Агрегаты пересчитаны за {start_date} - {end_date}: {created} строк'
+        ))
+
+    def _parse_date(self, value):
+        return datetime.strptime(value, '%Y-%m-%d').date() if value else None
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def claim_existing_slots(apps, schema_editor):
+    """Захват слотов для уже существующих активных бронирований"""
+    Booking = apps.get_model('booking', 'Booking')
+    BookingSlotClaim = apps.get_model('booking', 'BookingSlotClaim')
+
+    bookings = Booking.objects.filter(
+        status__in=['pending', 'confirmed']
+    ).values_list('id', 'court_id', 'date', 'start_time', 'end_time')
+
+    claims = []
+    for booking_id, court_id, date, start_time, end_time in bookings.iterator():
+        start_slot = (start_time.hour * 60 + start_time.minute) // 30
+        end_slot = -(-(end_time.hour * 60 + end_time.minute) // 30)
+        for slot in range(start_slot, end_slot):
+            claims.append(BookingSlotClaim(court_id=court_id, date=date, slot=slot, booking_id=booking_id))
+
+    # Уже пересекающиеся исторические бронирования не должны ломать миграцию
+    BookingSlotClaim.objects.bulk_create(claims, batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0002_booking_required_rating_levels_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookingSlotClaim',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('slot', models.PositiveSmallIntegerField(help_text='Номер 30-минутного слота от начала суток', verbose_name='Слот')),
+                ('booking', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_claims', to='booking.booking', verbose_name='Бронирование')),
+                ('court', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slot_claims', to='booking.court', verbose_name='Корт')),
+            ],
+            options={
+                'verbose_name': 'Захват слота',
+                'verbose_name_plural': 'Захваты слотов',
+                'constraints': [models.UniqueConstraint(fields=('court', 'date', 'slot'), name='unique_court_date_slot_claim')],
+            },
+        ),
+        migrations.RunPython(claim_existing_slots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:12
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def count_existing_participants(apps, schema_editor):
+    """Заполнение счётчика участников для существующих бронирований"""
+    Booking = apps.get_model('booking', 'Booking')
+
+    partners_count = Booking.partners.through.objects.filter(
+        booking_id=OuterRef('pk')
+    ).values('booking_id').annotate(total=Count('id')).values('total')
+
+    Booking.objects.update(
+        participants_count=Value(1) + Coalesce(Subquery(partners_count), Value(0))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0003_booking_slot_claim'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='participants_count',
+            field=models.PositiveSmallIntegerField(default=1, help_text='Создатель + партнёры (обновляется автоматически при изменении партнёров)', verbose_name='Участников'),
+        ),
+        migrations.RunPython(count_existing_participants, migrations.RunPython.noop),
+    ]
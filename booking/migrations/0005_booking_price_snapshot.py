@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:17
+
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def snapshot_existing_prices(apps, schema_editor):
+    """Снимок стоимости существующих бронирований по текущим ценам кортов"""
+    Booking = apps.get_model('booking', 'Booking')
+
+    batch = []
+    for booking in Booking.objects.select_related('court').only(
+        'id', 'date', 'start_time', 'end_time', 'court__price_per_hour'
+    ).iterator(chunk_size=1000):
+        start_dt = datetime.combine(booking.date, booking.start_time)
+        end_dt = datetime.combine(booking.date, booking.end_time)
+        if end_dt <= start_dt:
+            end_dt += timedelta(days=1)
+
+        booking.duration_minutes = int((end_dt - start_dt).total_seconds() // 60)
+        booking.total_amount = (
+            booking.court.price_per_hour * booking.duration_minutes / 60
+        ).quantize(Decimal('0.01'))
+        batch.append(booking)
+
+        if len(batch) >= 1000:
+            Booking.objects.bulk_update(batch, ['duration_minutes', 'total_amount'])
+            batch = []
+
+    if batch:
+        Booking.objects.bulk_update(batch, ['duration_minutes', 'total_amount'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0004_booking_participants_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='booking',
+            name='duration_minutes',
+            field=models.PositiveIntegerField(default=0, verbose_name='Продолжительность (мин)'),
+        ),
+        migrations.AddField(
+            model_name='booking',
+            name='total_amount',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Стоимость по цене корта на момент бронирования', max_digits=10, verbose_name='Сумма'),
+        ),
+        migrations.RunPython(snapshot_existing_prices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0005_booking_price_snapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['status', 'date'], name='booking_boo_status_6f8d87_idx'),
+        ),
+    ]
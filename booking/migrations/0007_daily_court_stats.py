@@ -0,0 +1,74 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:23
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_stats(apps, schema_editor):
+    """Агрегаты по (дата, корт, час) для существующих действующих бронирований"""
+    Booking = apps.get_model('booking', 'Booking')
+    DailyCourtStats = apps.get_model('booking', 'DailyCourtStats')
+
+    rows = {}
+
+    def row(key):
+        if key not in rows:
+            rows[key] = {'booked_minutes': 0, 'bookings_count': 0, 'confirmed_count': 0, 'revenue': Decimal('0')}
+        return rows[key]
+
+    bookings = Booking.objects.filter(status__in=('pending', 'confirmed')).values_list(
+        'court_id', 'date', 'status', 'start_time', 'end_time', 'total_amount'
+    )
+    for court_id, booking_date, status, start_time, end_time, total_amount in bookings.iterator(chunk_size=2000):
+        start = start_time.hour * 60 + start_time.minute
+        end = end_time.hour * 60 + end_time.minute
+        if end <= start:
+            end = 24 * 60  # через полночь - в агрегате дня учитываем до конца суток
+
+        first = row((court_id, booking_date, start_time.hour))
+        first['bookings_count'] += 1
+        if status == 'confirmed':
+            first['confirmed_count'] += 1
+            first['revenue'] += total_amount
+
+        for hour in range(start // 60, -(-end // 60)):
+            minutes = min(end, (hour + 1) * 60) - max(start, hour * 60)
+            if minutes > 0:
+                row((court_id, booking_date, hour))['booked_minutes'] += minutes
+
+    DailyCourtStats.objects.bulk_create([
+        DailyCourtStats(court_id=court_id, date=booking_date, hour=hour, **data)
+        for (court_id, booking_date, hour), data in rows.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0006_booking_status_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCourtStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('hour', models.PositiveSmallIntegerField(verbose_name='Час')),
+                ('booked_minutes', models.PositiveIntegerField(default=0, help_text='Минуты этого часа, занятые действующими бронированиями', verbose_name='Занято минут')),
+                ('bookings_count', models.PositiveIntegerField(default=0, help_text='Действующие бронирования, начинающиеся в этот час', verbose_name='Бронирований')),
+                ('confirmed_count', models.PositiveIntegerField(default=0, help_text='Подтверждённые бронирования, начинающиеся в этот час', verbose_name='Подтверждённых бронирований')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, help_text='Сумма подтверждённых бронирований, начинающихся в этот час', max_digits=12, verbose_name='Выручка')),
+                ('court', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='booking.court', verbose_name='Корт')),
+            ],
+            options={
+                'verbose_name': 'Статистика корта за час',
+                'verbose_name_plural': 'Статистика кортов по часам',
+                'ordering': ['date', 'court', 'hour'],
+                'constraints': [models.UniqueConstraint(fields=('date', 'court', 'hour'), name='unique_daily_court_stats')],
+            },
+        ),
+        migrations.RunPython(build_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_totals(apps, schema_editor):
+    """Итоги дней и накопленные суммы по уже посчитанному DailyCourtStats"""
+    from django.db.models import Sum
+
+    DailyCourtStats = apps.get_model('booking', 'DailyCourtStats')
+    DailyCourtTotals = apps.get_model('booking', 'DailyCourtTotals')
+
+    days = DailyCourtStats.objects.values('court_id', 'date').annotate(
+        minutes=Sum('booked_minutes'),
+        bookings=Sum('bookings_count'),
+        confirmed=Sum('confirmed_count'),
+        amount=Sum('revenue'),
+    ).order_by('court_id', 'date')
+
+    rows = []
+    running = {}
+    for item in days.iterator():
+        if not (item['minutes'] or item['bookings'] or item['confirmed'] or item['amount']):
+            continue
+
+        cumulative = running.setdefault(item['court_id'], [0, 0, 0, 0])
+        cumulative[0] += item['minutes']
+        cumulative[1] += item['bookings']
+        cumulative[2] += item['confirmed']
+        cumulative[3] += item['amount']
+
+        rows.append(DailyCourtTotals(
+            court_id=item['court_id'],
+            date=item['date'],
+            booked_minutes=item['minutes'],
+            bookings_count=item['bookings'],
+            confirmed_count=item['confirmed'],
+            revenue=item['amount'],
+            cum_booked_minutes=cumulative[0],
+            cum_bookings_count=cumulative[1],
+            cum_confirmed_count=cumulative[2],
+            cum_revenue=cumulative[3],
+        ))
+
+    DailyCourtTotals.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0007_daily_court_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyCourtTotals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Дата')),
+                ('booked_minutes', models.PositiveIntegerField(default=0, verbose_name='Занято минут')),
+                ('bookings_count', models.PositiveIntegerField(default=0, verbose_name='Бронирований')),
+                ('confirmed_count', models.PositiveIntegerField(default=0, verbose_name='Подтверждённых бронирований')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Выручка')),
+                ('cum_booked_minutes', models.PositiveBigIntegerField(default=0, verbose_name='Занято минут (накопленно)')),
+                ('cum_bookings_count', models.PositiveIntegerField(default=0, verbose_name='Бронирований (накопленно)')),
+                ('cum_confirmed_count', models.PositiveIntegerField(default=0, verbose_name='Подтверждённых (накопленно)')),
+                ('cum_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14, verbose_name='Выручка (накопленно)')),
+                ('court', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_totals', to='booking.court', verbose_name='Корт')),
+            ],
+            options={
+                'verbose_name': 'Итоги корта за день',
+                'verbose_name_plural': 'Итоги кортов по дням',
+                'ordering': ['court', 'date'],
+                'constraints': [models.UniqueConstraint(fields=('court', 'date'), name='unique_daily_court_totals')],
+            },
+        ),
+        migrations.RunPython(build_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:37
+
+from collections import defaultdict
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def build_cohorts(apps, schema_editor):
+    """Активность пользователей по месяцам и ячейки когорт по существующим бронированиям"""
+    from django.db.models import Count
+    from django.db.models.functions import TruncMonth
+    from django.utils import timezone
+
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    Booking = apps.get_model('booking', 'Booking')
+    UserMonthActivity = apps.get_model('booking', 'UserMonthActivity')
+    CohortCell = apps.get_model('booking', 'CohortCell')
+
+    active = ('pending', 'confirmed')
+    counts = defaultdict(int)
+
+    created = Booking.objects.filter(status__in=active).annotate(
+        month=TruncMonth('date')
+    ).values('user_id', 'month').annotate(total=Count('id')).order_by()
+
+    as_partner = Booking.partners.through.objects.filter(
+        booking__status__in=active
+    ).annotate(month=TruncMonth('booking__date')).values('user_id', 'month').annotate(
+        total=Count('id')
+    ).order_by()
+
+    for queryset in (created, as_partner):
+        for user_id, month, total in queryset.values_list('user_id', 'month', 'total'):
+            counts[(user_id, month)] += total
+
+    # Месяц регистрации в локальной временной зоне, как cohorts.cohort_month
+    cohorts = {
+        user_id: timezone.localtime(date_joined).date().replace(day=1)
+        for user_id, date_joined in User.objects.filter(
+            id__in={user_id for user_id, _ in counts}
+        ).values_list('id', 'date_joined')
+    }
+
+    cells = defaultdict(int)
+    activities = []
+    for (user_id, month), total in counts.items():
+        activities.append(UserMonthActivity(user_id=user_id, month=month, bookings_count=total))
+        cells[(cohorts[user_id], month)] += 1
+
+    UserMonthActivity.objects.bulk_create(activities, batch_size=1000)
+    CohortCell.objects.bulk_create(
+        [
+            CohortCell(cohort_month=cohort, activity_month=month, users_count=users)
+            for (cohort, month), users in cells.items()
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0008_daily_court_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CohortCell',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cohort_month', models.DateField(verbose_name='Месяц регистрации')),
+                ('activity_month', models.DateField(verbose_name='Месяц активности')),
+                ('users_count', models.PositiveIntegerField(default=0, verbose_name='Активных пользователей')),
+            ],
+            options={
+                'verbose_name': 'Ячейка когорты',
+                'verbose_name_plural': 'Когорты',
+                'ordering': ['cohort_month', 'activity_month'],
+                'constraints': [models.UniqueConstraint(fields=('cohort_month', 'activity_month'), name='unique_cohort_cell')],
+            },
+        ),
+        migrations.CreateModel(
+            name='UserMonthActivity',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(help_text='Первое число месяца', verbose_name='Месяц')),
+                ('bookings_count', models.PositiveIntegerField(default=0, verbose_name='Бронирований')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='month_activity', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Активность пользователя за месяц',
+                'verbose_name_plural': 'Активность пользователей по месяцам',
+                'constraints': [models.UniqueConstraint(fields=('user', 'month'), name='unique_user_month_activity')],
+            },
+        ),
+        migrations.RunPython(build_cohorts, migrations.RunPython.noop),
+    ]
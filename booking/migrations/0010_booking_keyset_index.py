@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:46
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('booking', '0009_cohorts'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='booking_boo_date_804790_idx',
+        ),
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['date', 'start_time', 'id'], name='booking_boo_date_c60da7_idx'),
+        ),
+    ]
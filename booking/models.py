@@ -2,7 +2,8 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import datetime, timedelta
-from django.db.models.signals import pre_save
+from decimal import Decimal
+from django.db.models.signals import pre_save, m2m_changed
 from django.dispatch import receiver
 
 
@@ -23,6 +24,53 @@ class Court(models.Model):
         return self.name
 
 
+class BookingQuerySet(models.QuerySet):
+    """Аннотации продолжительности, стоимости и состава на стороне базы данных"""
+
+    ACTIVE_STATUSES = ('pending', 'confirmed')
+
+    def active(self):
+        """Действующие бронирования (ожидают или подтверждены)"""
+        return self.filter(status__in=self.ACTIVE_STATUSES)
+
+    def confirmed(self):
+        return self.filter(status='confirmed')
+
+    def with_duration(self):
+        """duration_hours - продолжительность в часах с учётом минут"""
+        return self.annotate(
+            duration_hours=models.ExpressionWrapper(
+                models.F('duration_minutes') / 60.0,
+                output_field=models.FloatField()
+            )
+        )
+
+    def with_price(self):
+        """price - стоимость бронирования, price_per_player - доля одного участника (как price_per_person)"""
+        from django.db.models.functions import Cast, Round
+
+        amount_field = models.DecimalField(max_digits=10, decimal_places=2)
+        # SQLite хранит целые суммы как INTEGER и делит нацело - делитель приводим к дробному
+        share = models.F('total_amount') / Cast('participants_count', models.FloatField())
+
+        return self.annotate(
+            price=models.F('total_amount'),
+            price_per_player=Round(Cast(share, amount_field), 2, output_field=amount_field)
+        )
+
+    def with_participants(self):
+        """players_count - участников (создатель + партнёры), free_places - свободных мест"""
+        from django.db.models.functions import Greatest
+
+        return self.annotate(
+            players_count=models.F('participants_count'),
+            free_places=Greatest(
+                models.F('max_players') - models.F('participants_count'),
+                models.Value(0)
+            )
+        )
+
+
 class Booking(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='bookings_created', verbose_name='Создатель')
     court = models.ForeignKey(Court, on_delete=models.CASCADE)
@@ -30,11 +78,13 @@ class Booking(models.Model):
     start_time = models.TimeField()
     end_time = models.TimeField()
     created_at = models.DateTimeField(auto_now_add=True)
-    status = models.CharField(max_length=20, choices=[
+
+    STATUS_CHOICES = [
         ('pending', 'В ожидании'),
         ('confirmed', 'Подтверждено'),
         ('cancelled', 'Отменено'),
-    ], default='pending')
+    ]
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
     confirmed_at = models.DateTimeField(null=True, blank=True)
 
     # Тип бронирования
@@ -91,13 +141,33 @@ class Booking(models.Model):
         verbose_name='Требуемые уровни игры',
         help_text='Список буквенных рейтингов для поиска партнёров (например: ["C+", "B-", "B"])'
     )
+    participants_count = models.PositiveSmallIntegerField(
+        default=1,
+        verbose_name='Участников',
+        help_text='Создатель + партнёры (обновляется автоматически при изменении партнёров)'
+    )
+
+    # Снимок стоимости на момент создания/изменения времени (для агрегации в SQL)
+    duration_minutes = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Продолжительность (мин)'
+    )
+    total_amount = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        verbose_name='Сумма',
+        help_text='Стоимость по цене корта на момент бронирования'
+    )
+
+    objects = BookingQuerySet.as_manager()
 
     class Meta:
         ordering = ['-date', '-start_time']
         indexes = [
             models.Index(fields=['court', 'date', 'status']),
             models.Index(fields=['user']),
-            models.Index(fields=['date', 'start_time']),
+            models.Index(fields=['date', 'start_time', 'id']),  # Keyset-пагинация списка менеджера
             models.Index(fields=['status']),
             models.Index(fields=['looking_for_partner', 'date']),
             # Новые индексы для оптимизации
@@ -105,6 +175,7 @@ class Booking(models.Model):
             models.Index(fields=['coach', 'date']),  # Поиск тренировок по тренеру
             models.Index(fields=['booking_type']),  # Фильтрация по типу бронирования
             models.Index(fields=['booking_type', 'date']),  # Поиск игр/тренировок по дате
+            models.Index(fields=['status', 'date']),  # Финансовая аналитика по диапазону дат
         ]
 
     def __str__(self):
@@ -112,33 +183,144 @@ class Booking(models.Model):
         display_name = full_name if full_name else self.user.username
         return f"{display_name} - {self.court.name} - {self.date}"
 
+    # Поля, изменения которых отслеживают save() и сигналы (слоты, стоимость, агрегаты, статистика, когорты)
+    TRACKED_FIELDS = ('user_id', 'court_id', 'date', 'start_time', 'end_time', 'status',
+                      'duration_minutes', 'total_amount')
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Запоминаем загруженное состояние, чтобы не пересоздавать захваты слотов без изменений
+        instance._loaded_state = instance.tracked_state()
+        return instance
+
+    def tracked_state(self):
+        """Текущие значения отслеживаемых полей"""
+        return {name: self.__dict__.get(name) for name in self.TRACKED_FIELDS}
+
     @property
-    def total_price(self):
-        """Рассчитывает общую стоимость бронирования"""
+    def loaded_state(self):
+        """Значения отслеживаемых полей при загрузке или последнем save() (None - ещё не сохранено)"""
+        return getattr(self, '_loaded_state', None)
+
+    @staticmethod
+    def _slot_key(state):
+        """Поля, от которых зависят захваченные слоты"""
+        if state is None:
+            return None
+        return (
+            state['court_id'],
+            state['date'],
+            state['start_time'],
+            state['end_time'],
+            state['status'] in ('pending', 'confirmed'),
+        )
+
+    @staticmethod
+    def _price_key(state):
+        """Поля, от которых зависит стоимость"""
+        if state is None:
+            return None
+        return state['court_id'], state['start_time'], state['end_time']
+
+    @staticmethod
+    def _rollup_key(state):
+        """Поля, от которых зависят агрегаты аналитики (DailyCourtStats)"""
+        if state is None:
+            return None
+        return (
+            state['court_id'],
+            state['date'],
+            state['start_time'],
+            state['end_time'],
+            state['status'],
+            state['total_amount'],
+        )
+
+    @staticmethod
+    def _stats_key(state):
+        """Поля, от которых зависит статистика игроков (PlayerStatsSnapshot)"""
+        if state is None:
+            return None
+        return (
+            state['status'],
+            state['user_id'],
+            state['court_id'],
+            state['date'],
+            state['duration_minutes'],
+            state['total_amount'],
+        )
+
+    @staticmethod
+    def _cohort_key(state):
+        """Поля, от которых зависит активность участников по месяцам (когорты)"""
+        if state is None:
+            return None
+        booking_date = state['date']
+        return (
+            state['user_id'],
+            booking_date.replace(day=1) if booking_date else None,
+            state['status'] in ('pending', 'confirmed'),
+        )
+
+    def calculate_amounts(self):
+        """Продолжительность в минутах и стоимость по текущей цене корта"""
         start_dt = datetime.combine(self.date, self.start_time)
         end_dt = datetime.combine(self.date, self.end_time)
 
         if end_dt <= start_dt:
             end_dt += timedelta(days=1)  # на случай если бронирование через полночь
 
-        duration_hours = (end_dt - start_dt).total_seconds() / 3600
-        return round(float(self.court.price_per_hour) * duration_hours, 2)
+        duration_minutes = int((end_dt - start_dt).total_seconds() // 60)
+        price_per_hour = Decimal(str(self.court.price_per_hour))
+        total_amount = (price_per_hour * duration_minutes / 60).quantize(Decimal('0.01'))
+        return duration_minutes, total_amount
+
+    def save(self, *args, **kwargs):
+        """
+        Сохранение вместе с захватом слотов в одной транзакции
+
+        Если слот уже захвачен другим бронированием, уникальный индекс
+        BookingSlotClaim вызывает IntegrityError и сохранение откатывается.
+        Снимок стоимости пересчитывается только при смене корта или времени.
+        """
+        from django.db import transaction
+
+        if self._state.adding or self._price_key(self.loaded_state) != self._price_key(self.tracked_state()):
+            self.duration_minutes, self.total_amount = self.calculate_amounts()
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'duration_minutes', 'total_amount'}
+
+        slots_changed = self._slot_key(self.loaded_state) != self._slot_key(self.tracked_state())
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if slots_changed:
+                BookingSlotClaim.objects.sync_for_booking(self)
+
+        self._loaded_state = self.tracked_state()
+
+    @property
+    def total_price(self):
+        """Общая стоимость бронирования (сохранённый снимок)"""
+        if self.pk is None:
+            return float(self.calculate_amounts()[1])
+        return float(self.total_amount)
 
     @property
     def price_per_person(self):
         """Рассчитывает стоимость на одного человека"""
         total = self.total_price
         # Количество участников = создатель + партнёры (без тренера)
-        participants_count = 1 + self.partners.count()
-        if participants_count > 1:
-            return round(total / participants_count, 2)
+        if self.participants_count > 1:
+            return round(total / self.participants_count, 2)
         return total
 
     @property
     def available_slots(self):
         """Количество свободных мест для партнёров"""
-        current_players = 1 + self.partners.count()  # создатель + партнёры
-        return max(0, self.max_players - current_players)
+        return max(0, self.max_players - self.participants_count)
 
     @property
     def is_full(self):
@@ -151,6 +333,15 @@ class Booking(models.Model):
         participants.extend(list(self.partners.all()))
         return participants
 
+    def is_partner(self, user):
+        """Является ли пользователь партнёром (по предзагруженным партнёрам, если они есть)"""
+        prefetched = getattr(self, 'partners_list', None)
+        if prefetched is None:
+            prefetched = getattr(self, '_prefetched_objects_cache', {}).get('partners')
+        if prefetched is not None:
+            return any(partner.pk == user.pk for partner in prefetched)
+        return self.partners.filter(pk=user.pk).exists()
+
     def can_join(self, user, skip_rating_check=False):
         """Проверка, может ли пользователь присоединиться к бронированию
 
@@ -168,7 +359,7 @@ class Booking(models.Model):
             return False, "Нет свободных мест"
 
         # 3. Пользователь уже является участником
-        if user == self.user or user in self.partners.all():
+        if user.pk == self.user_id or self.is_partner(user):
             return False, "Вы уже являетесь участником"
 
         # 4. Бронирование отменено
@@ -247,6 +438,212 @@ class Booking(models.Model):
         return False
 
 
+class BookingSlotClaimManager(models.Manager):
+    def slot_numbers(self, start_time, end_time):
+        """Номера 30-минутных слотов суток, которые занимает интервал [start_time, end_time)"""
+        from .constants import OCCUPANCY_SLOT_MINUTES
+
+        start_minutes = start_time.hour * 60 + start_time.minute
+        end_minutes = end_time.hour * 60 + end_time.minute
+        return range(
+            start_minutes // OCCUPANCY_SLOT_MINUTES,
+            -(-end_minutes // OCCUPANCY_SLOT_MINUTES)
+        )
+
+    def sync_for_booking(self, booking):
+        """
+        Приводит захваты слотов в соответствие с бронированием
+
+        Активное бронирование захватывает свои слоты одной вставкой,
+        отменённое - освобождает их.
+        """
+        self.filter(booking=booking).delete()
+
+        if booking.status not in ('pending', 'confirmed'):
+            return
+
+        self.bulk_create([
+            self.model(court_id=booking.court_id, date=booking.date, slot=slot, booking=booking)
+            for slot in self.slot_numbers(booking.start_time, booking.end_time)
+        ])
+
+
+class BookingSlotClaim(models.Model):
+    """
+    Захват слота корта активным бронированием
+
+    Уникальность (корт, дата, слот) гарантирует на уровне БД,
+    что одно время нельзя забронировать дважды (работает и в SQLite, и в PostgreSQL).
+    """
+
+    court = models.ForeignKey(
+        Court,
+        on_delete=models.CASCADE,
+        related_name='slot_claims',
+        verbose_name='Корт'
+    )
+    date = models.DateField(verbose_name='Дата')
+    slot = models.PositiveSmallIntegerField(
+        verbose_name='Слот',
+        help_text='Номер 30-минутного слота от начала суток'
+    )
+    booking = models.ForeignKey(
+        Booking,
+        on_delete=models.CASCADE,
+        related_name='slot_claims',
+        verbose_name='Бронирование'
+    )
+
+    objects = BookingSlotClaimManager()
+
+    class Meta:
+        verbose_name = 'Захват слота'
+        verbose_name_plural = 'Захваты слотов'
+        constraints = [
+            models.UniqueConstraint(fields=['court', 'date', 'slot'], name='unique_court_date_slot_claim'),
+        ]
+
+    def __str__(self):
+        return f"{self.court_id} - {self.date} - слот {self.slot} (бронирование #{self.booking_id})"
+
+
+class DailyCourtStats(models.Model):
+    """
+    Агрегат загруженности и выручки по (дата, корт, час)
+
+    Пересчитывается по дню корта при изменении бронирований (booking.signals)
+    и командой rebuild_rollups. Аналитика читает агрегат вместо бронирований.
+    """
+
+    date = models.DateField(verbose_name='Дата')
+    court = models.ForeignKey(
+        Court,
+        on_delete=models.CASCADE,
+        related_name='daily_stats',
+        verbose_name='Корт'
+    )
+    hour = models.PositiveSmallIntegerField(verbose_name='Час')
+    booked_minutes = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Занято минут',
+        help_text='Минуты этого часа, занятые действующими бронированиями'
+    )
+    bookings_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Бронирований',
+        help_text='Действующие бронирования, начинающиеся в этот час'
+    )
+    confirmed_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подтверждённых бронирований',
+        help_text='Подтверждённые бронирования, начинающиеся в этот час'
+    )
+    revenue = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name='Выручка',
+        help_text='Сумма подтверждённых бронирований, начинающихся в этот час'
+    )
+
+    class Meta:
+        verbose_name = 'Статистика корта за час'
+        verbose_name_plural = 'Статистика кортов по часам'
+        ordering = ['date', 'court', 'hour']
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'court', 'hour'], name='unique_daily_court_stats'),
+        ]
+
+    def __str__(self):
+        return f"{self.court_id} - {self.date} {self.hour:02d}:00"
+
+
+class DailyCourtTotals(models.Model):
+    """
+    Итоги корта за день с накопленными суммами (префиксные суммы)
+
+    Строка есть только для дней с действующими бронированиями. cum_* - итоги
+    корта с первого дня по этот день включительно, поэтому итог за любой период
+    равен разности двух строк (booking.rollups.range_totals).
+    Поддерживается вместе с DailyCourtStats.
+    """
+
+    date = models.DateField(verbose_name='Дата')
+    court = models.ForeignKey(
+        Court,
+        on_delete=models.CASCADE,
+        related_name='daily_totals',
+        verbose_name='Корт'
+    )
+    booked_minutes = models.PositiveIntegerField(default=0, verbose_name='Занято минут')
+    bookings_count = models.PositiveIntegerField(default=0, verbose_name='Бронирований')
+    confirmed_count = models.PositiveIntegerField(default=0, verbose_name='Подтверждённых бронирований')
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='Выручка')
+
+    cum_booked_minutes = models.PositiveBigIntegerField(default=0, verbose_name='Занято минут (накопленно)')
+    cum_bookings_count = models.PositiveIntegerField(default=0, verbose_name='Бронирований (накопленно)')
+    cum_confirmed_count = models.PositiveIntegerField(default=0, verbose_name='Подтверждённых (накопленно)')
+    cum_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0, verbose_name='Выручка (накопленно)')
+
+    class Meta:
+        verbose_name = 'Итоги корта за день'
+        verbose_name_plural = 'Итоги кортов по дням'
+        ordering = ['court', 'date']
+        constraints = [
+            models.UniqueConstraint(fields=['court', 'date'], name='unique_daily_court_totals'),
+        ]
+
+    def __str__(self):
+        return f"{self.court_id} - {self.date}"
+
+
+class UserMonthActivity(models.Model):
+    """
+    Активность пользователя за месяц (для когорт)
+
+    Строка есть, только если у пользователя в месяце есть действующие
+    бронирования (как создателя или партнёра). Поддерживается booking.cohorts.
+    """
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='month_activity',
+        verbose_name='Пользователь'
+    )
+    month = models.DateField(verbose_name='Месяц', help_text='Первое число месяца')
+    bookings_count = models.PositiveIntegerField(default=0, verbose_name='Бронирований')
+
+    class Meta:
+        verbose_name = 'Активность пользователя за месяц'
+        verbose_name_plural = 'Активность пользователей по месяцам'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month'], name='unique_user_month_activity'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} - {self.month:%Y-%m}"
+
+
+class CohortCell(models.Model):
+    """Число активных пользователей когорты (месяц регистрации) в месяце активности"""
+
+    cohort_month = models.DateField(verbose_name='Месяц регистрации')
+    activity_month = models.DateField(verbose_name='Месяц активности')
+    users_count = models.PositiveIntegerField(default=0, verbose_name='Активных пользователей')
+
+    class Meta:
+        verbose_name = 'Ячейка когорты'
+        verbose_name_plural = 'Когорты'
+        ordering = ['cohort_month', 'activity_month']
+        constraints = [
+            models.UniqueConstraint(fields=['cohort_month', 'activity_month'], name='unique_cohort_cell'),
+        ]
+
+    def __str__(self):
+        return f"{self.cohort_month:%Y-%m} / {self.activity_month:%Y-%m}: {self.users_count}"
+
+
 class Payment(models.Model):
     """Модель платежа за бронирование"""
 
@@ -552,4 +949,42 @@ def set_invitee_by_phone(sender, instance, **kwargs):
             user = UserProfile.objects.get_user_by_phone(normalized_phone)
             if user:
                 instance.invitee = user
-                instance.invitee_phone = normalized_phone
\ No newline at end of file
+                instance.invitee_phone = normalized_phone
+
+
+def refresh_participants_count(booking_ids):
+    """Пересчитывает participants_count для бронирований одним UPDATE"""
+    from django.db.models import Count, OuterRef, Subquery, Value
+    from django.db.models.functions import Coalesce
+
+    partners_count = Booking.partners.through.objects.filter(
+        booking_id=OuterRef('pk')
+    ).values('booking_id').annotate(total=Count('id')).values('total')
+
+    return Booking.objects.filter(pk__in=booking_ids).update(
+        participants_count=Value(1) + Coalesce(Subquery(partners_count), Value(0))
+    )
+
+
+@receiver(m2m_changed, sender=Booking.partners.through)
+def update_participants_count(sender, instance, action, reverse, pk_set, **kwargs):
+    """Поддерживает счётчик участников при изменении партнёров"""
+    if action == 'pre_clear' and reverse:
+        # После очистки с обратной стороны список бронирований уже не получить
+        instance._cleared_booking_ids = list(
+            sender.objects.filter(user_id=instance.pk).values_list('booking_id', flat=True)
+        )
+        return
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        refresh_participants_count([instance.pk])
+        instance.participants_count = Booking.objects.values_list(
+            'participants_count', flat=True
+        ).get(pk=instance.pk)
+    elif action == 'post_clear':
+        refresh_participants_count(getattr(instance, '_cleared_booking_ids', []))
+    elif pk_set:
+        refresh_participants_count(pk_set)
@@ -0,0 +1,223 @@
+"""
+Индекс занятости кортов
+Компактная битовая карта на пару (корт, дата) в кэше.
+Карта строится из базы при чтении; ключ версионируется счётчиком поколения
+дня, поэтому изменение бронирования - один атомарный инкремент, а не
+чтение-изменение-запись карты
+"""
+from django.core.cache import cache
+from datetime import timedelta
+import time
+import logging
+
+from .constants import (
+    WORKING_HOURS_START,
+    WORKING_HOURS_END,
+    OCCUPANCY_SLOT_MINUTES,
+    OCCUPANCY_CACHE_TIMEOUT,
+)
+
+logger = logging.getLogger(__name__)
+
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+# Количество слотов в рабочем дне (08:00-22:00 по 30 минут = 28 слотов)
+SLOTS_PER_HOUR = 60 // OCCUPANCY_SLOT_MINUTES
+SLOTS_PER_DAY = (WORKING_HOURS_END - WORKING_HOURS_START) * SLOTS_PER_HOUR
+
+
+def _generation_key(court_id, booking_date):
+    return f'occupancy_gen_{court_id}_{booking_date.strftime("%Y-%m-%d")}'
+
+
+def _cache_key(court_id, booking_date, generation):
+    return f'occupancy_{court_id}_{booking_date.strftime("%Y-%m-%d")}_v{generation}'
+
+
+def _get_generations(pairs):
+    """
+    Текущие поколения карт для пар (корт, дата) одним get_many
+
+    Начальное значение берётся от времени, чтобы после вытеснения счётчика
+    из кэша не переиспользовать старые версии карт.
+    """
+    keys = {_generation_key(court_id, day): (court_id, day) for court_id, day in pairs}
+    generations = cache.get_many(list(keys))
+
+    missing = [key for key in keys if key not in generations]
+    if missing:
+        initial = int(time.time() * 1000)
+        for key in missing:
+            cache.add(key, initial, None)
+        generations.update(cache.get_many(missing))
+
+    return {pair: generations.get(key, 0) for key, pair in keys.items()}
+
+
+def invalidate(court_id, booking_date):
+    """Сдвигает поколение карты дня: следующее чтение построит её из базы"""
+    key = _generation_key(court_id, booking_date)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Счётчика нет в кэше - заводим новый
+        cache.add(key, int(time.time() * 1000), None)
+
+
+def _minutes_from_open(value):
+    """Минуты от начала рабочего дня"""
+    return (value.hour - WORKING_HOURS_START) * 60 + value.minute
+
+
+def slot_range(start_time, end_time):
+    """
+    Индексы слотов, которые затрагивает интервал [start_time, end_time)
+
+    Частично занятый слот считается занятым целиком.
+    """
+    first = max(_minutes_from_open(start_time) // OCCUPANCY_SLOT_MINUTES, 0)
+    end_minutes = _minutes_from_open(end_time)
+    last = min(-(-end_minutes // OCCUPANCY_SLOT_MINUTES), SLOTS_PER_DAY)
+    return range(first, max(first, last))
+
+
+def interval_mask(start_time, end_time):
+    """Битовая маска интервала времени"""
+    slots = slot_range(start_time, end_time)
+    if not slots:
+        return 0
+    return ((1 << len(slots)) - 1) << slots.start
+
+
+def hour_mask(hour, duration_hours=1):
+    """Битовая маска для целых часов [hour, hour + duration_hours)"""
+    first = (hour - WORKING_HOURS_START) * SLOTS_PER_HOUR
+    return ((1 << (duration_hours * SLOTS_PER_HOUR)) - 1) << first
+
+
+def bitmap_from_intervals(intervals):
+    """Собирает битовую карту из списка пар (start_time, end_time)"""
+    bitmap = 0
+    for start_time, end_time in intervals:
+        bitmap |= interval_mask(start_time, end_time)
+    return bitmap
+
+
+def build_day_bitmap(court_id, booking_date):
+    """Строит битовую карту дня по базе данных (холодный промах кэша)"""
+    from .models import Booking
+
+    intervals = Booking.objects.filter(
+        court_id=court_id,
+        date=booking_date,
+        status__in=ACTIVE_STATUSES
+    ).values_list('start_time', 'end_time')
+
+    return bitmap_from_intervals(intervals)
+
+
+def get_day_bitmap(court_id, booking_date):
+    """
+    Битовая карта занятости корта на дату
+
+    Строится лениво: база читается только при отсутствии карты в кэше.
+    """
+    generation = _get_generations([(court_id, booking_date)])[(court_id, booking_date)]
+    key = _cache_key(court_id, booking_date, generation)
+    bitmap = cache.get(key)
+
+    if bitmap is None:
+        bitmap = build_day_bitmap(court_id, booking_date)
+        cache.set(key, bitmap, OCCUPANCY_CACHE_TIMEOUT)
+        logger.debug(f"Occupancy bitmap built for court {court_id} on {booking_date}")
+
+    return bitmap
+
+
+def get_range_bitmaps(court_ids, start_date, end_date):
+    """
+    Битовые карты для набора кортов за диапазон дат
+
+    Недостающие в кэше карты строятся одним запросом по диапазону
+    (индекс court, date, status) и сразу кладутся в кэш.
+
+    Returns:
+        dict {(court_id, date): bitmap}
+    """
+    from .models import Booking
+
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    generations = _get_generations([(court_id, day) for court_id in court_ids for day in days])
+    keys = {
+        _cache_key(court_id, day, generation): (court_id, day)
+        for (court_id, day), generation in generations.items()
+    }
+
+    cached = cache.get_many(list(keys.keys()))
+    bitmaps = {keys[key]: bitmap for key, bitmap in cached.items()}
+
+    missing = [pair for key, pair in keys.items() if key not in cached]
+    if missing:
+        missing_courts = {court_id for court_id, _ in missing}
+        missing_days = [day for _, day in missing]
+
+        built = {pair: 0 for pair in missing}
+        intervals = Booking.objects.filter(
+            court_id__in=missing_courts,
+            date__range=[min(missing_days), max(missing_days)],
+            status__in=ACTIVE_STATUSES
+        ).values_list('court_id', 'date', 'start_time', 'end_time')
+
+        for court_id, day, start_time, end_time in intervals:
+            if (court_id, day) in built:
+                built[(court_id, day)] |= interval_mask(start_time, end_time)
+
+        cache.set_many(
+            {
+                _cache_key(court_id, day, generations[(court_id, day)]): bitmap
+                for (court_id, day), bitmap in built.items()
+            },
+            OCCUPANCY_CACHE_TIMEOUT
+        )
+        bitmaps.update(built)
+
+    return bitmaps
+
+
+def hours_string(bitmap):
+    """Строка занятости по часам рабочего дня: '1' - занято, '0' - свободно"""
+    return ''.join(
+        '0' if is_free(bitmap, hour_mask(hour)) else '1'
+        for hour in range(WORKING_HOURS_START, WORKING_HOURS_END)
+    )
+
+
+def is_free(bitmap, mask):
+    """Свободен ли интервал, заданный маской"""
+    return bitmap & mask == 0
+
+
+def free_hours(bitmap, duration_hours=1):
+    """Список часов начала, с которых корт свободен duration_hours часов подряд"""
+    return [
+        hour
+        for hour in range(WORKING_HOURS_START, WORKING_HOURS_END - duration_hours + 1)
+        if is_free(bitmap, hour_mask(hour, duration_hours))
+    ]
+
+
+def invalidate_days(days):
+    """
+    Сдвигает поколения карт и списков слотов для пар (корт, дата)
+
+    Вызывается сигналами Booking после фиксации транзакции: затронутые дни
+    строятся заново из базы при следующем чтении.
+    """
+    from . import slot_cache
+
+    for court_id, booking_date in days:
+        try:
+            invalidate(court_id, booking_date)
+            slot_cache.invalidate(court_id, booking_date)
+        except Exception as e:
+            logger.error(f"Error updating occupancy index: {str(e)}")
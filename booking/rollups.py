@@ -0,0 +1,277 @@
+"""
+Агрегаты аналитики (rollup)
+DailyCourtStats по (дата, корт, час) пересчитываются целиком для дня корта,
+DailyCourtTotals хранит итоги дня корта и накопленные суммы
+"""
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from datetime import timedelta
+from decimal import Decimal
+
+from .models import Booking, Court, DailyCourtStats, DailyCourtTotals
+
+ACTIVE_STATUSES = ('pending', 'confirmed')
+
+TOTAL_FIELDS = ('booked_minutes', 'bookings_count', 'confirmed_count', 'revenue')
+
+
+def _minutes(value):
+    return value.hour * 60 + value.minute
+
+
+def _accumulate(rows, court_id, booking_date, status, start_time, end_time, total_amount):
+    """Добавляет одно бронирование в агрегаты дня {(court_id, date, hour): dict}"""
+    if status not in ACTIVE_STATUSES:
+        return
+
+    start = _minutes(start_time)
+    end = _minutes(end_time)
+    if end <= start:
+        end = 24 * 60  # через полночь - в агрегате дня учитываем до конца суток
+
+    def row(hour):
+        key = (court_id, booking_date, hour)
+        if key not in rows:
+            rows[key] = {'booked_minutes': 0, 'bookings_count': 0, 'confirmed_count': 0, 'revenue': Decimal('0')}
+        return rows[key]
+
+    first = row(start_time.hour)
+    first['bookings_count'] += 1
+    if status == 'confirmed':
+        first['confirmed_count'] += 1
+        first['revenue'] += total_amount
+
+    for hour in range(start // 60, -(-end // 60)):
+        minutes = min(end, (hour + 1) * 60) - max(start, hour * 60)
+        if minutes > 0:
+            row(hour)['booked_minutes'] += minutes
+
+
+def _build(bookings):
+    rows = {}
+    for values in bookings.values_list('court_id', 'date', 'status', 'start_time', 'end_time', 'total_amount'):
+        _accumulate(rows, *values)
+
+    return [
+        DailyCourtStats(court_id=court_id, date=booking_date, hour=hour, **data)
+        for (court_id, booking_date, hour), data in rows.items()
+    ]
+
+
+def rebuild_day(court_id, booking_date):
+    """Пересчитывает агрегаты одного дня корта по бронированиям из базы"""
+    with transaction.atomic():
+        DailyCourtStats.objects.filter(court_id=court_id, date=booking_date).delete()
+        DailyCourtStats.objects.bulk_create(_build(
+            Booking.objects.filter(court_id=court_id, date=booking_date, status__in=ACTIVE_STATUSES)
+        ))
+        _refresh_day_totals(court_id, booking_date)
+
+
+def rebuild_range(start_date, end_date, court_ids=None, batch_days=31):
+    """
+    Пересчитывает агрегаты за диапазон дат (включительно)
+
+    Returns:
+        Количество записанных строк агрегата
+    """
+    created = 0
+    day = start_date
+    while day <= end_date:
+        batch_end = min(day + timedelta(days=batch_days - 1), end_date)
+
+        stats = DailyCourtStats.objects.filter(date__range=[day, batch_end])
+        bookings = Booking.objects.filter(date__range=[day, batch_end], status__in=ACTIVE_STATUSES)
+        if court_ids:
+            stats = stats.filter(court_id__in=court_ids)
+            bookings = bookings.filter(court_id__in=court_ids)
+
+        with transaction.atomic():
+            stats.delete()
+            created += len(DailyCourtStats.objects.bulk_create(_build(bookings), batch_size=1000))
+
+        day = batch_end + timedelta(days=1)
+
+    # Накопленные суммы меняются и у всех последующих дней
+    rebuild_totals(start_date, court_ids)
+
+    return created
+
+
+def refresh_for_booking(booking, previous=None):
+    """
+    Обновляет агрегаты после изменения бронирования
+
+    Args:
+        booking: Бронирование после изменения
+        previous: (court_id, date) до изменения, если бронирование переносили
+    """
+    days = {(booking.court_id, booking.date)}
+    if previous and previous[0] is not None:
+        days.add(previous)
+
+    for court_id, booking_date in days:
+        rebuild_day(court_id, booking_date)
+
+
+def _zero_totals():
+    return {'booked_minutes': 0, 'bookings_count': 0, 'confirmed_count': 0, 'revenue': Decimal('0')}
+
+
+def _day_totals(stats):
+    """Итоги по (корт, дата) из строк DailyCourtStats"""
+    return stats.values('court_id', 'date').annotate(
+        minutes=Sum('booked_minutes'),
+        bookings=Sum('bookings_count'),
+        confirmed=Sum('confirmed_count'),
+        amount=Sum('revenue'),
+    ).order_by('court_id', 'date')
+
+
+def _refresh_day_totals(court_id, booking_date):
+    """Итоги дня корта по DailyCourtStats и сдвиг накопленных сумм последующих дней"""
+    # Блокировка корта упорядочивает параллельные пересчёты накопленных сумм
+    list(Court.objects.select_for_update().filter(pk=court_id).values_list('pk', flat=True))
+
+    new = _zero_totals()
+    for item in _day_totals(DailyCourtStats.objects.filter(court_id=court_id, date=booking_date)):
+        new = {
+            'booked_minutes': item['minutes'],
+            'bookings_count': item['bookings'],
+            'confirmed_count': item['confirmed'],
+            'revenue': item['amount'],
+        }
+
+    current = DailyCourtTotals.objects.filter(court_id=court_id, date=booking_date).first()
+    old = {field: getattr(current, field) for field in TOTAL_FIELDS} if current else _zero_totals()
+    delta = {field: new[field] - old[field] for field in TOTAL_FIELDS}
+
+    if not any(delta.values()):
+        return
+
+    DailyCourtTotals.objects.filter(court_id=court_id, date__gt=booking_date).update(
+        **{f'cum_{field}': F(f'cum_{field}') + delta[field] for field in TOTAL_FIELDS}
+    )
+
+    if not any(new.values()):
+        current.delete()
+        return
+
+    if current is None:
+        previous = DailyCourtTotals.objects.filter(
+            court_id=court_id, date__lt=booking_date
+        ).order_by('-date').first()
+        current = DailyCourtTotals(court_id=court_id, date=booking_date)
+        for field in TOTAL_FIELDS:
+            setattr(current, f'cum_{field}', getattr(previous, f'cum_{field}') if previous else 0)
+
+    for field in TOTAL_FIELDS:
+        setattr(current, field, new[field])
+        setattr(current, f'cum_{field}', getattr(current, f'cum_{field}') + delta[field])
+    current.save()
+
+
+def rebuild_totals(from_date=None, court_ids=None):
+    """
+    Пересчитывает DailyCourtTotals по DailyCourtStats начиная с from_date
+
+    Returns:
+        Количество записанных строк
+    """
+    stats = DailyCourtStats.objects.all()
+    totals = DailyCourtTotals.objects.all()
+    if from_date:
+        stats = stats.filter(date__gte=from_date)
+        totals = totals.filter(date__gte=from_date)
+    if court_ids:
+        stats = stats.filter(court_id__in=court_ids)
+        totals = totals.filter(court_id__in=court_ids)
+
+    # Накопленные суммы на день перед from_date - база для продолжения
+    base = _totals_at(from_date - timedelta(days=1), court_ids) if from_date else {}
+
+    rows = []
+    running = {}
+    for item in _day_totals(stats):
+        court_id = item['court_id']
+        if court_id not in running:
+            previous = base.get(court_id)
+            running[court_id] = {
+                field: getattr(previous, f'cum_{field}') if previous else 0
+                for field in TOTAL_FIELDS
+            }
+
+        day = {
+            'booked_minutes': item['minutes'],
+            'bookings_count': item['bookings'],
+            'confirmed_count': item['confirmed'],
+            'revenue': item['amount'],
+        }
+        if not any(day.values()):
+            continue
+
+        cumulative = running[court_id]
+        for field in TOTAL_FIELDS:
+            cumulative[field] += day[field]
+
+        rows.append(DailyCourtTotals(
+            court_id=court_id,
+            date=item['date'],
+            **day,
+            **{f'cum_{field}': value for field, value in cumulative.items()}
+        ))
+
+    with transaction.atomic():
+        totals.delete()
+        DailyCourtTotals.objects.bulk_create(rows, batch_size=1000)
+
+    return len(rows)
+
+
+def _totals_at(day, court_ids=None):
+    """Последняя строка DailyCourtTotals не позже day для каждого корта (один запрос)"""
+    latest = DailyCourtTotals.objects.filter(
+        court=OuterRef('pk'), date__lte=day
+    ).order_by('-date').values('id')[:1]
+
+    courts = Court.objects.all()
+    if court_ids:
+        courts = courts.filter(pk__in=court_ids)
+
+    return {
+        row.court_id: row
+        for row in DailyCourtTotals.objects.filter(
+            id__in=courts.annotate(totals_id=Subquery(latest)).values('totals_id')
+        )
+    }
+
+
+def range_totals(start_date, end_date, court_ids=None):
+    """
+    Итоги по кортам за период как разность накопленных сумм
+
+    Returns:
+        dict {court_id: {booked_minutes, bookings_count, confirmed_count, revenue}}
+        (только корты с бронированиями за период)
+    """
+    at_end = _totals_at(end_date, court_ids)
+    before = _totals_at(start_date - timedelta(days=1), court_ids)
+
+    totals = {}
+    for court_id, row in at_end.items():
+        previous = before.get(court_id)
+        values = {
+            field: getattr(row, f'cum_{field}') - (getattr(previous, f'cum_{field}') if previous else 0)
+            for field in TOTAL_FIELDS
+        }
+        if any(values.values()):
+            totals[court_id] = values
+
+    return totals
+
+
+def daily_totals(start_date, end_date):
+    """Итоги дней за период: (court_id, date, booked_minutes, bookings_count, confirmed_count, revenue)"""
+    return DailyCourtTotals.objects.filter(
+        date__range=[start_date, end_date]
+    ).order_by('date').values_list('court_id', 'date', *TOTAL_FIELDS)
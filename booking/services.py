@@ -3,7 +3,16 @@
 """
 from django.utils import timezone
 from django.contrib.auth.models import User
-from .models import Booking, Payment, BookingHistory
+from datetime import timedelta
+from .models import Booking, Court, Payment, BookingHistory
+from . import occupancy, slot_holds
+from .constants import (
+    WORKING_HOURS_START,
+    WORKING_HOURS_END,
+    MIN_BOOKING_DURATION_HOURS,
+    MAX_BOOKING_DURATION_HOURS,
+    SLOT_SEARCH_HORIZON_DAYS,
+)
 import logging
 
 logger = logging.getLogger(__name__)
@@ -148,5 +157,87 @@ class BookingHistoryService:
         )
 
 
+class SlotSearchService:
+    """Сервис поиска ближайших свободных слотов по всем кортам"""
 
+    @staticmethod
+    def find_earliest_slots(duration_hours, earliest_start, max_price_per_hour=None,
+                            court_ids=None, limit=5, horizon_days=SLOT_SEARCH_HORIZON_DAYS,
+                            exclude_holds_of=None):
+        """
+        Найти N самых ранних свободных слотов
+
+        Args:
+            duration_hours: Продолжительность в часах (MIN/MAX_BOOKING_DURATION_HOURS)
+            earliest_start: Самое раннее начало (datetime)
+            max_price_per_hour: Максимальная цена за час (опционально)
+            court_ids: Список ID кортов (опционально)
+            limit: Сколько слотов вернуть
+            horizon_days: Глубина поиска в днях
+            exclude_holds_of: ID пользователя, чьи удержания слотов не считаются занятостью
+
+        Returns:
+            List словарей со слотами, отсортированный по времени начала
+        """
+        if not MIN_BOOKING_DURATION_HOURS <= duration_hours <= MAX_BOOKING_DURATION_HOURS:
+            raise ValueError(
+                f"Продолжительность должна быть от {MIN_BOOKING_DURATION_HOURS} "
+                f"до {MAX_BOOKING_DURATION_HOURS} часов"
+            )
+
+        courts = Court.objects.filter(is_available=True)
+        if court_ids:
+            courts = courts.filter(id__in=court_ids)
+        if max_price_per_hour is not None:
+            courts = courts.filter(price_per_hour__lte=max_price_per_hour)
+
+        courts = list(courts.order_by('name').values('id', 'name', 'price_per_hour'))
+        if not courts:
+            return []
+
+        # Начало поиска округляем вверх до целого часа
+        start_date = earliest_start.date()
+        first_hour = earliest_start.hour + (1 if earliest_start.minute or earliest_start.second else 0)
+        end_date = start_date + timedelta(days=horizon_days - 1)
+
+        # Один проход: битовые карты всех кортов за весь горизонт
+        court_id_list = [court['id'] for court in courts]
+        bitmaps = occupancy.get_range_bitmaps(court_id_list, start_date, end_date)
+
+        # Слоты, удерживаемые другими пользователями на время оформления, тоже заняты
+        held = slot_holds.get_held_bitmaps(court_id_list, start_date, end_date, exclude_holds_of)
+        for pair, held_bitmap in held.items():
+            bitmaps[pair] |= held_bitmap
+
+        # Маски всех возможных начал заданной продолжительности
+        masks = [
+            (hour, occupancy.hour_mask(hour, duration_hours))
+            for hour in range(WORKING_HOURS_START, WORKING_HOURS_END - duration_hours + 1)
+        ]
+
+        slots = []
+        day = start_date
+        while day <= end_date and len(slots) < limit:
+            for hour, mask in masks:
+                if day == start_date and hour < first_hour:
+                    continue
+
+                for court in courts:
+                    if occupancy.is_free(bitmaps[(court['id'], day)], mask):
+                        price_per_hour = float(court['price_per_hour'])
+                        slots.append({
+                            'court_id': court['id'],
+                            'court_name': court['name'],
+                            'date': day.isoformat(),
+                            'start_time': f"{hour:02d}:00",
+                            'end_time': f"{hour + duration_hours:02d}:00",
+                            'duration': duration_hours,
+                            'price_per_hour': price_per_hour,
+                            'total_price': round(price_per_hour * duration_hours, 2),
+                        })
+                        if len(slots) >= limit:
+                            return slots
+
+            day += timedelta(days=1)
 
+        return slots
@@ -0,0 +1,121 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Booking
+from . import analytics_cache, cohorts, occupancy, rollups
+
+
+@receiver(post_save, sender=Booking)
+@receiver(post_delete, sender=Booking)
+@receiver(m2m_changed, sender=Booking.partners.through)
+@receiver(post_save, sender=User)
+def invalidate_analytics_cache(sender, **kwargs):
+    """Закэшированная аналитика устаревает после фиксации изменений бронирований и регистраций"""
+    # Пользователь сохраняется и при каждом входе (last_login) - в аналитике важна только регистрация
+    if sender is User and not kwargs.get('created'):
+        return
+    transaction.on_commit(analytics_cache.invalidate)
+
+
+@receiver(post_save, sender=Booking)
+def invalidate_occupancy_on_save(sender, instance, created, **kwargs):
+    """Индекс занятости и кэш слотов устаревают при создании, отмене или переносе бронирования"""
+    loaded = Booking._slot_key(instance.loaded_state)
+    current = Booking._slot_key(instance.tracked_state())
+
+    if not created and loaded == current:
+        return
+
+    # Перенос на другой корт или дату - устаревают оба дня
+    days = {current[:2]}
+    if loaded:
+        days.add(loaded[:2])
+    transaction.on_commit(lambda: occupancy.invalidate_days(days))
+
+
+@receiver(post_delete, sender=Booking)
+def invalidate_occupancy_on_delete(sender, instance, **kwargs):
+    days = [(instance.court_id, instance.date)]
+    transaction.on_commit(lambda: occupancy.invalidate_days(days))
+
+
+@receiver(post_save, sender=Booking)
+def refresh_rollups_on_save(sender, instance, created, **kwargs):
+    """Пересчёт агрегатов аналитики дня корта при изменении бронирования"""
+    loaded = Booking._rollup_key(instance.loaded_state)
+
+    if not created and loaded == Booking._rollup_key(instance.tracked_state()):
+        return
+
+    # Бронирование могли перенести на другой корт или дату - пересчитываем и старый день
+    rollups.refresh_for_booking(instance, previous=loaded[:2] if loaded else None)
+
+
+@receiver(post_delete, sender=Booking)
+def refresh_rollups_on_delete(sender, instance, **kwargs):
+    rollups.rebuild_day(instance.court_id, instance.date)
+
+
+@receiver(post_save, sender=Booking)
+def refresh_cohorts_on_save(sender, instance, created, **kwargs):
+    """Активность участников по месяцам при создании, отмене или переносе бронирования"""
+    loaded = None if created else Booking._cohort_key(instance.loaded_state)
+    current = Booking._cohort_key(instance.tracked_state())
+
+    if loaded == current or (created and not current[2]):
+        return
+
+    users = {current[0]}
+    months = {current[1]}
+    if loaded:
+        users.add(loaded[0])
+        months.add(loaded[1])
+    if not created:
+        users.update(instance.partners.values_list('id', flat=True))
+
+    cohorts.refresh(users, months)
+
+
+@receiver(m2m_changed, sender=Booking.partners.through)
+def refresh_cohorts_on_partners(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # После очистки затронутых пользователей (или месяцы) уже не получить
+        if reverse:
+            instance._cohort_cleared = list(
+                sender.objects.filter(user_id=instance.pk).values_list('booking__date', flat=True)
+            )
+        else:
+            instance._cohort_cleared = list(
+                sender.objects.filter(booking_id=instance.pk).values_list('user_id', flat=True)
+            )
+        return
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    cleared = getattr(instance, '_cohort_cleared', [])
+    if not reverse:
+        cohorts.refresh(cleared if action == 'post_clear' else pk_set or [], [instance.date])
+    else:
+        months = cleared if action == 'post_clear' else Booking.objects.filter(
+            pk__in=pk_set or []
+        ).values_list('date', flat=True)
+        cohorts.refresh([instance.pk], months)
+
+
+@receiver(pre_delete, sender=Booking)
+def remember_booking_participants(sender, instance, **kwargs):
+    # Партнёры удаляются вместе с бронированием без m2m_changed
+    instance._cohort_users = [instance.user_id, *instance.partners.values_list('id', flat=True)]
+
+
+@receiver(post_delete, sender=Booking)
+def refresh_cohorts_on_delete(sender, instance, **kwargs):
+    cohorts.refresh(getattr(instance, '_cohort_users', [instance.user_id]), [instance.date])
+
+
+@receiver(pre_delete, sender=User)
+def remove_user_from_cohorts(sender, instance, **kwargs):
+    cohorts.remove_user(instance)
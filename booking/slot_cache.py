@@ -0,0 +1,118 @@
+"""
+Кэш свободных слотов (read model)
+Ключи версионируются счётчиками поколений корта и дня,
+поэтому инвалидация - это один атомарный инкремент
+"""
+from django.core.cache import cache
+import time
+import logging
+
+from . import occupancy
+from .constants import SLOTS_CACHE_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+HITS_KEY = 'slots_cache_hits'
+MISSES_KEY = 'slots_cache_misses'
+
+
+def _court_generation_key(court_id):
+    return f'slots_gen_{court_id}'
+
+
+def _day_generation_key(court_id, booking_date):
+    return f'slots_gen_{court_id}_{booking_date.strftime("%Y-%m-%d")}'
+
+
+def _get_generation(key):
+    """
+    Текущее поколение ключа
+
+    Начальное значение берётся от времени, чтобы после вытеснения счётчика
+    из кэша не переиспользовать старые версии данных.
+    """
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, int(time.time() * 1000), None)
+        generation = cache.get(key)
+    return generation
+
+
+def _bump_generation(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Счётчика нет в кэше - заводим новый
+        cache.add(key, int(time.time() * 1000), None)
+
+
+def _increment_counter(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, 1, None)
+
+
+def _slots_key(court_id, booking_date):
+    court_generation = _get_generation(_court_generation_key(court_id))
+    day_generation = _get_generation(_day_generation_key(court_id, booking_date))
+    return f'slots_{court_id}_{booking_date.strftime("%Y-%m-%d")}_v{court_generation}.{day_generation}'
+
+
+def _build_slots(court, booking_date):
+    bitmap = occupancy.get_day_bitmap(court.id, booking_date)
+    return {
+        'court_id': court.id,
+        'court_name': court.name,
+        'price_per_hour': float(court.price_per_hour),
+        'free_hours': occupancy.free_hours(bitmap),
+    }
+
+
+def get_day_slots(court, booking_date):
+    """
+    Свободные часы корта на дату
+
+    Returns:
+        dict с ключами court_id, court_name, price_per_hour, free_hours
+    """
+    key = _slots_key(court.id, booking_date)
+    slots = cache.get(key)
+
+    if slots is not None:
+        _increment_counter(HITS_KEY)
+        return slots
+
+    _increment_counter(MISSES_KEY)
+    slots = _build_slots(court, booking_date)
+    cache.set(key, slots, SLOTS_CACHE_TIMEOUT)
+    return slots
+
+
+def invalidate(court_id, booking_date=None):
+    """
+    Инвалидация кэша слотов
+
+    Args:
+        court_id: ID корта
+        booking_date: Дата (None - все даты корта)
+    """
+    try:
+        if booking_date:
+            _bump_generation(_day_generation_key(court_id, booking_date))
+        else:
+            _bump_generation(_court_generation_key(court_id))
+    except Exception as e:
+        logger.error(f"Error invalidating slots cache: {str(e)}")
+
+
+def get_stats():
+    """Счётчики попаданий и промахов кэша слотов"""
+    hits = cache.get(HITS_KEY) or 0
+    misses = cache.get(MISSES_KEY) or 0
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total * 100, 2) if total else 0,
+    }
@@ -0,0 +1,165 @@
+"""
+Временное удержание слотов на время оформления бронирования
+Удержания корта на дату хранятся одним ключом кэша: {user_id: (маска слотов, истекает)}.
+Изменения выполняются под короткой блокировкой (cache.add), у пользователя
+одновременно может быть только одно удержание - новое снимает предыдущее
+"""
+from django.core.cache import cache
+from django.utils import timezone
+from contextlib import contextmanager
+from datetime import timedelta
+import logging
+import time
+
+from . import occupancy
+from .constants import SLOT_HOLD_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+LOCK_TIMEOUT = 5  # Блокировка ключа удержаний (секунды), страховка от упавшего процесса
+LOCK_ATTEMPTS = 50
+LOCK_RETRY_DELAY = 0.01
+
+
+def _holds_key(court_id, booking_date):
+    return f'slot_holds_{court_id}_{booking_date.strftime("%Y-%m-%d")}'
+
+
+def _user_key(user_id):
+    return f'slot_hold_user_{user_id}'
+
+
+def _active(holds, now):
+    """Только не истёкшие удержания"""
+    return {user_id: (mask, expires) for user_id, (mask, expires) in (holds or {}).items() if expires > now}
+
+
+@contextmanager
+def _day_lock(court_id, booking_date):
+    """
+    Блокировка удержаний корта на дату
+
+    Держится только на время чтения и записи одного ключа.
+    TimeoutError - блокировку не удалось получить.
+    """
+    lock_key = f'{_holds_key(court_id, booking_date)}_lock'
+    for _ in range(LOCK_ATTEMPTS):
+        if cache.add(lock_key, 1, LOCK_TIMEOUT):
+            break
+        time.sleep(LOCK_RETRY_DELAY)
+    else:
+        raise TimeoutError(f'slot holds lock busy: {lock_key}')
+
+    try:
+        yield
+    finally:
+        cache.delete(lock_key)
+
+
+def _remove_hold(court_id, booking_date, user_id, mask=None):
+    """Убрать удержание пользователя (если mask задана - только пересекающееся с ней)"""
+    with _day_lock(court_id, booking_date):
+        key = _holds_key(court_id, booking_date)
+        holds = _active(cache.get(key), time.time())
+        hold = holds.get(user_id)
+        if hold is None or (mask is not None and not hold[0] & mask):
+            return False
+
+        del holds[user_id]
+        if holds:
+            cache.set(key, holds, SLOT_HOLD_TIMEOUT)
+        else:
+            cache.delete(key)
+        return True
+
+
+def acquire(court_id, booking_date, start_time, end_time, user_id):
+    """
+    Удержать интервал за пользователем
+
+    Повторный захват продлевает удержание. Предыдущее удержание пользователя
+    (другой интервал, корт или дата) снимается.
+
+    Returns:
+        datetime окончания удержания или None, если интервал удерживает другой пользователь
+    """
+    mask = occupancy.interval_mask(start_time, end_time)
+
+    try:
+        with _day_lock(court_id, booking_date):
+            key = _holds_key(court_id, booking_date)
+            now = time.time()
+            holds = _active(cache.get(key), now)
+            if any(other_mask & mask for holder, (other_mask, _) in holds.items() if holder != user_id):
+                return None
+
+            holds[user_id] = (mask, now + SLOT_HOLD_TIMEOUT)
+            cache.set(key, holds, SLOT_HOLD_TIMEOUT)
+    except TimeoutError as e:
+        logger.warning(f"Slot hold not acquired: {str(e)}")
+        return None
+
+    previous = cache.get(_user_key(user_id))
+    location = (court_id, booking_date)
+    cache.set(_user_key(user_id), location, SLOT_HOLD_TIMEOUT)
+    if previous is not None and previous != location:
+        try:
+            _remove_hold(*previous, user_id)
+        except TimeoutError as e:
+            # Прежнее удержание истечёт само по TTL
+            logger.warning(f"Previous slot hold not released: {str(e)}")
+
+    return timezone.now() + timedelta(seconds=SLOT_HOLD_TIMEOUT)
+
+
+def release(court_id, booking_date, start_time, end_time, user_id):
+    """Снять удержание пользователя с интервала"""
+    try:
+        mask = occupancy.interval_mask(start_time, end_time)
+        if _remove_hold(court_id, booking_date, user_id, mask):
+            cache.delete(_user_key(user_id))
+    except Exception as e:
+        logger.error(f"Error releasing slot hold: {str(e)}")
+
+
+def is_held_by_other(court_id, booking_date, start_time, end_time, user_id):
+    """Удерживает ли интервал (хотя бы частично) другой пользователь"""
+    mask = occupancy.interval_mask(start_time, end_time)
+    holds = _active(cache.get(_holds_key(court_id, booking_date)), time.time())
+    return any(other_mask & mask for holder, (other_mask, _) in holds.items() if holder != user_id)
+
+
+def get_held_bitmaps(court_ids, start_date, end_date, exclude_user_id=None):
+    """
+    Битовые карты удержанных слотов (в формате индекса занятости)
+
+    Один ключ на корт и дату, весь диапазон читается одним get_many.
+    Удержания exclude_user_id не учитываются - свои слоты пользователь видит свободными.
+
+    Returns:
+        dict {(court_id, date): bitmap} только для пар с удержаниями
+    """
+    days = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    keys = {
+        _holds_key(court_id, day): (court_id, day)
+        for court_id in court_ids
+        for day in days
+    }
+
+    now = time.time()
+    bitmaps = {}
+    for key, holds in cache.get_many(list(keys.keys())).items():
+        bitmap = 0
+        for holder, (mask, _) in _active(holds, now).items():
+            if exclude_user_id is None or holder != exclude_user_id:
+                bitmap |= mask
+        if bitmap:
+            bitmaps[keys[key]] = bitmap
+
+    return bitmaps
+
+
+def get_held_bitmap(court_id, booking_date, exclude_user_id=None):
+    """Битовая карта удержанных слотов корта на дату"""
+    bitmaps = get_held_bitmaps([court_id], booking_date, booking_date, exclude_user_id)
+    return bitmaps.get((court_id, booking_date), 0)
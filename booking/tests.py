@@ -0,0 +1,300 @@
+from django.test import TestCase, TransactionTestCase, Client
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from datetime import time, timedelta
+from decimal import Decimal
+from threading import Barrier, Thread
+from unittest.mock import patch
+from django.utils import timezone
+
+from .models import Booking, BookingSlotClaim, Court
+
+
+class ConcurrentBookingTest(TransactionTestCase):
+    """Стресс-тест: параллельные запросы на один и тот же слот"""
+
+    THREADS = 8
+
+    def setUp(self):
+        self.court = Court.objects.create(name='Корт №1', description='', price_per_hour=1500)
+        self.booking_date = timezone.now().date() + timedelta(days=3)
+        self.users = [
+            User.objects.create_user(username=f'player{i}', password='password')
+            for i in range(self.THREADS)
+        ]
+
+    def post_booking(self, client):
+        return client.post('/booking/create/', {
+            'court_id': self.court.id,
+            'date': self.booking_date.isoformat(),
+            'start_time': '18:00',
+            'end_time': '20:00',
+        }, secure=True)
+
+    def messages_text(self, response):
+        return ' '.join(str(message) for message in response.wsgi_request._messages)
+
+    def test_parallel_bookings_for_one_slot(self):
+        barrier = Barrier(self.THREADS)
+
+        # Сессии создаём заранее: параллельная запись в django_session блокирует SQLite
+        clients = []
+        for user in self.users:
+            client = Client()
+            client.force_login(user)
+            clients.append(client)
+
+        results = {}
+
+        def book(index, client):
+            barrier.wait(timeout=30)
+            try:
+                response = self.post_booking(client)
+                results[index] = (response.status_code, self.messages_text(response))
+            finally:
+                connection.close()
+
+        threads = [Thread(target=book, args=(index, client)) for index, client in enumerate(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Каждый запрос получил ответ формы: один успех, остальные - "Время занято", без 500 и ошибок блокировки
+        self.assertEqual(len(results), self.THREADS)
+        self.assertTrue(all(status == 302 for status, _ in results.values()))
+        outcomes = [text for _, text in results.values()]
+        self.assertEqual(sum('успешно создано' in text for text in outcomes), 1)
+        self.assertEqual(sum('Время занято' in text for text in outcomes), self.THREADS - 1)
+
+        active = Booking.objects.filter(
+            court=self.court,
+            date=self.booking_date,
+            status__in=['pending', 'confirmed']
+        )
+        self.assertEqual(active.count(), 1)
+
+        booking = active.get()
+        self.assertEqual(
+            list(BookingSlotClaim.objects.filter(court=self.court).values_list('booking_id', flat=True)),
+            [booking.id] * 4
+        )
+
+    def test_slot_claim_rejects_missed_conflict(self):
+        """Если проверка пересечений пропустила конфликт, уникальные слоты отклоняют вставку"""
+        first, second = Client(), Client()
+        first.force_login(self.users[0])
+        second.force_login(self.users[1])
+
+        self.assertIn('успешно создано', self.messages_text(self.post_booking(first)))
+
+        with patch('booking.views.check_time_conflicts', return_value=(False, None)):
+            response = self.post_booking(second)
+
+        self.assertIn('забронировано другим пользователем', self.messages_text(response))
+        self.assertEqual(Booking.objects.filter(court=self.court, date=self.booking_date).count(), 1)
+
+    def test_claims_follow_booking_lifecycle(self):
+        booking = Booking.objects.create(
+            user=self.users[0],
+            court=self.court,
+            date=self.booking_date,
+            start_time=time(10, 0),
+            end_time=time(11, 30)
+        )
+        self.assertEqual(booking.slot_claims.count(), 3)
+
+        booking.status = 'cancelled'
+        booking.save()
+        self.assertEqual(booking.slot_claims.count(), 0)
+
+        # Освобождённое время снова можно занять
+        Booking.objects.create(
+            user=self.users[1],
+            court=self.court,
+            date=self.booking_date,
+            start_time=time(10, 0),
+            end_time=time(12, 0)
+        )
+        self.assertEqual(BookingSlotClaim.objects.count(), 4)
+
+
+class SlotHoldTest(TestCase):
+    """Удержание слотов на время оформления бронирования"""
+
+    def setUp(self):
+        cache.clear()
+        self.court = Court.objects.create(name='Корт №1', description='', price_per_hour=1500)
+        self.other_court = Court.objects.create(name='Корт №2', description='', price_per_hour=1500)
+        self.booking_date = timezone.now().date() + timedelta(days=3)
+        self.user = User.objects.create_user(username='player', password='password')
+        self.other = User.objects.create_user(username='rival', password='password')
+        self.client.force_login(self.user)
+
+    def hold(self, court, start_time, end_time):
+        return self.client.post('/booking/api/slot-hold/', {
+            'court_id': court.id,
+            'date': self.booking_date.isoformat(),
+            'start_time': start_time,
+            'end_time': end_time,
+        }, secure=True)
+
+    def test_one_hold_per_user(self):
+        from booking import slot_holds
+
+        self.assertEqual(self.hold(self.court, '18:00', '20:00').status_code, 200)
+        self.assertTrue(slot_holds.is_held_by_other(
+            self.court.id, self.booking_date, time(19, 0), time(20, 0), self.other.id
+        ))
+
+        # Новое удержание снимает предыдущее - в том числе на другом корте
+        self.assertEqual(self.hold(self.other_court, '10:00', '11:00').status_code, 200)
+        held = slot_holds.get_held_bitmaps(
+            [self.court.id, self.other_court.id], self.booking_date, self.booking_date
+        )
+        self.assertEqual(list(held), [(self.other_court.id, self.booking_date)])
+
+        self.assertIsNone(slot_holds.acquire(
+            self.other_court.id, self.booking_date, time(10, 30), time(11, 30), self.other.id
+        ))
+        self.assertEqual(held, slot_holds.get_held_bitmaps(
+            [self.court.id, self.other_court.id], self.booking_date, self.booking_date,
+            exclude_user_id=self.other.id
+        ))
+        self.assertEqual(slot_holds.get_held_bitmap(
+            self.other_court.id, self.booking_date, exclude_user_id=self.user.id
+        ), 0)
+
+        slot_holds.release(self.other_court.id, self.booking_date, time(10, 0), time(11, 0), self.user.id)
+        self.assertIsNotNone(slot_holds.acquire(
+            self.other_court.id, self.booking_date, time(10, 30), time(11, 30), self.other.id
+        ))
+
+    def test_duration_rules(self):
+        self.assertEqual(self.hold(self.court, '18:00', '18:30').status_code, 400)
+        self.assertEqual(self.hold(self.court, '10:00', '14:00').status_code, 400)
+        self.assertEqual(self.hold(self.court, '10:00', '13:00').status_code, 200)
+
+
+class BookingQuerySetTest(TestCase):
+    """Аннотации BookingQuerySet совпадают с расчётом в Python"""
+
+    def test_price_per_player_is_not_truncated(self):
+        court = Court.objects.create(name='Корт №1', description='', price_per_hour=1000)
+        user = User.objects.create_user(username='player')
+        booking = Booking.objects.create(
+            user=user,
+            court=court,
+            date=timezone.now().date() + timedelta(days=1),
+            start_time=time(10, 0),
+            end_time=time(11, 30),
+            status='confirmed'
+        )
+        booking.partners.add(*[User.objects.create_user(username=f'partner{i}') for i in range(2)])
+
+        annotated = Booking.objects.with_price().with_duration().get(pk=booking.pk)
+        self.assertEqual(annotated.price, Decimal('1500.00'))
+        self.assertEqual(annotated.price_per_player, Decimal('500.00'))
+        self.assertEqual(annotated.duration_hours, 1.5)
+
+        booking.partners.add(User.objects.create_user(username='partner2'))
+        annotated = Booking.objects.with_price().get(pk=booking.pk)
+        self.assertEqual(annotated.price_per_player, Decimal('375.00'))
+
+        # Целая сумма, не делящаяся на число участников
+        Booking.objects.filter(pk=booking.pk).update(total_amount=Decimal('1000.00'))
+        booking.partners.remove(*booking.partners.all()[:1])
+        annotated = Booking.objects.with_price().get(pk=booking.pk)
+        self.assertEqual(annotated.price_per_player, Decimal('333.33'))
+        self.assertEqual(float(annotated.price_per_player), Booking.objects.get(pk=booking.pk).price_per_person)
+
+
+class HeatmapApiTest(TestCase):
+    """Проверка параметра days тепловой карты"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username='manager', is_staff=True))
+
+    def test_days_range(self):
+        for days in ('0', '-5', '367', 'abc'):
+            response = self.client.get('/admin/api/analytics/heatmap/', {'days': days}, secure=True)
+            self.assertEqual(response.status_code, 400, days)
+            self.assertFalse(response.json()['success'])
+
+        response = self.client.get('/admin/api/analytics/heatmap/', {'days': 1}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()['success'])
+
+
+class OccupancyInvalidationTest(TestCase):
+    """Индекс занятости обновляется при любой записи бронирования, а не только из views"""
+
+    def setUp(self):
+        cache.clear()
+        self.court = Court.objects.create(name='Корт №1', description='', price_per_hour=1500)
+        self.user = User.objects.create_user(username='player')
+        self.day = timezone.now().date() + timedelta(days=2)
+        self.next_day = self.day + timedelta(days=1)
+
+    def test_orm_writes_refresh_bitmaps(self):
+        from . import occupancy
+
+        mask = occupancy.interval_mask(time(10, 0), time(11, 0))
+        self.assertEqual(occupancy.get_day_bitmap(self.court.id, self.day), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking = Booking.objects.create(
+                user=self.user, court=self.court, date=self.day,
+                start_time=time(10, 0), end_time=time(11, 0), status='confirmed'
+            )
+        self.assertEqual(occupancy.get_day_bitmap(self.court.id, self.day), mask)
+        self.assertEqual(occupancy.get_day_bitmap(self.court.id, self.next_day), 0)
+
+        # Изменение, не влияющее на занятость, не сбрасывает карты
+        generations = occupancy._get_generations([(self.court.id, self.day)])
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.looking_for_partner = True
+            booking.save()
+        self.assertEqual(occupancy._get_generations([(self.court.id, self.day)]), generations)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.date = self.next_day
+            booking.save()
+        self.assertEqual(occupancy.get_day_bitmap(self.court.id, self.day), 0)
+        self.assertEqual(occupancy.get_day_bitmap(self.court.id, self.next_day), mask)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            booking.delete()
+        self.assertEqual(occupancy.get_day_bitmap(self.court.id, self.next_day), 0)
+
+
+class BackfillBookingAmountsTest(TestCase):
+    """Пересчёт сумм обновляет агрегаты и снимки, построенные из старых сумм"""
+
+    def test_all_rebuilds_derived_data(self):
+        from django.core.management import call_command
+        from io import StringIO
+        from users import player_stats
+        from .models import DailyCourtTotals
+
+        court = Court.objects.create(name='Корт №1', description='', price_per_hour=1000)
+        user = User.objects.create_user(username='player')
+        booking = Booking.objects.create(
+            user=user, court=court, date=timezone.now().date() - timedelta(days=1),
+            start_time=time(10, 0), end_time=time(11, 30), status='confirmed'
+        )
+        self.assertEqual(player_stats.get_snapshot(user).total_spent, Decimal('1500.00'))
+
+        Court.objects.filter(pk=court.pk).update(price_per_hour=2000)
+        call_command('backfill_booking_amounts', '--all', stdout=StringIO())
+
+        booking.refresh_from_db()
+        self.assertEqual(booking.total_amount, Decimal('3000.00'))
+        self.assertEqual(DailyCourtTotals.objects.get(court=court, date=booking.date).revenue, Decimal('3000.00'))
+        self.assertEqual(player_stats.get_snapshot(user).total_spent, Decimal('3000.00'))
+
+        # Повторный запуск ничего не меняет
+        output = StringIO()
+        call_command('backfill_booking_amounts', '--all', stdout=output)
+        self.assertIn('Обновлено бронирований: 0', output.getvalue())
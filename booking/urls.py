@@ -22,8 +22,13 @@ urlpatterns = [
     path('api/stats/', views.api_player_stats, name='api_player_stats'),
     path('api/calendar-events/', views.api_calendar_events, name='api_calendar_events'),
     path('api/available-slots/', views.api_available_slots, name='api_available_slots'),
+    path('api/availability-matrix/', views.api_availability_matrix, name='api_availability_matrix'),
+    path('api/next-free-slots/', views.api_next_free_slots, name='api_next_free_slots'),
+    path('api/slot-hold/', views.api_hold_slot, name='api_hold_slot'),
+    path('api/slot-hold/release/', views.api_release_slot_hold, name='api_release_slot_hold'),
     path('api/coaches/', views.get_coaches_list, name='api_coaches_list'),
     path('api/search-users/', views.api_search_users, name='api_search_users'),
+    path('api/frequent-partners/', views.api_frequent_partners, name='api_frequent_partners'),
     path('api/notifications/', views.api_get_notifications, name='api_get_notifications'),
     path('api/invitation/<int:invitation_id>/accept/', views.api_accept_invitation, name='api_accept_invitation'),
     path('api/invitation/<int:invitation_id>/decline/', views.api_decline_invitation, name='api_decline_invitation'),
@@ -141,39 +141,68 @@ def validate_working_hours(start_time, end_time, working_start=8, working_end=22
     return True, None
 
 
-def check_time_conflicts(court, booking_date, start_time, end_time, exclude_booking_id=None):
+def conflicting_bookings(court, booking_date, start_time, end_time, exclude_booking_id=None):
     """
-    Проверка конфликтов времени с существующими бронированиями
+    QuerySet активных бронирований, пересекающихся с интервалом [start_time, end_time)
+
+    Единое определение пересечения для всех путей создания и изменения бронирований:
+    интервалы пересекаются, если существующее начинается раньше конца нового
+    и заканчивается позже его начала. Проверка выполняется в SQL.
 
     Args:
-        court: Объект корта
+        court: Объект корта или его ID
         booking_date: Дата бронирования
         start_time: Время начала
         end_time: Время окончания
         exclude_booking_id: ID бронирования для исключения (при редактировании)
-
-    Returns:
-        (has_conflict, conflicting_booking) - кортеж с результатом и конфликтующим бронированием
     """
     from .models import Booking
 
-    existing_bookings = Booking.objects.filter(
+    bookings = Booking.objects.filter(
         court=court,
         date=booking_date,
-        status__in=['pending', 'confirmed']
-    ).select_for_update()
+        status__in=['pending', 'confirmed'],
+        start_time__lt=end_time,
+        end_time__gt=start_time
+    )
 
     if exclude_booking_id:
-        existing_bookings = existing_bookings.exclude(id=exclude_booking_id)
+        bookings = bookings.exclude(id=exclude_booking_id)
+
+    return bookings
+
+
+def has_time_conflict(court, booking_date, start_time, end_time, exclude_booking_id=None):
+    """Есть ли пересечение с существующими бронированиями (EXISTS-запрос)"""
+    return conflicting_bookings(
+        court, booking_date, start_time, end_time, exclude_booking_id
+    ).exists()
+
+
+def check_time_conflicts(court, booking_date, start_time, end_time, exclude_booking_id=None, lock=False):
+    """
+    Проверка конфликтов времени с существующими бронированиями
+
+    Args:
+        court: Объект корта или его ID
+        booking_date: Дата бронирования
+        start_time: Время начала
+        end_time: Время окончания
+        exclude_booking_id: ID бронирования для исключения (при редактировании)
+        lock: Заблокировать найденную строку (только внутри transaction.atomic)
+
+    Returns:
+        (has_conflict, conflicting_booking) - кортеж с результатом и первым конфликтующим бронированием
+    """
+    bookings = conflicting_bookings(
+        court, booking_date, start_time, end_time, exclude_booking_id
+    ).order_by('start_time')
 
-    for booking in existing_bookings:
-        # Проверка пересечения времени
-        if (booking.start_time <= start_time < booking.end_time or
-                booking.start_time < end_time <= booking.end_time or
-                (start_time <= booking.start_time and end_time >= booking.end_time)):
-            return True, booking
+    if lock:
+        bookings = bookings.select_for_update()
 
-    return False, None
+    conflict = bookings.first()
+    return conflict is not None, conflict
 
 
 def pluralize_hours(hours):
@@ -5,16 +5,17 @@ from django.http import JsonResponse
 from django.views.decorators.http import require_POST, require_GET
 from django.utils import timezone
 from django.contrib import messages
-from django.core.cache import cache
 from django.core.exceptions import ObjectDoesNotExist
-from django.db import transaction
+from django.db import transaction, IntegrityError
 from datetime import datetime, timedelta
 from django.urls import reverse
 from django.db.models import Q
 from .models import Court, Booking
+from . import occupancy, slot_cache, slot_holds
 from users.analytics import (
     get_player_stats,
     get_calendar_events,
+    get_frequent_partners,
     get_available_slots as get_available_slots_analytics
 )
 import traceback
@@ -42,6 +43,14 @@ from .decorators import (
     api_write_ratelimit,
     auth_ratelimit
 )
+from .constants import (
+    WORKING_HOURS_START,
+    WORKING_HOURS_END,
+    AVAILABILITY_MATRIX_MAX_DAYS,
+    MIN_BOOKING_DURATION_HOURS,
+    MAX_BOOKING_DURATION_HOURS,
+    SLOT_SEARCH_MAX_RESULTS
+)
 
 def booking_page(request):
     """Страница бронирования кортов"""
@@ -102,28 +111,23 @@ def get_available_slots(request):
                 'message': 'Нельзя бронировать корт на прошедшую дату'
             })
 
-        # Получаем существующие бронирования
+        # Свободные часы берём из кэша слотов (база читается только при промахе кэша)
+        day_slots = slot_cache.get_day_slots(court, booking_date)
+
+        # Слоты, которые сейчас оформляют другие пользователи, показываем занятыми
+        held = slot_holds.get_held_bitmap(
+            court.id, booking_date,
+            exclude_user_id=request.user.id if request.user.is_authenticated else None
+        )
+
+        # Бронирования, которые ищут партнёров
         existing_bookings = Booking.objects.filter(
             court=court,
             date=booking_date,
-            status__in=['pending', 'confirmed']
+            status__in=['pending', 'confirmed'],
+            looking_for_partner=True
         ).select_related('user', 'user__profile', 'user__rating').prefetch_related('partners')
 
-        logger.debug(f"Found {existing_bookings.count()} existing bookings for court {court.name} on {booking_date}")
-
-        # Словарь занятых часов
-        booked_hours = {}
-        for booking in existing_bookings:
-            start_hour = booking.start_time.hour
-            end_hour = booking.end_time.hour
-            for hour in range(start_hour, end_hour):
-                booked_hours[hour] = True
-            logger.debug(f"Booking slot: {start_hour}:00-{end_hour}:00")
-
-        # Рабочие часы: 8:00 - 22:00
-        WORKING_HOURS_START = 8
-        WORKING_HOURS_END = 22
-
         # ТОЛЬКО СВОБОДНЫЕ СЛОТЫ
         free_slots = []
 
@@ -135,22 +139,21 @@ def get_available_slots(request):
             current_hour = -1  # Будущая дата, все часы доступны
             logger.debug(f"Booking for future date - all hours available")
 
-        for hour in range(WORKING_HOURS_START, WORKING_HOURS_END):
-            is_available = hour not in booked_hours
-
+        for hour in day_slots['free_hours']:
             # Если сегодня, нельзя бронировать прошедшее время
             if booking_date == today and hour < current_hour:
-                is_available = False
-
-            # ДОБАВЛЯЕМ ТОЛЬКО СВОБОДНЫЕ СЛОТЫ
-            if is_available:
-                free_slots.append({
-                    'type': 'free_slot',
-                    'start_time': f"{hour:02d}:00",
-                    'end_time': f"{(hour + 1):02d}:00",
-                    'duration': 1,
-                    'hour': hour
-                })
+                continue
+
+            if not occupancy.is_free(held, occupancy.hour_mask(hour)):
+                continue
+
+            free_slots.append({
+                'type': 'free_slot',
+                'start_time': f"{hour:02d}:00",
+                'end_time': f"{(hour + 1):02d}:00",
+                'duration': 1,
+                'hour': hour
+            })
 
         # Получаем рейтинг текущего пользователя (если залогинен)
         user_rating = None
@@ -163,12 +166,12 @@ def get_available_slots(request):
         # Ищем бронирования с "Найти партнёра"
         partner_bookings = []
         for booking in existing_bookings:
-            # Пропускаем, если не ищет партнёра или уже полное
-            if not booking.looking_for_partner or booking.is_full:
+            # Пропускаем заполненные
+            if booking.is_full:
                 continue
 
             # Пропускаем свои бронирования
-            if request.user.is_authenticated and (booking.user == request.user or request.user in booking.partners.all()):
+            if request.user.is_authenticated and (booking.user_id == request.user.id or booking.is_partner(request.user)):
                 continue
 
             # Проверяем рейтинг
@@ -190,7 +193,7 @@ def get_available_slots(request):
                 'creator_name': user_full_name,
                 'creator_rating': booking.user.rating.level if hasattr(booking.user, 'rating') else None,
                 'required_rating': booking.required_rating_level,
-                'current_players': 1 + booking.partners.count(),
+                'current_players': booking.participants_count,
                 'max_players': booking.max_players,
                 'available_slots': booking.available_slots,
                 'price_per_person': float(booking.price_per_person),
@@ -231,6 +234,246 @@ def get_available_slots(request):
             'message': 'Ошибка загрузки слотов'
         }, status=500)
 
+@require_GET
+@api_data_ratelimit(rate='60/m')
+def api_availability_matrix(request):
+    """
+    API: Матрица доступности корт × день × час
+
+    GET /booking/api/availability-matrix/?start=2026-01-20&days=7
+    Для каждого корта и дня возвращается строка по рабочим часам:
+    '0' - час свободен, '1' - занят или уже прошёл.
+    """
+    try:
+        start_str = request.GET.get('start')
+        today = timezone.localdate()
+
+        start_date = datetime.strptime(start_str, '%Y-%m-%d').date() if start_str else today
+        days = int(request.GET.get('days', 7))
+
+        if days < 1 or days > AVAILABILITY_MATRIX_MAX_DAYS:
+            return JsonResponse({
+                'success': False,
+                'message': f'Диапазон должен быть от 1 до {AVAILABILITY_MATRIX_MAX_DAYS} дней'
+            }, status=400)
+
+        if start_date < today:
+            start_date = today
+
+        end_date = start_date + timedelta(days=days - 1)
+        dates = [start_date + timedelta(days=i) for i in range(days)]
+
+        courts = list(
+            Court.objects.filter(is_available=True).order_by('name').values('id', 'name', 'price_per_hour')
+        )
+        court_ids = [court['id'] for court in courts]
+        bitmaps = occupancy.get_range_bitmaps(court_ids, start_date, end_date)
+
+        # Удержанные другими пользователями слоты считаются занятыми
+        held = slot_holds.get_held_bitmaps(
+            court_ids, start_date, end_date,
+            exclude_user_id=request.user.id if request.user.is_authenticated else None
+        )
+        for pair, held_bitmap in held.items():
+            bitmaps[pair] |= held_bitmap
+
+        # Прошедшие часы сегодняшнего дня помечаем как недоступные
+        past_hours = max(0, min(timezone.localtime().hour, WORKING_HOURS_END) - WORKING_HOURS_START)
+
+        matrix = []
+        for court in courts:
+            row = []
+            for day in dates:
+                hours = occupancy.hours_string(bitmaps[(court['id'], day)])
+                if day == today and past_hours:
+                    hours = '1' * past_hours + hours[past_hours:]
+                row.append(hours)
+            matrix.append(row)
+
+        return JsonResponse({
+            'success': True,
+            'start': start_date.isoformat(),
+            'end': end_date.isoformat(),
+            'dates': [day.isoformat() for day in dates],
+            'hours': list(range(WORKING_HOURS_START, WORKING_HOURS_END)),
+            'courts': [
+                {
+                    'id': court['id'],
+                    'name': court['name'],
+                    'price_per_hour': float(court['price_per_hour'])
+                }
+                for court in courts
+            ],
+            'matrix': matrix
+        })
+
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'message': 'Неверный формат параметров'
+        }, status=400)
+    except Exception as e:
+        logger.error(f"Error in api_availability_matrix: {str(e)}", exc_info=True)
+        return JsonResponse({
+            'success': False,
+            'message': 'Ошибка загрузки доступности'
+        }, status=500)
+
+
+@require_GET
+@api_data_ratelimit(rate='60/m')
+def api_next_free_slots(request):
+    """
+    API: Поиск ближайших свободных слотов по всем кортам
+
+    GET /booking/api/next-free-slots/?duration=2&from=2026-01-20T18:00&max_price=1500&courts=1,3&limit=5
+    """
+    try:
+        from .services import SlotSearchService
+
+        duration = int(request.GET.get('duration', MIN_BOOKING_DURATION_HOURS))
+        limit = min(int(request.GET.get('limit', 5)), SLOT_SEARCH_MAX_RESULTS)
+
+        if not MIN_BOOKING_DURATION_HOURS <= duration <= MAX_BOOKING_DURATION_HOURS:
+            return JsonResponse({
+                'success': False,
+                'message': f'Продолжительность должна быть от {MIN_BOOKING_DURATION_HOURS} '
+                           f'до {MAX_BOOKING_DURATION_HOURS} часов'
+            }, status=400)
+
+        now = timezone.localtime().replace(tzinfo=None)
+        from_str = request.GET.get('from')
+        earliest_start = datetime.fromisoformat(from_str) if from_str else now
+        if earliest_start.tzinfo:
+            earliest_start = timezone.localtime(earliest_start).replace(tzinfo=None)
+        earliest_start = max(earliest_start, now)
+
+        max_price = request.GET.get('max_price')
+        max_price = float(max_price) if max_price else None
+
+        courts_str = request.GET.get('courts', '')
+        court_ids = [int(court_id) for court_id in courts_str.split(',') if court_id.strip()]
+
+        slots = SlotSearchService.find_earliest_slots(
+            duration_hours=duration,
+            earliest_start=earliest_start,
+            max_price_per_hour=max_price,
+            court_ids=court_ids or None,
+            limit=max(limit, 1),
+            exclude_holds_of=request.user.id if request.user.is_authenticated else None
+        )
+
+        return JsonResponse({
+            'success': True,
+            'slots': slots,
+            'count': len(slots)
+        })
+
+    except ValueError:
+        return JsonResponse({
+            'success': False,
+            'message': 'Неверный формат параметров'
+        }, status=400)
+    except Exception as e:
+        logger.error(f"Error in api_next_free_slots: {str(e)}", exc_info=True)
+        return JsonResponse({
+            'success': False,
+            'message': 'Ошибка поиска свободных слотов'
+        }, status=500)
+
+
+def _parse_hold_request(request):
+    """Корт, дата и интервал из POST-запроса удержания слота"""
+    court = Court.objects.get(id=request.POST.get('court_id'), is_available=True)
+    booking_date = datetime.strptime(request.POST.get('date', ''), '%Y-%m-%d').date()
+    start_time = datetime.strptime(request.POST.get('start_time', ''), '%H:%M').time()
+    end_time = datetime.strptime(request.POST.get('end_time', ''), '%H:%M').time()
+    return court, booking_date, start_time, end_time
+
+
+@login_required
+@require_POST
+@api_write_ratelimit()
+def api_hold_slot(request):
+    """
+    API: Временно удержать слот на время оформления бронирования
+
+    POST /booking/api/slot-hold/ (court_id, date, start_time, end_time)
+    Удержанный слот показывается другим пользователям занятым,
+    create_booking превращает удержание в бронирование. У пользователя одно
+    удержание: новое снимает предыдущее.
+    """
+    try:
+        court, booking_date, start_time, end_time = _parse_hold_request(request)
+
+        is_valid, error_msg = validate_booking_times(
+            booking_date, start_time, end_time, timezone.now().date(), timezone.now().time()
+        )
+        if not is_valid:
+            return JsonResponse({'success': False, 'message': error_msg}, status=400)
+
+        is_valid, _, error_msg = validate_booking_duration(start_time, end_time, booking_date)
+        if not is_valid:
+            return JsonResponse({'success': False, 'message': error_msg}, status=400)
+
+        is_valid, error_msg = validate_working_hours(start_time, end_time)
+        if not is_valid:
+            return JsonResponse({'success': False, 'message': error_msg}, status=400)
+
+        bitmap = occupancy.get_day_bitmap(court.id, booking_date)
+        if not occupancy.is_free(bitmap, occupancy.interval_mask(start_time, end_time)):
+            return JsonResponse({
+                'success': False,
+                'message': 'Выбранное время уже забронировано'
+            }, status=409)
+
+        expires_at = slot_holds.acquire(court.id, booking_date, start_time, end_time, request.user.id)
+        if expires_at is None:
+            return JsonResponse({
+                'success': False,
+                'message': 'Это время сейчас оформляет другой пользователь'
+            }, status=409)
+
+        return JsonResponse({
+            'success': True,
+            'expires_at': expires_at.isoformat()
+        })
+
+    except (Court.DoesNotExist, ValueError):
+        return JsonResponse({
+            'success': False,
+            'message': 'Неверный формат параметров'
+        }, status=400)
+    except Exception as e:
+        logger.error(f"Error in api_hold_slot: {str(e)}", exc_info=True)
+        return JsonResponse({
+            'success': False,
+            'message': 'Ошибка удержания слота'
+        }, status=500)
+
+
+@login_required
+@require_POST
+def api_release_slot_hold(request):
+    """API: Снять удержание слота (пользователь отменил оформление)"""
+    try:
+        court, booking_date, start_time, end_time = _parse_hold_request(request)
+        slot_holds.release(court.id, booking_date, start_time, end_time, request.user.id)
+        return JsonResponse({'success': True})
+
+    except (Court.DoesNotExist, ValueError):
+        return JsonResponse({
+            'success': False,
+            'message': 'Неверный формат параметров'
+        }, status=400)
+    except Exception as e:
+        logger.error(f"Error in api_release_slot_hold: {str(e)}", exc_info=True)
+        return JsonResponse({
+            'success': False,
+            'message': 'Ошибка снятия удержания'
+        }, status=500)
+
+
 @login_required
 @require_POST
 @api_write_ratelimit(rate='10/m')
@@ -296,109 +539,112 @@ def create_booking(request):
             messages.error(request, create_error_message("Ошибка", error_msg))
             return redirect('booking')
 
-        # 6. Создание бронирования в транзакции
-        with transaction.atomic():
-            # Проверка конфликтов
-            has_conflict, conflicting_booking = check_time_conflicts(
-                court, booking_date, start_time, end_time
-            )
-
-            if has_conflict:
-                conflict_start = conflicting_booking.start_time.strftime('%H:%M')
-                conflict_end = conflicting_booking.end_time.strftime('%H:%M')
-                error_msg = f"Выбранное время уже занято с {conflict_start} до {conflict_end}"
-                messages.error(request, create_error_message("Время занято", error_msg))
-                return redirect('booking')
-
-            # Получаем данные для поиска партнеров
-            looking_for_partner = request.POST.get('looking_for_partner') == 'on'
-            max_players = int(request.POST.get('max_players', 4))
-
-            # Получаем выбранные уровни рейтинга (множественные чекбоксы)
-            required_rating_levels = request.POST.getlist('required_rating_levels')
-            logger.info(f"Selected rating levels: {required_rating_levels}")
-
-            # Получаем приглашенных участников
-            invited_participants_str = request.POST.get('invited_participants', '')
-            invited_participant_ids = [int(pid) for pid in invited_participants_str.split(',') if pid.strip()]
-            logger.info(f"Invited participants: {invited_participant_ids}")
-
-            # Получаем тип бронирования и тренера
-            booking_type = request.POST.get('booking_type', 'game')
-            coach_id = request.POST.get('coach')
-            coach = None
-
-            if coach_id and booking_type == 'training':
-                from django.contrib.auth.models import User
-                try:
-                    coach = User.objects.get(id=coach_id, groups__name='Тренеры')
-                except User.DoesNotExist:
-                    coach = None
-
-            # Создаем бронирование
-            booking = Booking.objects.create(
-                user=request.user,
-                court=court,
-                date=booking_date,
-                start_time=start_time,
-                end_time=end_time,
-                status='pending',
-                booking_type=booking_type,
-                coach=coach,
-                looking_for_partner=looking_for_partner if booking_type == 'game' else False,
-                max_players=max_players if booking_type == 'game' else 1,
-                required_rating_levels=required_rating_levels if (required_rating_levels and booking_type == 'game') else []
-            )
-
-            # Повторная проверка (защита от race condition)
-            has_conflict, _ = check_time_conflicts(
-                court, booking_date, start_time, end_time, exclude_booking_id=booking.id
-            )
-
-            if has_conflict:
-                booking.delete()
-                error_msg = "Это время было забронировано другим пользователем. Пожалуйста, выберите другое время."
-                messages.error(request, create_error_message("Время занято", error_msg))
-                return redirect('booking')
-
-            # Отправляем приглашения выбранным участникам
-            if invited_participant_ids:
-                from django.contrib.auth.models import User
-                from booking.models import BookingInvitation
-
-                invitations_sent = 0
-                for user_id in invited_participant_ids:
+        # 6. Слот может удерживать другой пользователь, который сейчас оформляет бронирование
+        if slot_holds.is_held_by_other(court.id, booking_date, start_time, end_time, request.user.id):
+            error_msg = "Это время сейчас оформляет другой пользователь. Пожалуйста, выберите другое время."
+            messages.error(request, create_error_message("Время занято", error_msg))
+            return redirect('booking')
+
+        # 7. Создание бронирования в транзакции
+        # Слоты захватываются при сохранении бронирования: уникальный индекс BookingSlotClaim
+        # не даст двум параллельным запросам забронировать одно время (IntegrityError)
+        try:
+            with transaction.atomic():
+                # Проверка конфликтов
+                has_conflict, conflicting_booking = check_time_conflicts(
+                    court, booking_date, start_time, end_time, lock=True
+                )
+
+                if has_conflict:
+                    conflict_start = conflicting_booking.start_time.strftime('%H:%M')
+                    conflict_end = conflicting_booking.end_time.strftime('%H:%M')
+                    error_msg = f"Выбранное время уже занято с {conflict_start} до {conflict_end}"
+                    messages.error(request, create_error_message("Время занято", error_msg))
+                    return redirect('booking')
+
+                # Получаем данные для поиска партнеров
+                looking_for_partner = request.POST.get('looking_for_partner') == 'on'
+                max_players = int(request.POST.get('max_players', 4))
+
+                # Получаем выбранные уровни рейтинга (множественные чекбоксы)
+                required_rating_levels = request.POST.getlist('required_rating_levels')
+                logger.info(f"Selected rating levels: {required_rating_levels}")
+
+                # Получаем приглашенных участников
+                invited_participants_str = request.POST.get('invited_participants', '')
+                invited_participant_ids = [int(pid) for pid in invited_participants_str.split(',') if pid.strip()]
+                logger.info(f"Invited participants: {invited_participant_ids}")
+
+                # Получаем тип бронирования и тренера
+                booking_type = request.POST.get('booking_type', 'game')
+                coach_id = request.POST.get('coach')
+                coach = None
+
+                if coach_id and booking_type == 'training':
+                    from django.contrib.auth.models import User
                     try:
-                        invited_user = User.objects.get(id=user_id)
-                        # Создаем приглашение
-                        BookingInvitation.objects.create(
-                            booking=booking,
-                            inviter=request.user,
-                            invitee=invited_user,
-                            invitee_phone=invited_user.profile.phone if hasattr(invited_user, 'profile') else '',
-                            message=f"Приглашение присоединиться к игре {booking_date.strftime('%d.%m.%Y')} в {start_time_str}"
-                        )
-                        invitations_sent += 1
-                        logger.info(f"Invitation sent to user {invited_user.username} for booking {booking.id}")
+                        coach = User.objects.get(id=coach_id, groups__name='Тренеры')
                     except User.DoesNotExist:
-                        logger.warning(f"User with id {user_id} not found for invitation")
-                    except Exception as e:
-                        logger.error(f"Error sending invitation to user {user_id}: {str(e)}")
-
-                if invitations_sent > 0:
-                    logger.info(f"Sent {invitations_sent} invitations for booking {booking.id}")
+                        coach = None
+
+                # Создаем бронирование
+                booking = Booking.objects.create(
+                    user=request.user,
+                    court=court,
+                    date=booking_date,
+                    start_time=start_time,
+                    end_time=end_time,
+                    status='pending',
+                    booking_type=booking_type,
+                    coach=coach,
+                    looking_for_partner=looking_for_partner if booking_type == 'game' else False,
+                    max_players=max_players if booking_type == 'game' else 1,
+                    required_rating_levels=required_rating_levels if (required_rating_levels and booking_type == 'game') else []
+                )
+
+                # Отправляем приглашения выбранным участникам
+                if invited_participant_ids:
+                    from django.contrib.auth.models import User
+                    from booking.models import BookingInvitation
+
+                    invitations_sent = 0
+                    for user_id in invited_participant_ids:
+                        try:
+                            invited_user = User.objects.get(id=user_id)
+                            # Создаем приглашение
+                            BookingInvitation.objects.create(
+                                booking=booking,
+                                inviter=request.user,
+                                invitee=invited_user,
+                                invitee_phone=invited_user.profile.phone if hasattr(invited_user, 'profile') else '',
+                                message=f"Приглашение присоединиться к игре {booking_date.strftime('%d.%m.%Y')} в {start_time_str}"
+                            )
+                            invitations_sent += 1
+                            logger.info(f"Invitation sent to user {invited_user.username} for booking {booking.id}")
+                        except User.DoesNotExist:
+                            logger.warning(f"User with id {user_id} not found for invitation")
+                        except Exception as e:
+                            logger.error(f"Error sending invitation to user {user_id}: {str(e)}")
+
+                    if invitations_sent > 0:
+                        logger.info(f"Sent {invitations_sent} invitations for booking {booking.id}")
+
+        except IntegrityError:
+            error_msg = "Это время было забронировано другим пользователем. Пожалуйста, выберите другое время."
+            messages.error(request, create_error_message("Время занято", error_msg))
+            return redirect('booking')
 
-        # 7. Очищаем кэш
-        clear_slots_cache(court_id=court_id, date_str=date_str)
+        # 8. Удержание превратилось в бронирование (индекс занятости обновляет сигнал)
+        slot_holds.release(court.id, booking_date, start_time, end_time, request.user.id)
 
-        # 8. Логируем успех
+        # 9. Логируем успех
         logger.info(
             f"Booking created: User {request.user.username} booked court {court.name} "
             f"on {booking_date} from {start_time_str} to {end_time.strftime('%H:%M')} "
             f"(Duration: {duration_hours}h, Price: {booking.total_price} руб., Type: {booking_type})"
         )
 
-        # 9. Формируем красивое сообщение об успехе
+        # 10. Формируем красивое сообщение об успехе
         duration_text = pluralize_hours(duration_hours)
         booking_type_text = "Тренировка" if booking_type == 'training' else "Игра"
         coach_info = f" с тренером {coach.get_full_name() or coach.username}" if coach else ""
@@ -494,17 +740,10 @@ def cancel_booking(request, booking_id):
                     'message': 'Нельзя отменить бронирование менее чем за 1 час до начала'
                 })
 
-        # Сохраняем данные для очистки кэша
-        court_id = booking.court.id
-        date_str = booking.date.strftime('%Y-%m-%d')
-
-        # Отменяем бронирование
+        # Отменяем бронирование (индекс занятости и кэш слотов обновляет сигнал)
         booking.status = 'cancelled'
         booking.save()
 
-        # Очищаем кэш
-        clear_slots_cache(court_id=court_id, date_str=date_str)
-
         logger.info(f"Booking {booking_id} cancelled by user {request.user.username}")
 
         return JsonResponse({
@@ -571,33 +810,6 @@ def get_booking_info(request, booking_id):
     })
 
 
-# ========== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ==========
-
-def clear_slots_cache(court_id=None, date_str=None):
-    """Очистка кэша слотов"""
-    try:
-        if court_id and date_str:
-            cache.delete(f'slots_{court_id}_{date_str}')
-            cache.delete(f'court_{court_id}')
-
-        elif court_id:
-            today = timezone.now().date()
-            keys_to_delete = []
-
-            for i in range(90):
-                future_date = today + timedelta(days=i)
-                date_key = future_date.strftime('%Y-%m-%d')
-                keys_to_delete.append(f'slots_{court_id}_{date_key}')
-
-            for i in range(0, len(keys_to_delete), 100):
-                cache.delete_many(keys_to_delete[i:i + 100])
-
-            cache.delete(f'court_{court_id}')
-
-    except Exception as e:
-        logger.error(f"Error clearing cache: {str(e)}")
-
-
 # ========== ПРОФИЛЬ ПОЛЬЗОВАТЕЛЯ ==========
 # УДАЛЕНО: Дублирующая функция profile() - используем версию из users.views (импорт в начале файла)
 
@@ -1000,7 +1212,7 @@ def api_available_slots(request):
             }, status=400)
         
         date = datetime.strptime(date_str, '%Y-%m-%d').date()
-        slots = get_available_slots_analytics(court_id, date)
+        slots = get_available_slots_analytics(court_id, date, user_id=request.user.id)
         
         return JsonResponse({
             'success': True,
@@ -1167,6 +1379,58 @@ def api_search_users(request):
         }, status=500)
 
 
+@login_required
+@require_GET
+def api_frequent_partners(request):
+    """
+    API: Частые партнёры текущего пользователя (подсказки для приглашений)
+    """
+    try:
+        from users.models import UserProfile
+
+        try:
+            limit = int(request.GET.get('limit', 5))
+        except ValueError:
+            return JsonResponse({
+                'success': False,
+                'message': 'Неверный формат limit',
+                'users': []
+            }, status=400)
+        limit = max(1, min(limit, 20))
+
+        partners = get_frequent_partners(request.user, limit=limit).select_related('profile')
+
+        users_data = []
+        for partner in partners:
+            full_name = f"{partner.first_name} {partner.last_name}".strip()
+
+            try:
+                phone = partner.profile.phone
+            except (AttributeError, UserProfile.DoesNotExist):
+                phone = 'Не указан'
+
+            users_data.append({
+                'id': partner.id,
+                'full_name': full_name or partner.username,
+                'phone': phone,
+                'games_count': partner.games_count,
+            })
+
+        return JsonResponse({
+            'success': True,
+            'users': users_data,
+            'count': len(users_data)
+        })
+
+    except Exception as e:
+        logger.error(f"Error getting frequent partners: {str(e)}", exc_info=True)
+        return JsonResponse({
+            'success': False,
+            'message': 'Ошибка получения частых партнёров',
+            'users': []
+        }, status=500)
+
+
 @login_required
 def api_get_notifications(request):
     """
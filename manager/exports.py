@@ -0,0 +1,395 @@
+"""
+Экспорт данных панели менеджера
+Построчные генераторы для CSV (используются и потоковыми views, и фоновыми
+задачами ExportJob) и выполнение задач командой run_export_jobs
+"""
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from datetime import datetime, timedelta
+from decimal import Decimal
+import csv
+import logging
+import os
+import tempfile
+
+from booking.analytics import get_financial_stats
+from booking.models import Booking
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+EXPORT_CHUNK_SIZE = 2000
+
+# Задача в статусе running дольше этого срока брошена остановившимся воркером
+JOB_STALE_AFTER = timedelta(minutes=15)  # Без отчёта воркера дольше - задача брошена
+JOB_MAX_ATTEMPTS = 3
+EXPORT_RETENTION_DAYS = 7
+
+BOOKINGS_HEADER = ['ID', 'Дата', 'Время начала', 'Время окончания', 'Корт', 'Клиент', 'Email', 'Тренер',
+                   'Статус', 'Сумма']
+USERS_HEADER = ['ID', 'Username', 'Email', 'Имя', 'Фамилия', 'Роль', 'Статус',
+                'Зарегистрирован', 'Бронирований', 'Потрачено']
+
+
+class EchoBuffer:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def _parse_date(value):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def period_from_params(params, default_days=30):
+    """
+    Период экспорта: start_date и end_date (YYYY-MM-DD) или days до сегодня
+
+    ValueError - неверная дата или число дней.
+    """
+    start_date = params.get('start_date')
+    end_date = params.get('end_date')
+    if start_date and end_date:
+        return _parse_date(start_date), _parse_date(end_date)
+
+    today = timezone.now().date()
+    return today - timedelta(days=int(params.get('days', default_days))), today
+
+
+def filter_bookings(params):
+    """
+    Бронирования с фильтрами списка менеджера и экспорта
+
+    Фильтры: status (можно несколько через запятую), court, coach, user (создатель),
+    booking_type, start_date, end_date (YYYY-MM-DD).
+    params - request.GET или dict. ValueError - неверное значение или неизвестный статус.
+    """
+    bookings = Booking.objects.all()
+
+    statuses = [status for status in params.get('status', '').split(',') if status]
+    unknown = set(statuses) - {value for value, _ in Booking.STATUS_CHOICES}
+    if unknown:
+        raise ValueError(f"Неизвестный статус: {', '.join(sorted(unknown))}")
+    if statuses:
+        bookings = bookings.filter(status__in=statuses)
+
+    for param, field in (('court', 'court_id'), ('coach', 'coach_id'), ('user', 'user_id')):
+        if params.get(param):
+            try:
+                bookings = bookings.filter(**{field: int(params[param])})
+            except ValueError:
+                raise ValueError(f'{param} должен быть числом')
+
+    if params.get('booking_type'):
+        bookings = bookings.filter(booking_type=params['booking_type'])
+
+    try:
+        if params.get('start_date'):
+            bookings = bookings.filter(date__gte=_parse_date(params['start_date']))
+        if params.get('end_date'):
+            bookings = bookings.filter(date__lte=_parse_date(params['end_date']))
+    except (TypeError, ValueError):
+        raise ValueError('Даты должны быть в формате YYYY-MM-DD')
+
+    return bookings
+
+
+def bookings_queryset(params):
+    """Бронирования для экспорта: фильтры filter_bookings, от новых к старым"""
+    return filter_bookings(params).order_by('-date', '-start_time')
+
+
+def booking_rows(bookings):
+    """Строки CSV бронирований: кортежи values_list читаются из базы пачками"""
+    rows = bookings.values_list(
+        'id', 'date', 'start_time', 'end_time', 'court__name',
+        'user__first_name', 'user__last_name', 'user__username', 'user__email',
+        'coach__first_name', 'coach__last_name', 'status', 'total_amount'
+    ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    for (booking_id, booking_date, start_time, end_time, court_name,
+         first_name, last_name, username, email,
+         coach_first_name, coach_last_name, status, total_amount) in rows:
+        coach_name = f"{coach_first_name} {coach_last_name}" if coach_first_name is not None else ''
+        yield [
+            booking_id,
+            booking_date.strftime('%Y-%m-%d'),
+            start_time.strftime('%H:%M'),
+            end_time.strftime('%H:%M'),
+            court_name,
+            f"{first_name} {last_name}".strip() or username,
+            email,
+            coach_name,
+            status,
+            float(total_amount)
+        ]
+
+
+def users_with_stats():
+    """
+    Пользователи с профилем, рейтингом и статистикой бронирований одним запросом
+
+    Аннотации: bookings_count и total_spent - по подтверждённым бронированиям,
+    созданным пользователем.
+    """
+    confirmed = Booking.objects.filter(user=OuterRef('pk'), status='confirmed').order_by().values('user')
+
+    return User.objects.select_related('profile', 'rating').annotate(
+        bookings_count=Coalesce(Subquery(confirmed.annotate(total=Count('id')).values('total')), Value(0)),
+        total_spent=Coalesce(
+            Subquery(confirmed.annotate(total=Sum('total_amount')).values('total')),
+            Value(Decimal('0')),
+            output_field=DecimalField(max_digits=12, decimal_places=2)
+        ),
+    )
+
+
+def user_rows(users):
+    """Строки CSV пользователей из users_with_stats()"""
+    for user in users.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield [
+            user.id,
+            user.username,
+            user.email,
+            user.first_name,
+            user.last_name,
+            'Персонал' if user.is_staff else 'Клиент',
+            'Активен' if user.is_active else 'Неактивен',
+            user.date_joined.strftime('%Y-%m-%d'),
+            user.bookings_count,
+            float(user.total_spent)
+        ]
+
+
+def analytics_rows(start_date, end_date):
+    """Строки CSV финансовой аналитики за период"""
+    financial = get_financial_stats(start_date, end_date)
+
+    rows = [
+        ['Аналитика за период', start_date, '-', end_date],
+        [],
+        ['Финансовая аналитика'],
+        ['Показатель', 'Значение'],
+        ['Общий доход', financial['total_revenue']],
+        ['Оплачено', financial['paid_amount']],
+        ['Неоплачено', financial['unpaid_amount']],
+        ['Средний доход в день', financial['avg_daily_revenue']],
+        ['Прогноз на месяц', financial['forecast_next_month']],
+        [],
+        ['Доход по дням'],
+        ['Дата', 'Доход', 'Бронирований'],
+    ]
+    rows.extend([day['day'], day['revenue'], day['bookings_count']] for day in financial['daily_revenue'])
+    return rows
+
+
+# =============================================================================
+# ФОНОВЫЕ ЗАДАЧИ
+# =============================================================================
+
+def _write_csv(path, header, rows, total, progress):
+    with open(path, 'w', newline='', encoding='utf-8') as output:
+        # BOM для корректного отображения в Excel
+        output.write('\ufeff')
+        writer = csv.writer(output)
+        if header:
+            writer.writerow(header)
+
+        done = 0
+        for row in rows:
+            writer.writerow(row)
+            done += 1
+            if done % EXPORT_CHUNK_SIZE == 0:
+                progress(done, total)
+
+    progress(done, done)
+
+
+def export_bookings(params, path, progress):
+    bookings = bookings_queryset(params)
+    _write_csv(path, BOOKINGS_HEADER, booking_rows(bookings), bookings.count(), progress)
+
+
+def export_users(params, path, progress):
+    users = users_with_stats().order_by('-date_joined')
+    _write_csv(path, USERS_HEADER, user_rows(users), users.count(), progress)
+
+
+def export_analytics(params, path, progress):
+    rows = analytics_rows(*period_from_params(params))
+    _write_csv(path, None, rows, len(rows), progress)
+
+
+def export_analytics_excel(params, path, progress):
+    from users.excel_export import build_analytics_workbook, write_detailed_workbook
+
+    if params.get('detailed'):
+        write_detailed_workbook(*period_from_params(params), path, progress=progress)
+        return
+
+    build_analytics_workbook(*period_from_params(params)).save(path)
+    progress(1, 1)
+
+
+# Тип задачи -> (функция(params, path, progress), расширение файла)
+EXPORTERS = {
+    'bookings': (export_bookings, 'csv'),
+    'users': (export_users, 'csv'),
+    'analytics': (export_analytics, 'csv'),
+    'analytics_excel': (export_analytics_excel, 'xlsx'),
+}
+
+
+def validate_params(kind, params):
+    """
+    Проверяет параметры задачи до постановки в очередь
+
+    ValueError - неизвестный тип или неверные даты.
+    """
+    if kind not in EXPORTERS:
+        raise ValueError(f'Неизвестный тип экспорта: {kind}')
+    if not isinstance(params, dict):
+        raise ValueError('params должен быть объектом')
+
+    if kind == 'bookings':
+        bookings_queryset(params)
+    elif kind in ('analytics', 'analytics_excel'):
+        period_from_params(params)
+
+
+def reclaim_stale_jobs():
+    """
+    Возвращает в очередь задачи, брошенные остановившимся воркером
+
+    Задача считается брошенной, если воркер не отчитывался о ней (heartbeat_at)
+    дольше JOB_STALE_AFTER. Длинный экспорт, который пишет строки, не трогается.
+    После JOB_MAX_ATTEMPTS попыток задача завершается ошибкой, чтобы экспорт,
+    который роняет воркер, не перезапускался бесконечно.
+
+    Returns:
+        (возвращено в очередь, завершено ошибкой)
+    """
+    now = timezone.now()
+    threshold = now - JOB_STALE_AFTER
+    stale = ExportJob.objects.filter(
+        Q(heartbeat_at__lt=threshold) | Q(heartbeat_at__isnull=True, started_at__lt=threshold),
+        status='running'
+    )
+
+    failed = stale.filter(attempts__gte=JOB_MAX_ATTEMPTS).update(
+        status='failed',
+        error='Воркер остановился во время выполнения задачи',
+        finished_at=now
+    )
+    requeued = stale.filter(attempts__lt=JOB_MAX_ATTEMPTS).update(
+        status='pending',
+        started_at=None,
+        heartbeat_at=None,
+        progress=0,
+        rows_done=0,
+        rows_total=None
+    )
+
+    if requeued or failed:
+        logger.warning(f"Stale export jobs: {requeued} requeued, {failed} failed")
+    return requeued, failed
+
+
+def claim_next_job():
+    """
+    Забирает самую старую задачу из очереди
+
+    Перевод pending -> running выполняется условным UPDATE, поэтому
+    несколько воркеров не возьмут одну задачу дважды.
+    """
+    reclaim_stale_jobs()
+
+    while True:
+        job = ExportJob.objects.filter(status='pending').order_by('created_at', 'id').first()
+        if job is None:
+            return None
+
+        now = timezone.now()
+        claimed = ExportJob.objects.filter(pk=job.pk, status='pending').update(
+            status='running',
+            started_at=now,
+            heartbeat_at=now,
+            attempts=F('attempts') + 1
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+
+
+def run_job(job):
+    """Выполняет задачу: пишет файл во временный каталог и сохраняет в MEDIA_ROOT/exports/"""
+    exporter, extension = EXPORTERS[job.kind]
+
+    def progress(done, total):
+        ExportJob.objects.filter(pk=job.pk).update(
+            rows_done=done,
+            rows_total=total,
+            progress=min(100, done * 100 // total) if total else 0,
+            heartbeat_at=timezone.now()
+        )
+
+    fd, path = tempfile.mkstemp(suffix=f'.{extension}')
+    os.close(fd)
+    try:
+        exporter(job.params, path, progress)
+
+        with open(path, 'rb') as output:
+            job.file.save(f'{job.kind}_{job.pk}_{timezone.now().date()}.{extension}', File(output), save=False)
+
+        job.status = 'done'
+        job.progress = 100
+        job.finished_at = timezone.now()
+        job.save(update_fields=['file', 'status', 'progress', 'finished_at'])
+    except Exception as e:
+        logger.error(f"Export job {job.pk} failed: {str(e)}", exc_info=True)
+        job.status = 'failed'
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+    finally:
+        os.remove(path)
+
+    return job
+
+
+def cleanup_exports(keep_days=EXPORT_RETENTION_DAYS):
+    """
+    Удаляет завершённые задачи старше keep_days дней вместе с файлами,
+    а также файлы в MEDIA_ROOT/exports/, на которые не ссылается ни одна задача
+
+    Returns:
+        (удалено задач, удалено файлов)
+    """
+    cutoff = timezone.now() - timedelta(days=keep_days)
+    removed_files = 0
+
+    old_jobs = ExportJob.objects.filter(status__in=('done', 'failed'), finished_at__lt=cutoff)
+    for job in old_jobs.exclude(file='').iterator():
+        job.file.delete(save=False)
+        removed_files += 1
+    removed_jobs = old_jobs.delete()[0]
+
+    # Файлы без задачи: задачу удалили из админки или сохранение прервалось
+    storage = ExportJob._meta.get_field('file').storage
+    try:
+        _, names = storage.listdir('exports')
+    except FileNotFoundError:
+        names = []
+
+    known = set(ExportJob.objects.exclude(file='').values_list('file', flat=True))
+    for name in names:
+        path = f'exports/{name}'
+        if path not in known and storage.get_modified_time(path) < cutoff:
+            storage.delete(path)
+            removed_files += 1
+
+    return removed_jobs, removed_files
@@ -0,0 +1,64 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from manager import exports
+
+CLEANUP_INTERVAL = 60 * 60  # Очистка старых файлов экспорта не чаще раза в час
+
+
+class Command(BaseCommand):
+    help = 'Выполняет задачи экспорта из очереди (ExportJob) и сохраняет файлы в MEDIA_ROOT/exports/'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Выполнить задачи, которые уже в очереди, и завершиться'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=5,
+            help='Пауза между проверками очереди в секундах (по умолчанию 5)'
+        )
+        parser.add_argument(
+            '--keep-days',
+            type=int,
+            default=exports.EXPORT_RETENTION_DAYS,
+            help=f'Сколько дней хранить завершённые задачи и их файлы '
+                 f'(по умолчанию {exports.EXPORT_RETENTION_DAYS})'
+        )
+
+    def cleanup(self, keep_days):
+        removed_jobs, removed_files = exports.cleanup_exports(keep_days)
+        if removed_jobs or removed_files:
+            self.stdout.write(self.style.SUCCESS(
+                f'Удалено старых задач: {removed_jobs}, файлов: {removed_files}'
+            ))
+
+    def handle(self, *args, **options):
+        processed = 0
+        self.cleanup(options['keep_days'])
+        last_cleanup = time.monotonic()
+
+        while True:
+            job = exports.claim_next_job()
+            if job is None:
+                if options['once']:
+                    break
+                if time.monotonic() - last_cleanup >= CLEANUP_INTERVAL:
+                    self.cleanup(options['keep_days'])
+                    last_cleanup = time.monotonic()
+                time.sleep(options['sleep'])
+                continue
+
+            job = exports.run_job(job)
+            processed += 1
+
+            if job.status == 'done':
+                self.stdout.write(self.style.SUCCESS(f'Задача #{job.id} ({job.kind}): {job.file.name}'))
+            else:
+                self.stdout.write(self.style.ERROR(f'Задача #{job.id} ({job.kind}): {job.error}'))
+
+        self.stdout.write(self.style.SUCCESS(f'Выполнено задач: {processed}'))
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('bookings', 'Бронирования (CSV)'), ('users', 'Пользователи (CSV)'), ('analytics', 'Аналитика (CSV)'), ('analytics_excel', 'Аналитика (Excel)')], max_length=20, verbose_name='Тип экспорта')),
+                ('params', models.JSONField(blank=True, default=dict, help_text='Фильтры экспорта: start_date, end_date, status', verbose_name='Параметры')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Готово'), ('failed', 'Ошибка')], db_index=True, default='pending', max_length=10, verbose_name='Статус')),
+                ('progress', models.PositiveSmallIntegerField(default=0, verbose_name='Прогресс, %')),
+                ('rows_done', models.PositiveIntegerField(default=0, verbose_name='Выгружено строк')),
+                ('rows_total', models.PositiveIntegerField(blank=True, null=True, verbose_name='Всего строк')),
+                ('file', models.FileField(blank=True, upload_to='exports/', verbose_name='Файл')),
+                ('error', models.TextField(blank=True, verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Запущена')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='export_jobs', to=settings.AUTH_USER_MODEL, verbose_name='Создал')),
+            ],
+            options={
+                'verbose_name': 'Задача экспорта',
+                'verbose_name_plural': 'Задачи экспорта',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
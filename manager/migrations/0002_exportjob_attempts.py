@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manager', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='attempts',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Сколько раз воркер брал задачу (повтор после остановки воркера)', verbose_name='Попыток'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 07:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('manager', '0002_exportjob_attempts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, help_text='Обновляется при взятии задачи и при каждом отчёте о прогрессе', null=True, verbose_name='Последний отчёт воркера'),
+        ),
+    ]
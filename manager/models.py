@@ -1,3 +1,107 @@
 from django.db import models
+from django.contrib.auth.models import User
 
-# Create your models here.
+
+class ExportJob(models.Model):
+    """
+    Фоновая задача экспорта
+
+    Создаётся из панели менеджера, выполняется командой run_export_jobs;
+    готовый файл сохраняется в MEDIA_ROOT/exports/.
+    """
+
+    KIND_CHOICES = [
+        ('bookings', 'Бронирования (CSV)'),
+        ('users', 'Пользователи (CSV)'),
+        ('analytics', 'Аналитика (CSV)'),
+        ('analytics_excel', 'Аналитика (Excel)'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('done', 'Готово'),
+        ('failed', 'Ошибка'),
+    ]
+
+    kind = models.CharField(
+        max_length=20,
+        choices=KIND_CHOICES,
+        verbose_name='Тип экспорта'
+    )
+    params = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Параметры',
+        help_text='Фильтры экспорта: start_date, end_date, status'
+    )
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='pending',
+        db_index=True,
+        verbose_name='Статус'
+    )
+    progress = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Прогресс, %'
+    )
+    rows_done = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Выгружено строк'
+    )
+    rows_total = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        verbose_name='Всего строк'
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток',
+        help_text='Сколько раз воркер брал задачу (повтор после остановки воркера)'
+    )
+    file = models.FileField(
+        upload_to='exports/',
+        blank=True,
+        verbose_name='Файл'
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Ошибка'
+    )
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='export_jobs',
+        verbose_name='Создал'
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Создана'
+    )
+    started_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Запущена'
+    )
+    heartbeat_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Последний отчёт воркера',
+        help_text='Обновляется при взятии задачи и при каждом отчёте о прогрессе'
+    )
+    finished_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Завершена'
+    )
+
+    class Meta:
+        verbose_name = 'Задача экспорта'
+        verbose_name_plural = 'Задачи экспорта'
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.get_status_display()})"
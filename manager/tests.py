@@ -1,3 +1,371 @@
 from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from datetime import time, timedelta
+from django.utils import timezone
 
-# Create your tests here.
+from booking.models import Booking, Court
+
+
+class ClientsStatsQueryBudgetTest(TestCase):
+    """Количество запросов get_clients_stats не зависит от числа клиентов"""
+
+    def create_clients(self, count, court, booking_date):
+        for i in range(count):
+            user = User.objects.create_user(username=f'client{court.id}_{i}')
+            for hour in (10, 12):
+                booking = Booking.objects.create(
+                    user=user,
+                    court=court,
+                    date=booking_date - timedelta(days=i),
+                    start_time=time(hour, 0),
+                    end_time=time(hour + 1, 0),
+                    status='confirmed'
+                )
+            booking.partners.add(User.objects.create_user(username=f'partner{court.id}_{i}'))
+
+    def test_query_count_is_constant(self):
+        from booking.analytics import get_clients_stats
+
+        today = timezone.now().date()
+        start_date = today - timedelta(days=60)
+
+        self.create_clients(3, Court.objects.create(name='Корт №1', description='', price_per_hour=1000), today)
+        cache.clear()
+        with self.assertNumQueries(5):
+            small = get_clients_stats(start_date, today)
+
+        self.create_clients(30, Court.objects.create(name='Корт №2', description='', price_per_hour=1000), today)
+        cache.clear()
+        with self.assertNumQueries(5):
+            large = get_clients_stats(start_date, today)
+
+        self.assertEqual(small['active_users'], 6)
+        self.assertEqual(large['active_users'], 66)
+        self.assertEqual(large['users_with_multiple_bookings'], 33)
+        self.assertEqual(len(large['top_clients']), 10)
+        self.assertEqual(large['top_clients'][0]['bookings_count'], 2)
+        self.assertEqual(large['top_clients'][0]['total_spent'], 2000.0)
+        self.assertEqual(large['avg_ltv'], 2000.0)
+        self.assertEqual(large['frequency_distribution'], [{'bookings_count': 2, 'users_count': 33}])
+
+
+class BookingsKeysetPaginationTest(TestCase):
+    """Keyset-пагинация списка бронирований менеджера"""
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username='manager', password='password', is_staff=True)
+        self.client.force_login(self.staff)
+        self.courts = [
+            Court.objects.create(name=f'Корт №{i}', description='', price_per_hour=1000) for i in range(3)
+        ]
+        start = timezone.now().date() - timedelta(days=10)
+        # Одинаковые (date, start_time) на разных кортах - порядок внутри решает id
+        for day in range(10):
+            for court in self.courts:
+                for hour in (10, 12):
+                    Booking.objects.create(
+                        user=self.staff,
+                        court=court,
+                        date=start + timedelta(days=day),
+                        start_time=time(hour, 0),
+                        end_time=time(hour + 1, 0),
+                        status='confirmed' if hour == 10 else 'pending'
+                    )
+
+    def fetch(self, **params):
+        response = self.client.get('/admin/api/bookings/', params, secure=True)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_pages_cover_all_bookings_in_order(self):
+        expected = list(
+            Booking.objects.order_by('-date', '-start_time', '-id').values_list('id', flat=True)
+        )
+
+        ids = []
+        data = self.fetch(limit=7)
+        self.assertEqual(data['totals']['total'], 60)
+        self.assertEqual(data['totals']['confirmed'], 30)
+        while True:
+            ids.extend(booking['id'] for booking in data['bookings'])
+            if not data['has_more']:
+                break
+            data = self.fetch(limit=7, cursor=data['next_cursor'])
+            self.assertNotIn('totals', data)
+
+        self.assertEqual(ids, expected)
+
+    def test_filters_and_constant_page_cost(self):
+        data = self.fetch(status='confirmed', court=self.courts[0].id, limit=3)
+        self.assertEqual(data['totals']['total'], 10)
+        self.assertTrue(all(booking['status'] == 'confirmed' for booking in data['bookings']))
+
+        cursor = data['next_cursor']
+        for _ in range(2):
+            data = self.fetch(status='confirmed', court=self.courts[0].id, limit=3, cursor=cursor)
+            cursor = data['next_cursor']
+
+        # Сессия, пользователь и одна выборка страницы - на любой глубине
+        with self.assertNumQueries(3):
+            self.fetch(status='confirmed', court=self.courts[0].id, limit=3, cursor=cursor)
+
+        response = self.client.get('/admin/api/bookings/', {'cursor': 'broken'}, secure=True)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/admin/api/bookings/', {'start_date': '01.01.2026'}, secure=True)
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get('/admin/api/bookings/', {'status': 'confirmed,paid'}, secure=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('paid', response.json()['error'])
+
+
+class BookingsExportTest(TestCase):
+    """Потоковый CSV-экспорт бронирований"""
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username='manager', is_staff=True)
+        self.client.force_login(self.staff)
+        court = Court.objects.create(name='Корт №1', description='', price_per_hour=1000)
+        self.start = timezone.now().date() - timedelta(days=5)
+        for day in range(5):
+            for hour, status in ((10, 'confirmed'), (12, 'pending'), (14, 'cancelled')):
+                Booking.objects.create(
+                    user=self.staff,
+                    court=court,
+                    date=self.start + timedelta(days=day),
+                    start_time=time(hour, 0),
+                    end_time=time(hour + 1, 30),
+                    status=status
+                )
+
+    def export(self, **params):
+        return self.client.get('/admin/api/bookings/export/', params, secure=True)
+
+    def rows(self, response):
+        import csv
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        self.assertTrue(content.startswith('\ufeff'))
+        return list(csv.reader(content[1:].splitlines()))
+
+    def test_streams_all_bookings(self):
+        from manager.exports import BOOKINGS_HEADER
+
+        rows = self.rows(self.export())
+        self.assertEqual(rows[0], BOOKINGS_HEADER)
+        self.assertEqual(len(rows), 16)
+        self.assertEqual(rows[1][1], (self.start + timedelta(days=4)).isoformat())
+        self.assertEqual(rows[1][2:4], ['14:00', '15:30'])
+        self.assertEqual(rows[1][9], '1500.0')
+
+    def test_filters(self):
+        rows = self.rows(self.export(status='confirmed,pending', start_date=self.start.isoformat(),
+                                     end_date=(self.start + timedelta(days=1)).isoformat()))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual({row[8] for row in rows[1:]}, {'confirmed', 'pending'})
+
+    def test_invalid_params(self):
+        for params in ({'start_date': '01.01.2026'}, {'end_date': 'soon'}, {'status': 'confirmed,paid'}):
+            response = self.export(**params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertFalse(response.streaming)
+
+
+class UsersQueryBudgetTest(TestCase):
+    """Количество запросов списка, карточки и экспорта пользователей не зависит от их числа"""
+
+    def setUp(self):
+        self.staff = User.objects.create_user(username='manager', is_staff=True)
+        self.client.force_login(self.staff)
+        self.court = Court.objects.create(name='Корт №1', description='', price_per_hour=1000)
+        self.booking_date = timezone.now().date() - timedelta(days=1)
+
+    def create_users(self, count):
+        for _ in range(count):
+            index = User.objects.count()
+            user = User.objects.create_user(username=f'player{index}')
+            for hour, status in ((10, 'confirmed'), (12, 'confirmed'), (14, 'cancelled')):
+                Booking.objects.create(
+                    user=user,
+                    court=self.court,
+                    date=self.booking_date - timedelta(days=index),
+                    start_time=time(hour, 0),
+                    end_time=time(hour + 1, 0),
+                    status=status
+                )
+
+    def export_rows(self):
+        import csv
+
+        response = self.client.get('/admin/api/users/export/', secure=True)
+        content = b''.join(response.streaming_content).decode('utf-8')
+        return list(csv.reader(content[1:].splitlines()))
+
+    def test_query_count_is_constant(self):
+        for count in (2, 30):
+            self.create_users(count)
+            player = User.objects.filter(bookings_created__isnull=False).latest('id')
+
+            # Сессия, пользователь, страница со статистикой бронирований и четыре счётчика
+            with self.assertNumQueries(7):
+                response = self.client.get('/admin/api/users/', secure=True)
+            data = response.json()
+            self.assertEqual(len(data['users']), User.objects.count())
+            self.assertEqual(data['stats']['total_users'], User.objects.count())
+
+            with self.assertNumQueries(3):
+                response = self.client.get(f'/admin/api/users/{player.id}/', secure=True)
+            user = response.json()['user']
+            self.assertEqual((user['bookings_count'], user['total_spent']), (2, 2000.0))
+            self.assertIsNotNone(user['rating_level'])
+
+            with self.assertNumQueries(3):
+                rows = self.export_rows()
+            self.assertEqual(len(rows), User.objects.count() + 1)
+            self.assertEqual(rows[1][8:], ['2', '2000.0'])
+
+
+class ExportJobTest(TestCase):
+    """Фоновые задачи экспорта: очередь, выполнение, скачивание и очистка"""
+
+    def setUp(self):
+        import shutil
+        import tempfile
+        from django.test import override_settings
+
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=media_root)
+        media.enable()
+        self.addCleanup(media.disable)
+
+        self.staff = User.objects.create_user(username='manager', is_staff=True)
+        self.client.force_login(self.staff)
+        court = Court.objects.create(name='Корт №1', description='', price_per_hour=1000)
+        for day in range(3):
+            Booking.objects.create(
+                user=self.staff,
+                court=court,
+                date=timezone.now().date() - timedelta(days=day + 1),
+                start_time=time(10, 0),
+                end_time=time(11, 0),
+                status='confirmed'
+            )
+
+    def create_job(self, body):
+        import json
+
+        return self.client.post(
+            '/admin/api/exports/create/', json.dumps(body), content_type='application/json', secure=True
+        )
+
+    def test_create_run_download(self):
+        from django.core.management import call_command
+        from io import StringIO
+
+        response = self.create_job({'kind': 'bookings', 'params': {'status': 'confirmed'}})
+        self.assertEqual(response.status_code, 200)
+        job = response.json()['job']
+        self.assertEqual((job['status'], job['progress'], job['download_url']), ('pending', 0, None))
+
+        call_command('run_export_jobs', '--once', stdout=StringIO())
+
+        job = self.client.get(f"/admin/api/exports/{job['id']}/", secure=True).json()['job']
+        self.assertEqual(job['status'], 'done')
+        self.assertEqual((job['progress'], job['rows_done'], job['rows_total']), (100, 3, 3))
+
+        response = self.client.get(job['download_url'], secure=True)
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode('utf-8-sig').splitlines()
+        self.assertEqual(len(lines), 4)
+
+    def test_invalid_requests(self):
+        for body in ([], 'bookings', {'kind': 'unknown'}, {'kind': 'bookings', 'params': {'status': 'paid'}},
+                     {'kind': 'bookings', 'params': ['confirmed']}):
+            response = self.create_job(body)
+            self.assertEqual(response.status_code, 400, body)
+
+        response = self.client.post(
+            '/admin/api/exports/create/', '{broken', content_type='application/json', secure=True
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_stale_running_jobs_are_reclaimed(self):
+        from manager import exports
+        from manager.models import ExportJob
+
+        long_ago = timezone.now() - exports.JOB_STALE_AFTER - timedelta(minutes=1)
+        stale = ExportJob.objects.create(
+            kind='users', status='running', started_at=long_ago, heartbeat_at=long_ago, attempts=1
+        )
+        exhausted = ExportJob.objects.create(
+            kind='users', status='running', started_at=long_ago, heartbeat_at=long_ago,
+            attempts=exports.JOB_MAX_ATTEMPTS
+        )
+        # Долгий экспорт, который продолжает отчитываться о прогрессе, не трогается
+        long_running = ExportJob.objects.create(
+            kind='users', status='running', started_at=long_ago, heartbeat_at=timezone.now(), attempts=1
+        )
+
+        job = exports.claim_next_job()
+        self.assertEqual((job.pk, job.status, job.attempts), (stale.pk, 'running', 2))
+        self.assertGreater(job.heartbeat_at, long_ago)
+        self.assertIsNone(exports.claim_next_job())
+
+        exhausted.refresh_from_db()
+        long_running.refresh_from_db()
+        self.assertEqual(exhausted.status, 'failed')
+        self.assertEqual(long_running.status, 'running')
+
+        # Отчёт о прогрессе продлевает задачу
+        ExportJob.objects.filter(pk=job.pk).update(heartbeat_at=long_ago)
+        job = exports.run_job(job)
+        self.assertEqual(job.status, 'done')
+        job.refresh_from_db()
+        self.assertGreater(job.heartbeat_at, long_ago)
+
+    def test_cleanup_removes_old_files(self):
+        import os
+        from django.conf import settings
+        from django.core.files.base import ContentFile
+        from manager import exports
+        from manager.models import ExportJob
+
+        old = ExportJob.objects.create(kind='users', status='done', finished_at=timezone.now() - timedelta(days=8))
+        old.file.save('old.csv', ContentFile(b'old'))
+        fresh = ExportJob.objects.create(kind='users', status='done', finished_at=timezone.now())
+        fresh.file.save('fresh.csv', ContentFile(b'fresh'))
+
+        orphan = os.path.join(settings.MEDIA_ROOT, 'exports', 'orphan.csv')
+        with open(orphan, 'w') as output:
+            output.write('orphan')
+        month_ago = (timezone.now() - timedelta(days=30)).timestamp()
+        os.utime(orphan, (month_ago, month_ago))
+
+        self.assertEqual(exports.cleanup_exports(keep_days=7), (1, 2))
+        self.assertEqual(list(ExportJob.objects.values_list('pk', flat=True)), [fresh.pk])
+        self.assertEqual(os.listdir(os.path.join(settings.MEDIA_ROOT, 'exports')), [os.path.basename(fresh.file.name)])
+
+
+class CohortsApiTest(TestCase):
+    """Проверка параметра months когорт"""
+
+    def setUp(self):
+        self.client.force_login(User.objects.create_user(username='manager', is_staff=True))
+
+    def test_months_range(self):
+        for url in ('/admin/api/analytics/cohorts/', '/admin/api/analytics/cohorts/export/'):
+            for months in ('abc', '0', '-3', '37'):
+                response = self.client.get(url, {'months': months}, secure=True)
+                self.assertEqual(response.status_code, 400, (url, months))
+                self.assertFalse(response.json()['success'])
+
+        response = self.client.get('/admin/api/analytics/cohorts/', {'months': 3}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['cohorts']['cohorts']), 3)
+
+        response = self.client.get('/admin/api/analytics/cohorts/export/', {'months': 36}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.content.decode('utf-8-sig').splitlines()), 37)
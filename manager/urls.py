@@ -35,9 +35,13 @@ urlpatterns = [
     path('api/courts/<int:court_id>/', views.api_court_detail, name='api_court_detail'),
     path('api/courts/<int:court_id>/update/', views.api_court_update, name='api_court_update'),
     path('api/courts/<int:court_id>/delete/', views.api_court_delete, name='api_court_delete'),
+    path('api/courts/slots-cache/', views.api_slots_cache_stats, name='api_slots_cache_stats'),
 
     # API - Analytics
     path('api/analytics/', views.api_analytics, name='api_analytics'),
+    path('api/analytics/heatmap/', views.api_analytics_heatmap, name='api_analytics_heatmap'),
+    path('api/analytics/cohorts/', views.api_analytics_cohorts, name='api_analytics_cohorts'),
+    path('api/analytics/cohorts/export/', views.api_analytics_cohorts_export, name='api_analytics_cohorts_export'),
     path('api/analytics/export/', views.api_analytics_export, name='api_analytics_export'),
 
     # API - Users
@@ -48,6 +52,11 @@ urlpatterns = [
     path('api/users/<int:user_id>/delete/', views.api_user_delete, name='api_user_delete'),
     path('api/users/export/', views.api_users_export, name='api_users_export'),
 
+    # API - Export jobs
+    path('api/exports/create/', views.api_export_create, name='api_export_create'),
+    path('api/exports/<int:job_id>/', views.api_export_status, name='api_export_status'),
+    path('api/exports/<int:job_id>/download/', views.api_export_download, name='api_export_download'),
+
     # API - Schedule
     path('api/schedule/', views.api_schedule, name='api_schedule'),
     path('api/schedule/events/', views.api_schedule_events, name='api_schedule_events'),
@@ -4,16 +4,25 @@ Manager App Views
 """
 
 from django.shortcuts import render, get_object_or_404
+from django.urls import reverse
 from django.contrib.admin.views.decorators import staff_member_required
-from django.http import JsonResponse, HttpResponse
+from django.http import FileResponse, Http404, JsonResponse, HttpResponse, StreamingHttpResponse
 from django.utils import timezone
 from datetime import datetime, timedelta
-from django.db.models import Q, Sum
+from django.db.models import Count, Q, Sum
 from django.views.decorators.http import require_POST
+from django.db import IntegrityError
+import base64
+import binascii
 import csv
 
 from booking.models import Booking, Court
-from booking.analytics import get_financial_stats, get_occupancy_stats, get_clients_stats
+from booking import cohorts, slot_cache
+from booking.utils import check_time_conflicts, has_time_conflict
+from booking.analytics import get_dashboard_stats
+from booking.heatmap import get_occupancy_heatmap
+from . import exports
+from .models import ExportJob
 
 
 @staff_member_required
@@ -66,9 +75,10 @@ def api_metrics(request):
         today = timezone.now().date()
         start_date = today - timedelta(days=30)
 
-        financial = get_financial_stats(start_date, today)
-        occupancy = get_occupancy_stats(start_date, today)
-        clients = get_clients_stats(start_date, today)
+        stats = get_dashboard_stats(start_date, today)
+        financial = stats['financial']
+        occupancy = stats['occupancy']
+        clients = stats['clients']
 
         # Подготовка данных для графиков
         # График дохода за последние 7 дней
@@ -109,16 +119,81 @@ def api_metrics(request):
 # API ENDPOINTS FOR BOOKINGS
 # =============================================================================
 
+BOOKINGS_PAGE_SIZE = 100
+BOOKINGS_PAGE_SIZE_MAX = 500
+
+
+def _encode_cursor(booking):
+    """Курсор - позиция последнего бронирования страницы (date, start_time, id)"""
+    value = f"{booking.date.isoformat()}|{booking.start_time.strftime('%H:%M:%S')}|{booking.id}"
+    return base64.urlsafe_b64encode(value.encode()).decode()
+
+
+def _decode_cursor(cursor):
+    """(date, start_time, id) из курсора. ValueError - курсор повреждён."""
+    try:
+        booking_date, start_time, booking_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return (
+            datetime.strptime(booking_date, '%Y-%m-%d').date(),
+            datetime.strptime(start_time, '%H:%M:%S').time(),
+            int(booking_id)
+        )
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError('Неверный курсор')
+
+
+def _booking_totals(bookings):
+    """Количество по статусам и выручка (подтверждённые) одним агрегатным запросом"""
+    totals = bookings.aggregate(
+        total=Count('id'),
+        confirmed=Count('id', filter=Q(status='confirmed')),
+        pending=Count('id', filter=Q(status='pending')),
+        cancelled=Count('id', filter=Q(status='cancelled')),
+        revenue=Sum('total_amount', filter=Q(status='confirmed')),
+    )
+    totals['revenue'] = float(totals['revenue'] or 0)
+    return totals
+
+
 @staff_member_required
 def api_bookings_list(request):
-    """API: Список всех бронирований"""
+    """
+    API: Список бронирований с фильтрами и keyset-пагинацией
+
+    Сортировка - от новых к старым по (date, start_time, id). Следующая страница
+    запрашивается с cursor=next_cursor и начинается сразу после последней строки
+    предыдущей, поэтому дальние страницы не дороже первой.
+    Итоги по фильтру (totals) и за сегодня (stats) считаются только для первой страницы.
+    """
     try:
-        # Ограничиваем выборку последними 100 бронированиями для производительности
-        bookings = Booking.objects.select_related('court', 'user', 'coach').order_by('-date', '-start_time')[:100]
+        try:
+            bookings = exports.filter_bookings(request.GET)
+            limit = min(max(int(request.GET.get('limit', BOOKINGS_PAGE_SIZE)), 1), BOOKINGS_PAGE_SIZE_MAX)
+            cursor = request.GET.get('cursor')
+            position = _decode_cursor(cursor) if cursor else None
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+        page = bookings
+        if position:
+            booking_date, start_time, booking_id = position
+            # date__lte - отдельное условие, по которому база ищет начало страницы в индексе
+            page = page.filter(date__lte=booking_date).filter(
+                Q(date__lt=booking_date) |
+                Q(date=booking_date, start_time__lt=start_time) |
+                Q(date=booking_date, start_time=start_time, id__lt=booking_id)
+            )
+
+        # Лишняя строка показывает, есть ли следующая страница
+        page = list(
+            page.select_related('court', 'user', 'coach').order_by('-date', '-start_time', '-id')[:limit + 1]
+        )
+        has_more = len(page) > limit
+        page = page[:limit]
 
         # Формируем данные для отображения
         bookings_data = []
-        for booking in bookings:
+        for booking in page:
             bookings_data.append({
                 'id': booking.id,
                 'date': booking.date.isoformat(),
@@ -129,26 +204,29 @@ def api_bookings_list(request):
                 'user_id': booking.user.id,
                 'user_name': booking.user.get_full_name() or booking.user.username,
                 'coach_name': f"{booking.coach.first_name} {booking.coach.last_name}" if booking.coach else None,
+                'booking_type': booking.booking_type,
                 'status': booking.status,
-                'total_price': float(booking.total_price),
+                'total_price': float(booking.total_amount),
             })
 
-        # Статистика за сегодня
-        today = timezone.now().date()
-        today_bookings = Booking.objects.filter(date=today)
-
-        stats = {
-            'total_today': today_bookings.count(),
-            'confirmed_today': today_bookings.filter(status='confirmed').count(),
-            'pending_today': today_bookings.filter(status='pending').count(),
-            'revenue_today': sum(float(b.total_price) for b in today_bookings.filter(status='confirmed'))
-        }
-
-        return JsonResponse({
+        response = {
             'success': True,
             'bookings': bookings_data,
-            'stats': stats
-        })
+            'next_cursor': _encode_cursor(page[-1]) if has_more else None,
+            'has_more': has_more,
+        }
+
+        if not cursor:
+            today_totals = _booking_totals(Booking.objects.filter(date=timezone.now().date()))
+            response['stats'] = {
+                'total_today': today_totals['total'],
+                'confirmed_today': today_totals['confirmed'],
+                'pending_today': today_totals['pending'],
+                'revenue_today': today_totals['revenue'],
+            }
+            response['totals'] = _booking_totals(bookings)
+
+        return JsonResponse(response)
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
@@ -368,6 +446,9 @@ def api_court_update(request, court_id):
 
         court.save()
 
+        # Цена и доступность корта входят в закэшированные слоты всех дат
+        slot_cache.invalidate(court.id)
+
         return JsonResponse({
             'success': True,
             'message': 'Корт успешно обновлен',
@@ -382,6 +463,18 @@ def api_court_update(request, court_id):
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+@staff_member_required
+def api_slots_cache_stats(request):
+    """API: Счётчики попаданий и промахов кэша свободных слотов"""
+    try:
+        return JsonResponse({
+            'success': True,
+            'stats': slot_cache.get_stats()
+        })
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
 @staff_member_required
 @require_POST
 def api_court_delete(request, court_id):
@@ -415,37 +508,23 @@ def api_court_delete(request, court_id):
 
 @staff_member_required
 def api_bookings_export(request):
-    """API: Экспорт бронирований в CSV"""
+    """API: Экспорт бронирований в CSV (потоковый)"""
     try:
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = f'attachment; filename="bookings_{timezone.now().date()}.csv"'
-
-        # Добавляем BOM для корректного отображения в Excel
-        response.write('\ufeff')
-
-        writer = csv.writer(response)
-        writer.writerow(['ID', 'Дата', 'Время начала', 'Время окончания', 'Корт', 'Клиент', 'Email', 'Тренер',
-                         'Статус', 'Сумма'])
+        bookings = exports.bookings_queryset(request.GET)
+    except ValueError as e:
+        return HttpResponse(f'Ошибка: {e}', status=400)
 
-        bookings = Booking.objects.select_related('court', 'user', 'coach').order_by('-date')
+    def stream():
+        writer = csv.writer(exports.EchoBuffer())
+        # BOM для корректного отображения в Excel
+        yield '\ufeff'
+        yield writer.writerow(exports.BOOKINGS_HEADER)
+        for row in exports.booking_rows(bookings):
+            yield writer.writerow(row)
 
-        for booking in bookings:
-            writer.writerow([
-                booking.id,
-                booking.date.strftime('%Y-%m-%d'),
-                booking.start_time.strftime('%H:%M'),
-                booking.end_time.strftime('%H:%M'),
-                booking.court.name,
-                booking.user.get_full_name() or booking.user.username,
-                booking.user.email,
-                f"{booking.coach.first_name} {booking.coach.last_name}" if booking.coach else '',
-                booking.status,
-                float(booking.total_price)
-            ])
-
-        return response
-    except Exception as e:
-        return HttpResponse(f'Ошибка: {str(e)}', status=500)
+    response = StreamingHttpResponse(stream(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="bookings_{timezone.now().date()}.csv"'
+    return response
 
 
 # =============================================================================
@@ -460,20 +539,105 @@ def api_analytics(request):
         today = timezone.now().date()
         start_date = today - timedelta(days=days)
 
-        financial = get_financial_stats(start_date, today)
-        occupancy = get_occupancy_stats(start_date, today)
-        clients = get_clients_stats(start_date, today)
+        stats = get_dashboard_stats(start_date, today)
 
         return JsonResponse({
             'success': True,
-            'financial': financial,
-            'occupancy': occupancy,
-            'clients': clients
+            'financial': stats['financial'],
+            'occupancy': stats['occupancy'],
+            'clients': stats['clients']
         })
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+@staff_member_required
+def api_analytics_heatmap(request):
+    """API: Тепловая карта загруженности (корт × день × час)"""
+    try:
+        try:
+            days = int(request.GET.get('days', 30))
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Неверный формат числа дней'}, status=400)
+        if not 1 <= days <= 366:
+            return JsonResponse({'success': False, 'error': 'Число дней должно быть от 1 до 366'}, status=400)
+
+        today = timezone.now().date()
+        start_date = today - timedelta(days=days)
+
+        return JsonResponse({
+            'success': True,
+            'heatmap': get_occupancy_heatmap(start_date, today)
+        })
+    except ImportError:
+        return JsonResponse({
+            'success': False,
+            'error': 'numpy не установлен. Выполните: pip install numpy'
+        }, status=500)
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+COHORT_MONTHS_MAX = 36
+
+
+def _cohort_months(params):
+    """Число месяцев когорт из параметра months (1..36). ValueError - неверное значение."""
+    try:
+        months = int(params.get('months', 12))
+    except ValueError:
+        raise ValueError('Неверный формат числа месяцев')
+    if not 1 <= months <= COHORT_MONTHS_MAX:
+        raise ValueError(f'Число месяцев должно быть от 1 до {COHORT_MONTHS_MAX}')
+    return months
+
+
+@staff_member_required
+def api_analytics_cohorts(request):
+    """API: Когорты по месяцу регистрации (удержание)"""
+    try:
+        try:
+            months = _cohort_months(request.GET)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+        return JsonResponse({
+            'success': True,
+            'cohorts': cohorts.get_cohort_matrix(months)
+        })
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@staff_member_required
+def api_analytics_cohorts_export(request):
+    """API: Экспорт когорт в CSV"""
+    try:
+        try:
+            months = _cohort_months(request.GET)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+        matrix = cohorts.get_cohort_matrix(months)
+        today = timezone.now().date()
+
+        response = HttpResponse(content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = f'attachment; filename="cohorts_{today}.csv"'
+        response.write('\ufeff')
+
+        writer = csv.writer(response)
+        writer.writerow(['Когорта', 'Регистраций'] + [f'Месяц {offset}' for offset in range(months)])
+
+        for row in matrix['cohorts']:
+            writer.writerow([row['cohort'], row['size']] + [
+                f"{count} ({retention}%)" for count, retention in zip(row['active'], row['retention'])
+            ])
+
+        return response
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
 @staff_member_required
 def api_analytics_export(request):
     """API: Экспорт аналитики в CSV"""
@@ -482,31 +646,11 @@ def api_analytics_export(request):
         today = timezone.now().date()
         start_date = today - timedelta(days=days)
 
-        financial = get_financial_stats(start_date, today)
-
         response = HttpResponse(content_type='text/csv; charset=utf-8')
         response['Content-Disposition'] = f'attachment; filename="analytics_{today}.csv"'
         response.write('\ufeff')
 
-        writer = csv.writer(response)
-        writer.writerow(['Аналитика за период', start_date, '-', today])
-        writer.writerow([])
-
-        # Financial data
-        writer.writerow(['Финансовая аналитика'])
-        writer.writerow(['Показатель', 'Значение'])
-        writer.writerow(['Общий доход', financial['total_revenue']])
-        writer.writerow(['Оплачено', financial['paid_amount']])
-        writer.writerow(['Неоплачено', financial['unpaid_amount']])
-        writer.writerow(['Средний доход в день', financial['avg_daily_revenue']])
-        writer.writerow(['Прогноз на месяц', financial['forecast_next_month']])
-        writer.writerow([])
-
-        # Daily revenue
-        writer.writerow(['Доход по дням'])
-        writer.writerow(['Дата', 'Доход', 'Бронирований'])
-        for day in financial['daily_revenue']:
-            writer.writerow([day['day'], day['revenue'], day['bookings_count']])
+        csv.writer(response).writerows(exports.analytics_rows(start_date, today))
 
         return response
     except Exception as e:
@@ -517,54 +661,51 @@ def api_analytics_export(request):
 # API ENDPOINTS FOR USERS
 # =============================================================================
 
+def _user_data(user):
+    """Данные пользователя из exports.users_with_stats() для API"""
+    # Профиль и рейтинг уже загружены select_related
+    phone = None
+    email_verified = False
+    if hasattr(user, 'profile'):
+        phone = user.profile.phone
+        email_verified = user.profile.email_verified
+
+    rating_level = None
+    rating_progress = 0
+    if hasattr(user, 'rating'):
+        rating_level = user.rating.level
+        rating_progress = user.rating.get_progress_percentage()
+
+    return {
+        'id': user.id,
+        'username': user.username,
+        'email': user.email,
+        'phone': phone,
+        'email_verified': email_verified,
+        'rating_level': rating_level,
+        'rating_progress': rating_progress,
+        'full_name': user.get_full_name(),
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'is_staff': user.is_staff,
+        'is_active': user.is_active,
+        'is_superuser': user.is_superuser,
+        'date_joined': user.date_joined.isoformat(),
+        'last_login': user.last_login.isoformat() if user.last_login else None,
+        'bookings_count': user.bookings_count,
+        'total_spent': float(user.total_spent),
+    }
+
+
 @staff_member_required
 def api_users_list(request):
     """API: Список всех пользователей"""
     try:
-        from django.contrib.auth.models import User
-
         # Ограничиваем выборку для производительности
-        users = User.objects.all().order_by('-date_joined')[:100]
+        users = exports.users_with_stats().order_by('-date_joined')[:100]
 
         # Формируем данные для отображения
-        users_data = []
-        for user in users:
-            # Подсчитываем бронирования и потраченную сумму
-            user_bookings = Booking.objects.filter(user=user, status='confirmed')
-            total_spent = sum(float(b.total_price) for b in user_bookings)
-
-            # Получаем данные профиля и рейтинга
-            phone = None
-            email_verified = False
-            if hasattr(user, 'profile'):
-                phone = user.profile.phone
-                email_verified = user.profile.email_verified
-
-            rating_level = None
-            rating_progress = 0
-            if hasattr(user, 'rating'):
-                rating_level = user.rating.level
-                rating_progress = user.rating.get_progress_percentage()
-
-            users_data.append({
-                'id': user.id,
-                'username': user.username,
-                'email': user.email,
-                'phone': phone,
-                'email_verified': email_verified,
-                'rating_level': rating_level,
-                'rating_progress': rating_progress,
-                'full_name': user.get_full_name(),
-                'first_name': user.first_name,
-                'last_name': user.last_name,
-                'is_staff': user.is_staff,
-                'is_active': user.is_active,
-                'is_superuser': user.is_superuser,
-                'date_joined': user.date_joined.isoformat(),
-                'last_login': user.last_login.isoformat() if user.last_login else None,
-                'bookings_count': user_bookings.count(),
-                'total_spent': total_spent,
-            })
+        users_data = [_user_data(user) for user in users]
 
         # Статистика
         today = timezone.now().date()
@@ -598,46 +739,8 @@ def api_users_list(request):
 def api_user_detail(request, user_id):
     """API: Детали конкретного пользователя"""
     try:
-        from django.contrib.auth.models import User
-
-        user = get_object_or_404(User, id=user_id)
-
-        # Подсчитываем бронирования и потраченную сумму
-        user_bookings = Booking.objects.filter(user=user, status='confirmed')
-        total_spent = sum(float(b.total_price) for b in user_bookings)
-
-        # Получаем данные профиля и рейтинга
-        phone = None
-        email_verified = False
-        if hasattr(user, 'profile'):
-            phone = user.profile.phone
-            email_verified = user.profile.email_verified
-
-        rating_level = None
-        rating_progress = 0
-        if hasattr(user, 'rating'):
-            rating_level = user.rating.level
-            rating_progress = user.rating.get_progress_percentage()
-
-        user_data = {
-            'id': user.id,
-            'username': user.username,
-            'email': user.email,
-            'phone': phone,
-            'email_verified': email_verified,
-            'rating_level': rating_level,
-            'rating_progress': rating_progress,
-            'full_name': user.get_full_name(),
-            'first_name': user.first_name,
-            'last_name': user.last_name,
-            'is_staff': user.is_staff,
-            'is_active': user.is_active,
-            'is_superuser': user.is_superuser,
-            'date_joined': user.date_joined.isoformat(),
-            'last_login': user.last_login.isoformat() if user.last_login else None,
-            'bookings_count': user_bookings.count(),
-            'total_spent': total_spent,
-        }
+        user = get_object_or_404(exports.users_with_stats(), id=user_id)
+        user_data = _user_data(user)
 
         return JsonResponse({
             'success': True,
@@ -649,40 +752,19 @@ def api_user_detail(request, user_id):
 
 @staff_member_required
 def api_users_export(request):
-    """API: Экспорт пользователей в CSV"""
-    try:
-        from django.contrib.auth.models import User
-
-        response = HttpResponse(content_type='text/csv; charset=utf-8')
-        response['Content-Disposition'] = f'attachment; filename="users_{timezone.now().date()}.csv"'
-        response.write('\ufeff')
+    """API: Экспорт пользователей в CSV (потоковый)"""
+    users = exports.users_with_stats().order_by('-date_joined')
 
-        writer = csv.writer(response)
-        writer.writerow(['ID', 'Username', 'Email', 'Имя', 'Фамилия', 'Роль', 'Статус',
-                         'Зарегистрирован', 'Бронирований', 'Потрачено'])
-
-        users = User.objects.all().order_by('-date_joined')
-
-        for user in users:
-            user_bookings = Booking.objects.filter(user=user, status='confirmed')
-            total_spent = sum(float(b.total_price) for b in user_bookings)
-
-            writer.writerow([
-                user.id,
-                user.username,
-                user.email,
-                user.first_name,
-                user.last_name,
-                'Персонал' if user.is_staff else 'Клиент',
-                'Активен' if user.is_active else 'Неактивен',
-                user.date_joined.strftime('%Y-%m-%d'),
-                user_bookings.count(),
-                total_spent
-            ])
+    def stream():
+        writer = csv.writer(exports.EchoBuffer())
+        yield '\ufeff'
+        yield writer.writerow(exports.USERS_HEADER)
+        for row in exports.user_rows(users):
+            yield writer.writerow(row)
 
-        return response
-    except Exception as e:
-        return HttpResponse(f'Ошибка: {str(e)}', status=500)
+    response = StreamingHttpResponse(stream(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="users_{timezone.now().date()}.csv"'
+    return response
 
 
 @staff_member_required
@@ -1074,18 +1156,12 @@ def api_booking_update_time(request, booking_id):
             }, status=400)
 
         # Проверка на конфликты бронирований (исключая текущее бронирование)
-        conflicts = Booking.objects.filter(
-            court=booking.court,
-            date=new_start.date(),
-            status__in=['pending', 'confirmed']
-        ).exclude(
-            id=booking.id
-        ).exclude(
-            Q(end_time__lte=new_start.time()) | Q(start_time__gte=new_end.time())
+        has_conflict, conflict = check_time_conflicts(
+            booking.court, new_start.date(), new_start.time(), new_end.time(),
+            exclude_booking_id=booking.id
         )
 
-        if conflicts.exists():
-            conflict = conflicts.first()
+        if has_conflict:
             return JsonResponse({
                 'success': False,
                 'error': f'Конфликт с другим бронированием ({conflict.start_time.strftime("%H:%M")} - {conflict.end_time.strftime("%H:%M")})'
@@ -1101,6 +1177,11 @@ def api_booking_update_time(request, booking_id):
             'success': True,
             'message': 'Время бронирования обновлено'
         })
+    except IntegrityError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Это время уже занято другим бронированием'
+        }, status=400)
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
@@ -1150,15 +1231,7 @@ def api_booking_create(request):
             coach = get_object_or_404(User, id=coach_id, is_staff=True)
 
         # Проверка на конфликты бронирований
-        conflicts = Booking.objects.filter(
-            court=court,
-            date=booking_date,
-            status__in=['pending', 'confirmed']
-        ).exclude(
-            Q(end_time__lte=start_time) | Q(start_time__gte=end_time)
-        )
-
-        if conflicts.exists():
+        if has_time_conflict(court, booking_date, start_time, end_time):
             return JsonResponse({
                 'success': False,
                 'error': 'На это время уже есть бронирование'
@@ -1171,7 +1244,7 @@ def api_booking_create(request):
         partners = data.get('partners', [])
         required_rating_levels = data.get('required_rating_levels', [])
 
-        # Создание бронирования (total_price - это property, рассчитывается автоматически)
+        # Создание бронирования (стоимость сохраняется в total_amount при save)
         booking = Booking.objects.create(
             court=court,
             user=user,
@@ -1187,13 +1260,9 @@ def api_booking_create(request):
         )
 
         # Добавляем партнеров (ManyToMany - нужно добавлять после создания объекта)
+        # Одним add, чтобы счётчик участников пересчитался один раз
         if partners:
-            for partner_id in partners:
-                try:
-                    partner = User.objects.get(id=partner_id)
-                    booking.partners.add(partner)
-                except User.DoesNotExist:
-                    pass
+            booking.partners.add(*User.objects.filter(id__in=partners))
 
         return JsonResponse({
             'success': True,
@@ -1209,6 +1278,11 @@ def api_booking_create(request):
                 'total_price': float(booking.total_price),
             }
         })
+    except IntegrityError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Это время уже занято другим бронированием'
+        }, status=400)
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
@@ -1270,17 +1344,21 @@ def api_booking_update(request, booking_id):
         if 'required_rating_levels' in data:
             booking.required_rating_levels = data['required_rating_levels']
 
+        # Проверка на конфликты бронирований (исключая текущее бронирование)
+        if booking.status != 'cancelled' and has_time_conflict(
+            booking.court, booking.date, booking.start_time, booking.end_time,
+            exclude_booking_id=booking.id
+        ):
+            return JsonResponse({
+                'success': False,
+                'error': 'На это время уже есть бронирование'
+            }, status=400)
+
         # Обновление партнеров
         if 'partners' in data:
-            booking.partners.clear()
-            for partner_id in data['partners']:
-                try:
-                    partner = User.objects.get(id=partner_id)
-                    booking.partners.add(partner)
-                except User.DoesNotExist:
-                    pass
-
-        # total_price пересчитывается автоматически как property
+            booking.partners.set(User.objects.filter(id__in=data['partners']))
+
+        # total_amount пересчитывается в save, если изменились корт или время
         booking.save()
 
         return JsonResponse({
@@ -1297,6 +1375,11 @@ def api_booking_update(request, booking_id):
                 'total_price': float(booking.total_price),
             }
         })
+    except IntegrityError:
+        return JsonResponse({
+            'success': False,
+            'error': 'Это время уже занято другим бронированием'
+        }, status=400)
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
@@ -1317,3 +1400,84 @@ def api_booking_delete(request, booking_id):
         })
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+# =============================================================================
+# API ENDPOINTS FOR EXPORT JOBS
+# =============================================================================
+
+def _export_job_data(job):
+    """Данные задачи экспорта для API"""
+    return {
+        'id': job.id,
+        'kind': job.kind,
+        'params': job.params,
+        'status': job.status,
+        'progress': job.progress,
+        'rows_done': job.rows_done,
+        'rows_total': job.rows_total,
+        'error': job.error,
+        'created_at': job.created_at.isoformat(),
+        'started_at': job.started_at.isoformat() if job.started_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        'download_url': (
+            reverse('manager:api_export_download', args=[job.id]) if job.status == 'done' else None
+        ),
+    }
+
+
+@staff_member_required
+@require_POST
+def api_export_create(request):
+    """API: Поставить экспорт в очередь (выполняет команда run_export_jobs)"""
+    try:
+        import json
+
+        try:
+            data = json.loads(request.body)
+        except ValueError:
+            return JsonResponse({'success': False, 'error': 'Неверный формат JSON'}, status=400)
+        if not isinstance(data, dict):
+            return JsonResponse({'success': False, 'error': 'Тело запроса должно быть объектом'}, status=400)
+
+        kind = data.get('kind')
+        params = data.get('params') or {}
+
+        try:
+            exports.validate_params(kind, params)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+        job = ExportJob.objects.create(kind=kind, params=params, created_by=request.user)
+
+        return JsonResponse({
+            'success': True,
+            'message': 'Экспорт поставлен в очередь',
+            'job': _export_job_data(job)
+        })
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@staff_member_required
+def api_export_status(request, job_id):
+    """API: Статус и прогресс задачи экспорта"""
+    try:
+        job = get_object_or_404(ExportJob, id=job_id)
+
+        return JsonResponse({
+            'success': True,
+            'job': _export_job_data(job)
+        })
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+
+@staff_member_required
+def api_export_download(request, job_id):
+    """API: Скачать готовый файл экспорта"""
+    job = get_object_or_404(ExportJob, id=job_id, status='done')
+    if not job.file:
+        raise Http404('Файл экспорта не найден')
+
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=job.file.name.rsplit('/', 1)[-1])
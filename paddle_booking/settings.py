@@ -62,9 +62,39 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # SQLite допускает одного писателя: транзакция сразу берёт блокировку записи
+        # (BEGIN IMMEDIATE), а конкурирующие запросы ждут её до timeout секунд,
+        # вместо ошибки "database is locked"
+        'OPTIONS': {
+            'timeout': 20,
+            'transaction_mode': 'IMMEDIATE',
+        },
+        # Тестовая база в файле: в общей памяти (shared cache) SQLite блокирует
+        # таблицы без ожидания, и параллельные тесты падают с "table is locked"
+        'TEST': {
+            'NAME': BASE_DIR / 'test_db.sqlite3',
+        },
     }
 }
 
+# Кэш (индекс занятости, слоты, удержания, аналитика, лимиты запросов) должен быть
+# общим для всех процессов веб-сервера - задайте REDIS_URL.
+# Без него используется LocMemCache: только для разработки в одном процессе.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
     {'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator'},
@@ -1246,15 +1246,64 @@ document.addEventListener('DOMContentLoaded', function() {
         const totalPrice = courtPrice * duration;
         const endTime = isNewLayout ? selectedTimeSlot.endTime : calculateEndTime(selectedTimeSlot.startTime, duration);
 
-        // Показываем модальное окно подтверждения
-        showBookingConfirmationModal(
-            courtNameDisplay,
-            formattedDate,
-            selectedTimeSlot.startTime,
-            endTime,
-            totalPrice,
-            duration
-        );
+        // Удерживаем слот на время оформления, затем показываем модальное окно подтверждения
+        holdSlot(selectedTimeSlot.startTime, endTime).then(held => {
+            if (!held) return;
+
+            showBookingConfirmationModal(
+                courtNameDisplay,
+                formattedDate,
+                selectedTimeSlot.startTime,
+                endTime,
+                totalPrice,
+                duration
+            );
+        });
+    }
+
+    // Временное удержание слота (другие пользователи видят его занятым)
+    function slotHoldBody(startTime, endTime) {
+        const body = new URLSearchParams();
+        body.append('court_id', selectedCourt);
+        body.append('date', formatDate(selectedDate));
+        body.append('start_time', startTime);
+        body.append('end_time', endTime);
+        return body;
+    }
+
+    function holdSlot(startTime, endTime) {
+        return fetch('/booking/api/slot-hold/', {
+            method: 'POST',
+            headers: {
+                'X-CSRFToken': getCsrfToken(),
+                'X-Requested-With': 'XMLHttpRequest'
+            },
+            body: slotHoldBody(startTime, endTime)
+        })
+            .then(response => response.json())
+            .then(data => {
+                if (!data.success) {
+                    showMessage(data.message || 'Это время недоступно', 'error');
+                    loadTimeSlots(selectedCourt, formatDate(selectedDate));
+                }
+                return data.success;
+            })
+            .catch(error => {
+                // Удержание - оптимизация: при сетевой ошибке оформление продолжается
+                console.error('❌ Ошибка удержания слота:', error);
+                return true;
+            });
+    }
+
+    function releaseSlotHold(startTime, endTime) {
+        fetch('/booking/api/slot-hold/release/', {
+            method: 'POST',
+            headers: {
+                'X-CSRFToken': getCsrfToken(),
+                'X-Requested-With': 'XMLHttpRequest'
+            },
+            body: slotHoldBody(startTime, endTime)
+        }).catch(error => console.error('❌ Ошибка снятия удержания:', error));
     }
 
     // Показать подтверждение бронирования
@@ -1451,6 +1500,7 @@ document.addEventListener('DOMContentLoaded', function() {
             setTimeout(() => {
                 modal.remove();
             }, 300);
+            releaseSlotHold(startTime, endTime);
         };
 
         closeBtn.addEventListener('click', closeModal);
@@ -1514,6 +1564,7 @@ document.addEventListener('DOMContentLoaded', function() {
 
         const closeModal = function() {
             modal.style.display = 'none';
+            releaseSlotHold(startTime, endTime);
         };
 
         closeBtn.onclick = closeModal;
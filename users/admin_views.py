@@ -5,17 +5,15 @@
 
 from django.shortcuts import render
 from django.contrib.admin.views.decorators import staff_member_required
-from django.http import JsonResponse
+from django.http import FileResponse, JsonResponse
 from django.utils import timezone
 from datetime import datetime, timedelta
 import json
+import tempfile
 
-from booking.analytics import (
-    get_financial_stats,
-    get_occupancy_stats,
-    get_clients_stats
-)
+from booking.analytics import get_dashboard_stats
 from users.analytics import get_admin_dashboard_stats
+from users.excel_export import EXCEL_CONTENT_TYPE, build_analytics_workbook, write_detailed_workbook
 
 
 @staff_member_required
@@ -53,9 +51,10 @@ def analytics_dashboard_view(request):
 
     # Собираем все статистики
     try:
-        financial = get_financial_stats(start_date, end_date)
-        occupancy = get_occupancy_stats(start_date, end_date)
-        clients = get_clients_stats(start_date, end_date)
+        stats = get_dashboard_stats(start_date, end_date)
+        financial = stats['financial']
+        occupancy = stats['occupancy']
+        clients = stats['clients']
         basic = get_admin_dashboard_stats()
     except Exception as e:
         # Если ошибка - показываем пустые данные
@@ -103,11 +102,7 @@ def dashboard_stats_api(request):
             start_date = today - timedelta(days=30)
             end_date = today
 
-        stats = {
-            'financial': get_financial_stats(start_date, end_date),
-            'occupancy': get_occupancy_stats(start_date, end_date),
-            'clients': get_clients_stats(start_date, end_date),
-        }
+        stats = get_dashboard_stats(start_date, end_date)
 
         return JsonResponse(stats, safe=False)
 
@@ -178,10 +173,10 @@ def search_users_api(request):
 def export_excel(request):
     """
     Экспорт данных в Excel
+
+    detailed=1 - подробный отчёт с листами бронирований, выручки по кортам и клиентов
     """
     try:
-        import openpyxl
-        from openpyxl.styles import Font, Alignment, PatternFill
         from django.http import HttpResponse
         from io import BytesIO
 
@@ -197,105 +192,16 @@ def export_excel(request):
             start_date = today - timedelta(days=30)
             end_date = today
 
-        # Получаем данные
-        financial = get_financial_stats(start_date, end_date)
-        occupancy = get_occupancy_stats(start_date, end_date)
-        clients = get_clients_stats(start_date, end_date)
-
-        # Создаем workbook
-        wb = openpyxl.Workbook()
-        ws = wb.active
-        ws.title = "Аналитика"
-
-        # Заголовок
-        ws['A1'] = 'Paddle Booking - Отчет по аналитике'
-        ws['A1'].font = Font(size=16, bold=True)
-        ws.merge_cells('A1:D1')
-
-        ws['A2'] = f"Период: {start_date.strftime('%d.%m.%Y')} - {end_date.strftime('%d.%m.%Y')}"
-        ws.merge_cells('A2:D2')
-
-        # Финансы
-        row = 4
-        ws[f'A{row}'] = 'ФИНАНСОВЫЕ ПОКАЗАТЕЛИ'
-        ws[f'A{row}'].font = Font(size=14, bold=True)
-        ws[f'A{row}'].fill = PatternFill(start_color='9ef01a', end_color='9ef01a', fill_type='solid')
-        row += 1
-
-        ws[f'A{row}'] = 'Общий доход:'
-        ws[f'B{row}'] = f"{financial['total_revenue']} ₽"
-        row += 1
-
-        ws[f'A{row}'] = 'Оплачено:'
-        ws[f'B{row}'] = f"{financial['paid_amount']} ₽"
-        row += 1
-
-        ws[f'A{row}'] = 'Не оплачено:'
-        ws[f'B{row}'] = f"{financial['unpaid_amount']} ₽"
-        row += 1
-
-        ws[f'A{row}'] = 'Прогноз на месяц:'
-        ws[f'B{row}'] = f"{financial['forecast_next_month']} ₽"
-        row += 2
-
-        # Загруженность
-        ws[f'A{row}'] = 'ЗАГРУЖЕННОСТЬ'
-        ws[f'A{row}'].font = Font(size=14, bold=True)
-        ws[f'A{row}'].fill = PatternFill(start_color='9ef01a', end_color='9ef01a', fill_type='solid')
-        row += 1
-
-        ws[f'A{row}'] = 'Общая загруженность:'
-        ws[f'B{row}'] = f"{occupancy['overall_occupancy_rate']}%"
-        row += 1
-
-        ws[f'A{row}'] = 'Всего бронирований:'
-        ws[f'B{row}'] = occupancy['total_bookings']
-        row += 1
-
-        ws[f'A{row}'] = 'Забронировано часов:'
-        ws[f'B{row}'] = occupancy['total_booked_hours']
-        row += 2
-
-        # Клиенты
-        ws[f'A{row}'] = 'КЛИЕНТЫ'
-        ws[f'A{row}'].font = Font(size=14, bold=True)
-        ws[f'A{row}'].fill = PatternFill(start_color='9ef01a', end_color='9ef01a', fill_type='solid')
-        row += 1
-
-        ws[f'A{row}'] = 'Новых пользователей:'
-        ws[f'B{row}'] = clients['new_users']
-        row += 1
-
-        ws[f'A{row}'] = 'Активных пользователей:'
-        ws[f'B{row}'] = clients['active_users']
-        row += 1
-
-        ws[f'A{row}'] = 'Средний LTV:'
-        ws[f'B{row}'] = f"{clients['avg_ltv']} ₽"
-        row += 1
-
-        ws[f'A{row}'] = 'Retention rate:'
-        ws[f'B{row}'] = f"{clients['retention_rate']}%"
-        row += 2
-
-        # Топ клиенты
-        ws[f'A{row}'] = 'ТОП КЛИЕНТЫ'
-        ws[f'A{row}'].font = Font(size=12, bold=True)
-        row += 1
-
-        ws[f'A{row}'] = 'Имя'
-        ws[f'B{row}'] = 'Бронирований'
-        ws[f'C{row}'] = 'Потрачено'
-        ws[f'A{row}'].font = Font(bold=True)
-        ws[f'B{row}'].font = Font(bold=True)
-        ws[f'C{row}'].font = Font(bold=True)
-        row += 1
-
-        for client in clients['top_clients'][:10]:
-            ws[f'A{row}'] = client['name']
-            ws[f'B{row}'] = client['bookings_count']
-            ws[f'C{row}'] = f"{client['total_spent']} ₽"
-            row += 1
+        filename = f'paddle_analytics_{timezone.now().date()}.xlsx'
+
+        if request.GET.get('detailed') == '1':
+            # Подробный отчёт: write-only книга во временном файле, отдаётся потоком
+            output = tempfile.TemporaryFile()
+            write_detailed_workbook(start_date, end_date, output)
+            output.seek(0)
+            return FileResponse(output, as_attachment=True, filename=filename, content_type=EXCEL_CONTENT_TYPE)
+
+        wb = build_analytics_workbook(start_date, end_date)
 
         # Отдаем файл
         output = BytesIO()
@@ -304,9 +210,8 @@ def export_excel(request):
 
         response = HttpResponse(
             output.read(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+            content_type=EXCEL_CONTENT_TYPE
         )
-        filename = f'paddle_analytics_{timezone.now().date()}.xlsx'
         response['Content-Disposition'] = f'attachment; filename={filename}'
 
         return response
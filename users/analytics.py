@@ -3,13 +3,14 @@
 Статистика игр, активности, предпочтений
 """
 
-from django.db.models import Count, Sum, Q, Avg, F, Case, When, Value, IntegerField
-from django.db.models.functions import TruncMonth, TruncWeek, TruncDate, ExtractWeekDay
+from django.db.models import Count, Sum, Q, Avg, F, Case, When, Value, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce, TruncMonth, TruncWeek, TruncDate, ExtractWeekDay
 from django.utils import timezone
 from datetime import datetime, timedelta
 from collections import defaultdict
 from booking.models import Booking, Court
 from .models import PlayerRating
+from .player_stats import get_played_snapshot
 from django.contrib.auth.models import User
 
 
@@ -24,89 +25,55 @@ def get_player_stats(user):
     - Прогресс рейтинга
     """
     today = timezone.now().date()
-
-    # Все завершенные игры пользователя (как создатель или партнер)
-    completed_bookings = Booking.objects.filter(
-        Q(user=user) | Q(partners=user),
-        status='confirmed',
-        date__lte=today
-    ).select_related('court').prefetch_related('partners')
+    snapshot = get_played_snapshot(user, today)
 
     # Будущие игры
     upcoming_bookings = Booking.objects.filter(
         Q(user=user) | Q(partners=user),
         status__in=['pending', 'confirmed'],
         date__gte=today
-    ).select_related('court').prefetch_related('partners')
-
-    # Общая статистика
-    total_games = completed_bookings.count()
-    total_hours = sum(_calculate_duration(b) for b in completed_bookings)
-
-    # Расчет затрат
-    total_spent = 0
-    for booking in completed_bookings:
-        if booking.user == user:
-            # Если создатель - платит за корт
-            total_spent += float(booking.total_price)
-        else:
-            # Если партнер - платит свою долю
-            total_spent += float(booking.price_per_person)
+    ).distinct()
+
+    # Общая статистика - из снимка PlayerStatsSnapshot (только сыгранные игры, как и раньше)
+    total_games = snapshot.total_games
+    total_hours = snapshot.total_minutes / 60
+    total_spent = float(snapshot.total_spent)
 
     # Любимый корт
-    favorite_court = completed_bookings.values(
-        'court__id', 'court__name'
-    ).annotate(
-        games_count=Count('id')
-    ).order_by('-games_count').first()
+    favorite_court = None
+    if snapshot.court_counts:
+        court_id, games_count = max(snapshot.court_counts.items(), key=lambda x: x[1])
+        court_name = Court.objects.filter(id=court_id).values_list('name', flat=True).first()
+        if court_name is not None:
+            favorite_court = {
+                'court__id': int(court_id),
+                'court__name': court_name,
+                'games_count': games_count
+            }
 
     # Любимые партнеры (топ-5)
+    sorted_partners = sorted(snapshot.partner_counts.items(), key=lambda x: x[1], reverse=True)[:5]
+    partners = User.objects.in_bulk([int(partner_id) for partner_id, _ in sorted_partners])
     favorite_partners = []
-    partner_stats = defaultdict(int)
-
-    for booking in completed_bookings:
-        if booking.user == user:
-            # Считаем партнеров из бронирований где мы создатель
-            for partner in booking.partners.all():
-                partner_stats[partner.id] += 1
-        elif user in booking.partners.all():
-            # Считаем создателя если мы партнер
-            partner_stats[booking.user.id] += 1
-            # И других партнеров
-            for partner in booking.partners.all():
-                if partner != user:
-                    partner_stats[partner.id] += 1
-
-    # Топ-5 партнеров
-    sorted_partners = sorted(partner_stats.items(), key=lambda x: x[1], reverse=True)[:5]
     for partner_id, games_count in sorted_partners:
-        try:
-            partner = User.objects.get(id=partner_id)
-            favorite_partners.append({
-                'user': partner,
-                'games_count': games_count,
-                'full_name': f"{partner.first_name} {partner.last_name}".strip() or partner.username
-            })
-        except User.DoesNotExist:
+        partner = partners.get(int(partner_id))
+        if partner is None:
             continue
+        favorite_partners.append({
+            'user_id': partner.id,
+            'games_count': games_count,
+            'full_name': f"{partner.first_name} {partner.last_name}".strip() or partner.username
+        })
 
     # Активность по месяцам (последние 12 месяцев)
-    twelve_months_ago = today - timedelta(days=365)
-    monthly_activity = completed_bookings.filter(
-        date__gte=twelve_months_ago
-    ).annotate(
-        month=TruncMonth('date')
-    ).values('month').annotate(
-        games=Count('id')
-    ).order_by('month')
+    first_month = (today - timedelta(days=365)).strftime('%Y-%m')
+    monthly_activity = [
+        {'month': datetime.strptime(month, '%Y-%m').date(), 'games': games}
+        for month, games in sorted(snapshot.monthly_games.items())
+        if month >= first_month
+    ]
 
     # Активность по дням недели
-    weekday_activity = completed_bookings.annotate(
-        weekday=ExtractWeekDay('date')
-    ).values('weekday').annotate(
-        games=Count('id')
-    ).order_by('weekday')
-
     weekday_names = {
         1: 'Воскресенье',
         2: 'Понедельник',
@@ -119,10 +86,10 @@ def get_player_stats(user):
 
     weekday_stats = [
         {
-            'day': weekday_names.get(item['weekday'], 'Неизвестно'),
-            'games': item['games']
+            'day': weekday_names.get(int(weekday), 'Неизвестно'),
+            'games': games
         }
-        for item in weekday_activity
+        for weekday, games in sorted(snapshot.weekday_games.items(), key=lambda x: int(x[0]))
     ]
 
     # Прогресс рейтинга (если есть история)
@@ -147,7 +114,11 @@ def get_player_stats(user):
 
     # Частота игр (среднее за последние 4 недели)
     four_weeks_ago = today - timedelta(weeks=4)
-    recent_games = completed_bookings.filter(date__gte=four_weeks_ago).count()
+    recent_games = Booking.objects.filter(
+        Q(user=user) | Q(partners=user),
+        status='confirmed',
+        date__range=[four_weeks_ago, today]
+    ).distinct().count()
     games_per_week = round(recent_games / 4, 1)
 
     # Достижения (простая система бейджей)
@@ -178,6 +149,40 @@ def get_player_stats(user):
     }
 
 
+def get_frequent_partners(user, limit=5, statuses=('confirmed',)):
+    """
+    Частые партнёры игрока (граф совместных игр)
+
+    Считается одним запросом: для каждого соигрока - число бронирований игрока,
+    где он был партнёром, плюс число его бронирований, где игрок был партнёром.
+
+    Returns:
+        QuerySet пользователей с аннотацией games_count (по убыванию)
+    """
+    partner_links = Booking.partners.through.objects
+
+    # Бронирования, в которых участвовал игрок (создатель или партнёр)
+    played = Booking.objects.filter(
+        Q(user=user) | Q(id__in=partner_links.filter(user=user).values('booking_id')),
+        status__in=statuses
+    )
+
+    as_partner = partner_links.filter(
+        booking__in=played, user_id=OuterRef('pk')
+    ).values('user_id').annotate(total=Count('id')).values('total')
+
+    as_creator = played.filter(
+        user_id=OuterRef('pk')
+    ).values('user_id').annotate(total=Count('id')).values('total')
+
+    return User.objects.filter(
+        Q(id__in=partner_links.filter(booking__in=played).values('user_id')) |
+        Q(id__in=played.values('user_id'))
+    ).exclude(pk=user.pk).annotate(
+        games_count=Coalesce(Subquery(as_partner), Value(0)) + Coalesce(Subquery(as_creator), Value(0))
+    ).order_by('-games_count', 'id')[:limit]
+
+
 def get_calendar_events(user, start_date, end_date):
     """
     Получить события для календаря в формате FullCalendar
@@ -205,7 +210,7 @@ def get_calendar_events(user, start_date, end_date):
         Q(user=user) | Q(partners=user),
         date__gte=start_date,
         date__lte=end_date
-    ).select_related('court', 'user', 'user__profile').prefetch_related('partners')
+    ).select_related('court', 'user', 'user__profile')
 
     # Брони "Найди партнёра" с подходящим уровнем (не свои)
     partner_bookings = Booking.objects.filter(
@@ -215,7 +220,7 @@ def get_calendar_events(user, start_date, end_date):
         date__lte=end_date
     ).exclude(
         Q(user=user) | Q(partners=user)
-    ).select_related('court', 'user', 'user__profile').prefetch_related('partners')
+    ).select_related('court', 'user', 'user__profile')
 
     # Фильтруем брони "Найди партнёра" по уровню игры
     filtered_partner_bookings = []
@@ -245,8 +250,8 @@ def get_calendar_events(user, start_date, end_date):
             color = '#6b7280'  # Серый - отменено
 
         title = f"🎾 {booking.court.name}"
-        if booking.partners.exists():
-            title += f" ({booking.partners.count() + 1} игроков)"
+        if booking.participants_count > 1:
+            title += f" ({booking.participants_count} игроков)"
 
         creator_name = f"{booking.user.first_name} {booking.user.last_name}".strip() or booking.user.username
 
@@ -273,7 +278,7 @@ def get_calendar_events(user, start_date, end_date):
                 'price': float(booking.total_price),
                 'isMine': is_my_booking,
                 'canJoin': False,  # Свои брони - не можем присоединиться
-                'partnersCount': booking.partners.count(),
+                'partnersCount': booking.participants_count - 1,
                 'maxPlayers': booking.max_players,
                 'lookingForPartner': booking.looking_for_partner,
             }
@@ -317,7 +322,7 @@ def get_calendar_events(user, start_date, end_date):
                 'price': float(booking.price_per_person),
                 'isMine': is_my_booking,
                 'canJoin': True,  # Доступно для присоединения
-                'partnersCount': booking.partners.count(),
+                'partnersCount': booking.participants_count - 1,
                 'maxPlayers': booking.max_players,
                 'lookingForPartner': booking.looking_for_partner,
                 'requiredRatings': booking.required_rating_levels or [],
@@ -329,65 +334,40 @@ def get_calendar_events(user, start_date, end_date):
     return events
 
 
-def get_available_slots(court_id, date):
+def get_available_slots(court_id, date, user_id=None):
     """
     Получить доступные слоты для бронирования на конкретный день
 
     Args:
         court_id: ID корта
         date: Дата (date object)
+        user_id: ID пользователя, чьи удержания слотов не считаются занятостью
 
     Returns:
         List доступных временных слотов
     """
+    from booking import occupancy, slot_cache, slot_holds
+
     try:
         court = Court.objects.get(id=court_id)
     except Court.DoesNotExist:
         return []
 
-    # Рабочие часы (можно вынести в настройки)
-    WORKING_HOURS_START = 8
-    WORKING_HOURS_END = 22
     SLOT_DURATION = 1  # часы
 
-    # Получаем занятые слоты
-    existing_bookings = Booking.objects.filter(
-        court=court,
-        date=date,
-        status__in=['pending', 'confirmed']
-    ).values('start_time', 'end_time')
-
-    occupied_slots = []
-    for booking in existing_bookings:
-        start = booking['start_time'].hour + booking['start_time'].minute / 60
-        end = booking['end_time'].hour + booking['end_time'].minute / 60
-        occupied_slots.append((start, end))
-
-    # Генерируем свободные слоты
-    available_slots = []
-    current_hour = WORKING_HOURS_START
-
-    while current_hour < WORKING_HOURS_END:
-        slot_start = current_hour
-        slot_end = current_hour + SLOT_DURATION
-
-        # Проверяем, не занят ли слот
-        is_occupied = False
-        for occupied_start, occupied_end in occupied_slots:
-            if not (slot_end <= occupied_start or slot_start >= occupied_end):
-                is_occupied = True
-                break
-
-        if not is_occupied:
-            available_slots.append({
-                'start': f"{int(slot_start):02d}:00",
-                'end': f"{int(slot_end):02d}:00",
-                'price': float(court.price_per_hour) * SLOT_DURATION
-            })
+    # Свободные часы берём из кэша слотов (общий с booking.views.get_available_slots)
+    day_slots = slot_cache.get_day_slots(court, date)
+    held = slot_holds.get_held_bitmap(court.id, date, exclude_user_id=user_id)
 
-        current_hour += SLOT_DURATION
-
-    return available_slots
+    return [
+        {
+            'start': f"{hour:02d}:00",
+            'end': f"{hour + SLOT_DURATION:02d}:00",
+            'price': day_slots['price_per_hour'] * SLOT_DURATION
+        }
+        for hour in day_slots['free_hours']
+        if occupancy.is_free(held, occupancy.hour_mask(hour, SLOT_DURATION))
+    ]
 
 
 def get_admin_dashboard_stats():
@@ -400,19 +380,19 @@ def get_admin_dashboard_stats():
     today_bookings = Booking.objects.filter(date=today)
 
     # Выручка за сегодня
-    today_revenue = today_bookings.filter(
-        status='confirmed'
-    ).aggregate(
-        total=Sum('court__price_per_hour')
+    today_revenue = today_bookings.confirmed().with_price().aggregate(
+        total=Sum('price')
     )['total'] or 0
 
-    # Загруженность кортов (%)
+    # Загруженность кортов (%) - занятые часы от возможных
     total_hours = (22 - 8)  # Рабочие часы
     courts_count = Court.objects.filter(is_available=True).count()
-    total_possible_bookings = total_hours * courts_count
+    total_possible_hours = total_hours * courts_count
 
-    actual_bookings = today_bookings.filter(status__in=['pending', 'confirmed']).count()
-    occupancy_rate = round((actual_bookings / total_possible_bookings * 100) if total_possible_bookings > 0 else 0, 1)
+    booked_hours = today_bookings.active().with_duration().aggregate(
+        total=Sum('duration_hours')
+    )['total'] or 0
+    occupancy_rate = round((booked_hours / total_possible_hours * 100) if total_possible_hours > 0 else 0, 1)
 
     # Популярные времена
     popular_times = Booking.objects.filter(
@@ -426,12 +406,11 @@ def get_admin_dashboard_stats():
 
     # Выручка по кортам (за месяц)
     revenue_by_court = Booking.objects.filter(
-        date__gte=today - timedelta(days=30),
-        status='confirmed'
-    ).values(
+        date__gte=today - timedelta(days=30)
+    ).confirmed().with_price().values(
         'court__name'
     ).annotate(
-        revenue=Sum('court__price_per_hour'),
+        revenue=Sum('price'),
         bookings=Count('id')
     ).order_by('-revenue')
 
@@ -452,18 +431,6 @@ def get_admin_dashboard_stats():
 
 # ========== ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ==========
 
-def _calculate_duration(booking):
-    """Рассчитать продолжительность бронирования в часах"""
-    start_dt = datetime.combine(booking.date, booking.start_time)
-    end_dt = datetime.combine(booking.date, booking.end_time)
-
-    if end_dt <= start_dt:
-        end_dt += timedelta(days=1)
-
-    duration_seconds = (end_dt - start_dt).total_seconds()
-    return duration_seconds / 3600
-
-
 def _calculate_achievements(total_games, total_hours, partners_count, games_per_week):
     """
     Рассчитать достижения (бейджи) игрока
@@ -0,0 +1,308 @@
+"""
+Отчёт по аналитике в формате Excel (openpyxl)
+Используется views экспорта и фоновыми задачами экспорта.
+Подробный отчёт пишется в режиме write-only: строки листов читаются
+из базы итераторами и не накапливаются в памяти
+"""
+from django.db.models import Count, Max, Sum
+
+from booking.analytics import get_dashboard_stats
+from booking.models import Booking, DailyCourtTotals
+
+EXCEL_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+EXCEL_CHUNK_SIZE = 2000
+
+SECTION_COLOR = '9ef01a'
+
+
+def build_analytics_workbook(start_date, end_date):
+    """
+    Книга Excel с финансами, загруженностью и клиентами за период
+
+    ImportError - openpyxl не установлен.
+    """
+    import openpyxl
+    from openpyxl.styles import Font, PatternFill
+
+    # Получаем данные
+    stats = get_dashboard_stats(start_date, end_date)
+    financial = stats['financial']
+    occupancy = stats['occupancy']
+    clients = stats['clients']
+
+    # Создаем workbook
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "Аналитика"
+
+    # Заголовок
+    ws['A1'] = 'Paddle Booking - Отчет по аналитике'
+    ws['A1'].font = Font(size=16, bold=True)
+    ws.merge_cells('A1:D1')
+
+    ws['A2'] = f"Период: {start_date.strftime('%d.%m.%Y')} - {end_date.strftime('%d.%m.%Y')}"
+    ws.merge_cells('A2:D2')
+
+    # Финансы
+    row = 4
+    ws[f'A{row}'] = 'ФИНАНСОВЫЕ ПОКАЗАТЕЛИ'
+    ws[f'A{row}'].font = Font(size=14, bold=True)
+    ws[f'A{row}'].fill = PatternFill(start_color='9ef01a', end_color='9ef01a', fill_type='solid')
+    row += 1
+
+    ws[f'A{row}'] = 'Общий доход:'
+    ws[f'B{row}'] = f"{financial['total_revenue']} ₽"
+    row += 1
+
+    ws[f'A{row}'] = 'Оплачено:'
+    ws[f'B{row}'] = f"{financial['paid_amount']} ₽"
+    row += 1
+
+    ws[f'A{row}'] = 'Не оплачено:'
+    ws[f'B{row}'] = f"{financial['unpaid_amount']} ₽"
+    row += 1
+
+    ws[f'A{row}'] = 'Прогноз на месяц:'
+    ws[f'B{row}'] = f"{financial['forecast_next_month']} ₽"
+    row += 2
+
+    # Загруженность
+    ws[f'A{row}'] = 'ЗАГРУЖЕННОСТЬ'
+    ws[f'A{row}'].font = Font(size=14, bold=True)
+    ws[f'A{row}'].fill = PatternFill(start_color='9ef01a', end_color='9ef01a', fill_type='solid')
+    row += 1
+
+    ws[f'A{row}'] = 'Общая загруженность:'
+    ws[f'B{row}'] = f"{occupancy['overall_occupancy_rate']}%"
+    row += 1
+
+    ws[f'A{row}'] = 'Всего бронирований:'
+    ws[f'B{row}'] = occupancy['total_bookings']
+    row += 1
+
+    ws[f'A{row}'] = 'Забронировано часов:'
+    ws[f'B{row}'] = occupancy['total_booked_hours']
+    row += 2
+
+    # Клиенты
+    ws[f'A{row}'] = 'КЛИЕНТЫ'
+    ws[f'A{row}'].font = Font(size=14, bold=True)
+    ws[f'A{row}'].fill = PatternFill(start_color='9ef01a', end_color='9ef01a', fill_type='solid')
+    row += 1
+
+    ws[f'A{row}'] = 'Новых пользователей:'
+    ws[f'B{row}'] = clients['new_users']
+    row += 1
+
+    ws[f'A{row}'] = 'Активных пользователей:'
+    ws[f'B{row}'] = clients['active_users']
+    row += 1
+
+    ws[f'A{row}'] = 'Средний LTV:'
+    ws[f'B{row}'] = f"{clients['avg_ltv']} ₽"
+    row += 1
+
+    ws[f'A{row}'] = 'Retention rate:'
+    ws[f'B{row}'] = f"{clients['retention_rate']}%"
+    row += 2
+
+    # Топ клиенты
+    ws[f'A{row}'] = 'ТОП КЛИЕНТЫ'
+    ws[f'A{row}'].font = Font(size=12, bold=True)
+    row += 1
+
+    ws[f'A{row}'] = 'Имя'
+    ws[f'B{row}'] = 'Бронирований'
+    ws[f'C{row}'] = 'Потрачено'
+    ws[f'A{row}'].font = Font(bold=True)
+    ws[f'B{row}'].font = Font(bold=True)
+    ws[f'C{row}'].font = Font(bold=True)
+    row += 1
+
+    for client in clients['top_clients'][:10]:
+        ws[f'A{row}'] = client['name']
+        ws[f'B{row}'] = client['bookings_count']
+        ws[f'C{row}'] = f"{client['total_spent']} ₽"
+        row += 1
+
+    return wb
+
+
+def _booking_rows(start_date, end_date):
+    """Лист «Бронирования»: по строке на бронирование"""
+    rows = Booking.objects.filter(date__range=[start_date, end_date]).order_by(
+        'date', 'start_time', 'id'
+    ).values_list(
+        'id', 'date', 'start_time', 'end_time', 'court__name', 'booking_type',
+        'user__first_name', 'user__last_name', 'user__username', 'user__email',
+        'coach__first_name', 'coach__last_name',
+        'participants_count', 'duration_minutes', 'status', 'total_amount'
+    ).iterator(chunk_size=EXCEL_CHUNK_SIZE)
+
+    for (booking_id, booking_date, start_time, end_time, court_name, booking_type,
+         first_name, last_name, username, email, coach_first_name, coach_last_name,
+         participants_count, duration_minutes, status, total_amount) in rows:
+        yield [
+            booking_id,
+            booking_date,
+            start_time.strftime('%H:%M'),
+            end_time.strftime('%H:%M'),
+            court_name,
+            booking_type,
+            f"{first_name} {last_name}".strip() or username,
+            email,
+            f"{coach_first_name} {coach_last_name}" if coach_first_name is not None else '',
+            participants_count,
+            duration_minutes,
+            status,
+            float(total_amount)
+        ]
+
+
+def _court_daily_rows(start_date, end_date):
+    """Лист «Выручка по кортам»: итоги дня корта из DailyCourtTotals"""
+    rows = DailyCourtTotals.objects.filter(date__range=[start_date, end_date]).order_by(
+        'date', 'court__name'
+    ).values_list(
+        'date', 'court__name', 'bookings_count', 'confirmed_count', 'booked_minutes', 'revenue'
+    ).iterator(chunk_size=EXCEL_CHUNK_SIZE)
+
+    for day, court_name, bookings_count, confirmed_count, booked_minutes, revenue in rows:
+        yield [day, court_name, bookings_count, confirmed_count, round(booked_minutes / 60, 2), float(revenue)]
+
+
+def _client_rows(start_date, end_date):
+    """Лист «Клиенты»: создатели подтверждённых бронирований за период"""
+    rows = Booking.objects.filter(
+        date__range=[start_date, end_date],
+        status='confirmed'
+    ).values(
+        'user_id', 'user__username', 'user__first_name', 'user__last_name', 'user__email'
+    ).annotate(
+        bookings=Count('id'),
+        minutes=Sum('duration_minutes'),
+        spent=Sum('total_amount'),
+        last_date=Max('date')
+    ).order_by('-spent', 'user_id').iterator(chunk_size=EXCEL_CHUNK_SIZE)
+
+    for row in rows:
+        yield [
+            row['user_id'],
+            row['user__username'],
+            f"{row['user__first_name']} {row['user__last_name']}".strip(),
+            row['user__email'],
+            row['bookings'],
+            round(row['minutes'] / 60, 2),
+            float(row['spent']),
+            row['last_date']
+        ]
+
+
+def _append_sheet(wb, title, header, rows, widths, progress=None):
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill
+    from openpyxl.utils import get_column_letter
+
+    ws = wb.create_sheet(title)
+    # В режиме write-only ширину колонок и закрепление задаём до первой строки
+    for index, width in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(index)].width = width
+    ws.freeze_panes = 'A2'
+
+    header_cells = []
+    for name in header:
+        cell = WriteOnlyCell(ws, value=name)
+        cell.font = Font(bold=True)
+        cell.fill = PatternFill(start_color=SECTION_COLOR, end_color=SECTION_COLOR, fill_type='solid')
+        header_cells.append(cell)
+    ws.append(header_cells)
+
+    done = 0
+    for row in rows:
+        ws.append(row)
+        done += 1
+        if progress and done % EXCEL_CHUNK_SIZE == 0:
+            progress(done)
+
+    return done
+
+
+def write_detailed_workbook(start_date, end_date, output, progress=None):
+    """
+    Подробный отчёт в режиме write-only: сводка, бронирования,
+    выручка по кортам по дням и клиенты
+
+    Args:
+        output: Путь или файловый объект для сохранения
+        progress: Необязательный callback(done, total) по строкам листа бронирований
+
+    ImportError - openpyxl не установлен.
+    """
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font
+
+    stats = get_dashboard_stats(start_date, end_date)
+    financial = stats['financial']
+    occupancy = stats['occupancy']
+    clients = stats['clients']
+
+    wb = openpyxl.Workbook(write_only=True)
+
+    ws = wb.create_sheet('Сводка')
+    ws.column_dimensions['A'].width = 28
+    ws.column_dimensions['B'].width = 18
+
+    def section(title, size=14):
+        cell = WriteOnlyCell(ws, value=title)
+        cell.font = Font(size=size, bold=True)
+        ws.append([cell])
+
+    section('Paddle Booking - Отчет по аналитике', size=16)
+    ws.append([f"Период: {start_date.strftime('%d.%m.%Y')} - {end_date.strftime('%d.%m.%Y')}"])
+    ws.append([])
+
+    section('ФИНАНСОВЫЕ ПОКАЗАТЕЛИ')
+    ws.append(['Общий доход, ₽', financial['total_revenue']])
+    ws.append(['Оплачено, ₽', financial['paid_amount']])
+    ws.append(['Не оплачено, ₽', financial['unpaid_amount']])
+    ws.append(['Прогноз на месяц, ₽', financial['forecast_next_month']])
+    ws.append([])
+
+    section('ЗАГРУЖЕННОСТЬ')
+    ws.append(['Общая загруженность, %', occupancy['overall_occupancy_rate']])
+    ws.append(['Всего бронирований', occupancy['total_bookings']])
+    ws.append(['Забронировано часов', occupancy['total_booked_hours']])
+    ws.append([])
+
+    section('КЛИЕНТЫ')
+    ws.append(['Новых пользователей', clients['new_users']])
+    ws.append(['Активных пользователей', clients['active_users']])
+    ws.append(['Средний LTV, ₽', clients['avg_ltv']])
+    ws.append(['Retention rate, %', clients['retention_rate']])
+
+    total = Booking.objects.filter(date__range=[start_date, end_date]).count()
+    _append_sheet(
+        wb, 'Бронирования',
+        ['ID', 'Дата', 'Начало', 'Окончание', 'Корт', 'Тип', 'Клиент', 'Email', 'Тренер',
+         'Участников', 'Минут', 'Статус', 'Сумма, ₽'],
+        _booking_rows(start_date, end_date),
+        [8, 12, 8, 10, 16, 10, 24, 28, 24, 11, 8, 12, 12],
+        progress=(lambda done: progress(done, total)) if progress else None
+    )
+    _append_sheet(
+        wb, 'Выручка по кортам',
+        ['Дата', 'Корт', 'Бронирований', 'Подтверждённых', 'Часов', 'Выручка, ₽'],
+        _court_daily_rows(start_date, end_date),
+        [12, 16, 14, 16, 8, 12]
+    )
+    _append_sheet(
+        wb, 'Клиенты',
+        ['ID', 'Username', 'Имя', 'Email', 'Бронирований', 'Часов', 'Потрачено, ₽', 'Последнее бронирование'],
+        _client_rows(start_date, end_date),
+        [8, 18, 24, 28, 14, 8, 14, 22]
+    )
+
+    wb.save(output)
+    if progress:
+        progress(total, total)
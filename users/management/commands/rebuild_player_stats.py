@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.contrib.auth.models import User
+
+from users import player_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает снимки статистики игроков (PlayerStatsSnapshot) по подтверждённым бронированиям'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user',
+            type=int,
+            action='append',
+            dest='users',
+            help='ID пользователя (можно указать несколько раз, по умолчанию - все)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Размер пачки бронирований при полном пересчёте'
+        )
+
+    def handle(self, *args, **options):
+        if options['users']:
+            users = User.objects.filter(id__in=options['users'])
+            if len(users) != len(set(options['users'])):
+                raise CommandError('Часть пользователей не найдена')
+
+            for user in users:
+                snapshot = player_stats.rebuild_snapshot(user)
+                self.stdout.write(f'{user.username}: {snapshot.total_games} игр')
+
+            self.stdout.write(self.style.SUCCESS(f'Пересчитано снимков: {len(users)}'))
+            return
+
+        created = player_stats.rebuild_all(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Снимки статистики пересчитаны: {created} игроков'))
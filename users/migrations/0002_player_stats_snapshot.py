@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-17 06:31
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerStatsSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_games', models.PositiveIntegerField(default=0, verbose_name='Всего игр')),
+                ('total_minutes', models.PositiveIntegerField(default=0, verbose_name='Всего минут')),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Потрачено')),
+                ('court_counts', models.JSONField(default=dict, help_text='{court_id: количество игр}', verbose_name='Игры по кортам')),
+                ('partner_counts', models.JSONField(default=dict, help_text='{user_id: количество совместных игр}', verbose_name='Игры с партнёрами')),
+                ('monthly_games', models.JSONField(default=dict, help_text='{"YYYY-MM": количество игр}', verbose_name='Игры по месяцам')),
+                ('weekday_games', models.JSONField(default=dict, help_text='{день недели 1-7 (1 - воскресенье): количество игр}', verbose_name='Игры по дням недели')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='stats_snapshot', to=settings.AUTH_USER_MODEL, verbose_name='Игрок')),
+            ],
+            options={
+                'verbose_name': 'Статистика игрока',
+                'verbose_name_plural': 'Статистика игроков',
+            },
+        ),
+    ]
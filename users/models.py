@@ -805,4 +805,64 @@ class PlayerCoachRelationship(models.Model):
     def __str__(self):
         player_name = f"{self.player.first_name} {self.player.last_name}".strip() or self.player.username
         coach_name = f"{self.coach.first_name} {self.coach.last_name}".strip() or self.coach.username
-        return f"{player_name} - {coach_name}"
\ No newline at end of file
+        return f"{player_name} - {coach_name}"
+
+class PlayerStatsSnapshot(models.Model):
+    """
+    Накопленная статистика игрока по подтверждённым бронированиям
+
+    Обновляется инкрементально (users.player_stats) при подтверждении,
+    отмене, удалении бронирования и смене партнёров.
+    """
+
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='stats_snapshot',
+        verbose_name='Игрок'
+    )
+    total_games = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Всего игр'
+    )
+    total_minutes = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Всего минут'
+    )
+    total_spent = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        default=0,
+        verbose_name='Потрачено'
+    )
+    court_counts = models.JSONField(
+        default=dict,
+        verbose_name='Игры по кортам',
+        help_text='{court_id: количество игр}'
+    )
+    partner_counts = models.JSONField(
+        default=dict,
+        verbose_name='Игры с партнёрами',
+        help_text='{user_id: количество совместных игр}'
+    )
+    monthly_games = models.JSONField(
+        default=dict,
+        verbose_name='Игры по месяцам',
+        help_text='{"YYYY-MM": количество игр}'
+    )
+    weekday_games = models.JSONField(
+        default=dict,
+        verbose_name='Игры по дням недели',
+        help_text='{день недели 1-7 (1 - воскресенье): количество игр}'
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Обновлено'
+    )
+
+    class Meta:
+        verbose_name = 'Статистика игрока'
+        verbose_name_plural = 'Статистика игроков'
+
+    def __str__(self):
+        return f"{self.user.username}: {self.total_games} игр"
@@ -0,0 +1,213 @@
+"""
+Снимок статистики игрока (PlayerStatsSnapshot)
+Вклад подтверждённого бронирования добавляется или вычитается из снимков
+всех его участников; полный пересчёт - rebuild_snapshot / rebuild_all
+"""
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from collections import defaultdict
+from decimal import Decimal
+import copy
+import logging
+
+from booking.models import Booking
+from .models import PlayerStatsSnapshot
+
+logger = logging.getLogger(__name__)
+
+STAT_FIELDS = (
+    'total_games', 'total_minutes', 'total_spent',
+    'court_counts', 'partner_counts', 'monthly_games', 'weekday_games',
+)
+
+
+def make_state(user_id, court_id, day, minutes, amount, partner_ids=()):
+    """Поля бронирования, от которых зависит статистика участников"""
+    return {
+        'user_id': user_id,
+        'partner_ids': list(partner_ids),
+        'court_id': court_id,
+        'date': day,
+        'minutes': minutes or 0,
+        'amount': amount or Decimal('0'),
+    }
+
+
+def booking_states(booking_ids):
+    """Состояния подтверждённых бронирований из базы (неподтверждённые пропускаются)"""
+    rows = Booking.objects.filter(pk__in=booking_ids, status='confirmed').values_list(
+        'id', 'user_id', 'court_id', 'date', 'duration_minutes', 'total_amount'
+    )
+    states = {booking_id: make_state(*values) for booking_id, *values in rows}
+
+    if states:
+        partners = Booking.partners.through.objects.filter(
+            booking_id__in=list(states)
+        ).values_list('booking_id', 'user_id')
+        for booking_id, partner_id in partners:
+            states[booking_id]['partner_ids'].append(partner_id)
+
+    return list(states.values())
+
+
+def _contributions(state):
+    """
+    Вклад бронирования в статистику каждого участника
+
+    Создатель платит за корт целиком, партнёр - свою долю (как price_per_person).
+    """
+    participants = [state['user_id'], *state['partner_ids']]
+    amount = state['amount']
+    share = (amount / len(participants)).quantize(Decimal('0.01')) if len(participants) > 1 else amount
+
+    for user_id in participants:
+        yield user_id, {
+            'spent': amount if user_id == state['user_id'] else share,
+            'partners': [other for other in participants if other != user_id],
+        }
+
+
+def _add(counts, key, delta):
+    key = str(key)
+    value = counts.get(key, 0) + delta
+    if value:
+        counts[key] = value
+    else:
+        counts.pop(key, None)
+
+
+def _apply_one(snapshot, state, contribution, sign):
+    snapshot.total_games += sign
+    snapshot.total_minutes += sign * state['minutes']
+    snapshot.total_spent += sign * contribution['spent']
+    _add(snapshot.court_counts, state['court_id'], sign)
+    for partner_id in contribution['partners']:
+        _add(snapshot.partner_counts, partner_id, sign)
+    _add(snapshot.monthly_games, state['date'].strftime('%Y-%m'), sign)
+    # Номер дня недели как в ExtractWeekDay: 1 - воскресенье, 7 - суббота
+    _add(snapshot.weekday_games, state['date'].isoweekday() % 7 + 1, sign)
+
+
+def apply(states, sign):
+    """
+    Применяет вклад бронирований к снимкам участников
+
+    Args:
+        states: Состояния бронирований (make_state / booking_states)
+        sign: 1 - добавить вклад, -1 - убрать
+
+    Отсутствующие снимки не создаются: они строятся целиком при первом чтении.
+    """
+    deltas = defaultdict(list)
+    for state in states:
+        for user_id, contribution in _contributions(state):
+            deltas[user_id].append((state, contribution))
+
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        snapshots = PlayerStatsSnapshot.objects.select_for_update().filter(
+            user_id__in=list(deltas)
+        ).order_by('user_id')
+
+        for snapshot in snapshots:
+            for state, contribution in deltas[snapshot.user_id]:
+                _apply_one(snapshot, state, contribution, sign)
+
+            if snapshot.total_games < 0 or snapshot.total_minutes < 0:
+                # Снимок разошёлся с базой - удаляем, он пересоберётся при чтении
+                logger.warning(f"Stats snapshot of user {snapshot.user_id} is inconsistent, dropping it")
+                snapshot.delete()
+                continue
+            snapshot.save()
+
+
+def _compute(user):
+    """Снимок игрока, посчитанный по всем его подтверждённым бронированиям"""
+    booking_ids = Booking.objects.filter(
+        Q(user=user) | Q(partners=user),
+        status='confirmed'
+    ).values('id')
+
+    snapshot = PlayerStatsSnapshot(user=user)
+    for state in booking_states(booking_ids):
+        for user_id, contribution in _contributions(state):
+            if user_id == user.id:
+                _apply_one(snapshot, state, contribution, 1)
+    return snapshot
+
+
+def rebuild_snapshot(user):
+    """Пересчитывает снимок игрока целиком"""
+    with transaction.atomic():
+        fresh = _compute(user)
+        snapshot, _ = PlayerStatsSnapshot.objects.select_for_update().get_or_create(user=user)
+        for field in STAT_FIELDS:
+            setattr(snapshot, field, getattr(fresh, field))
+        snapshot.save()
+
+    return snapshot
+
+
+def get_snapshot(user):
+    """Снимок игрока (строится при первом обращении)"""
+    try:
+        return PlayerStatsSnapshot.objects.get(user=user)
+    except PlayerStatsSnapshot.DoesNotExist:
+        logger.debug(f"Building stats snapshot for user {user.id}")
+        return rebuild_snapshot(user)
+
+
+def get_played_snapshot(user, today=None):
+    """
+    Снимок игрока только по сыгранным играм (дата не позже сегодняшней)
+
+    Снимок хранит все подтверждённые бронирования, чтобы его не нужно было
+    сдвигать каждый день. Вклад будущих игр вычитается при чтении
+    из несохраняемой копии.
+    """
+    today = today or timezone.now().date()
+    stored = get_snapshot(user)
+    snapshot = PlayerStatsSnapshot(user_id=user.id, **{
+        field: copy.deepcopy(getattr(stored, field)) for field in STAT_FIELDS
+    })
+
+    future_ids = Booking.objects.filter(
+        Q(user=user) | Q(partners=user),
+        status='confirmed',
+        date__gt=today
+    ).values('id')
+
+    for state in booking_states(future_ids):
+        for user_id, contribution in _contributions(state):
+            if user_id == user.id:
+                _apply_one(snapshot, state, contribution, -1)
+    return snapshot
+
+
+def rebuild_all(batch_size=2000):
+    """
+    Пересчитывает снимки всех игроков одним проходом по подтверждённым бронированиям
+
+    Returns:
+        Количество созданных снимков
+    """
+    snapshots = {}
+    booking_ids = list(
+        Booking.objects.filter(status='confirmed').order_by('id').values_list('id', flat=True)
+    )
+
+    for offset in range(0, len(booking_ids), batch_size):
+        for state in booking_states(booking_ids[offset:offset + batch_size]):
+            for user_id, contribution in _contributions(state):
+                if user_id not in snapshots:
+                    snapshots[user_id] = PlayerStatsSnapshot(user_id=user_id)
+                _apply_one(snapshots[user_id], state, contribution, 1)
+
+    with transaction.atomic():
+        PlayerStatsSnapshot.objects.all().delete()
+        PlayerStatsSnapshot.objects.bulk_create(snapshots.values(), batch_size=500)
+
+    return len(snapshots)
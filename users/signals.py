@@ -1,9 +1,11 @@
 # Создадим файл signals.py:
 from django.apps import AppConfig
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_delete, m2m_changed
 from django.dispatch import receiver
 from django.contrib.auth.models import User
+from booking.models import Booking
 from .models import PlayerRating
+from . import player_stats
 
 
 @receiver(post_save, sender=User)
@@ -17,6 +19,57 @@ def create_player_rating(sender, instance, created, **kwargs):
         )
 
 
+@receiver(post_save, sender=Booking)
+def update_player_stats_on_save(sender, instance, created, **kwargs):
+    """Подтверждение, отмена или изменение подтверждённого бронирования"""
+    loaded = None if created else Booking._stats_key(instance.loaded_state)
+    current = Booking._stats_key(instance.tracked_state())
+
+    if loaded == current:
+        return
+
+    was_confirmed = loaded is not None and loaded[0] == 'confirmed'
+    is_confirmed = current[0] == 'confirmed'
+    if not was_confirmed and not is_confirmed:
+        return
+
+    # save() не меняет партнёров - они одинаковы до и после
+    partner_ids = [] if created else list(instance.partners.values_list('id', flat=True))
+
+    if was_confirmed:
+        player_stats.apply([player_stats.make_state(*loaded[1:], partner_ids)], -1)
+    if is_confirmed:
+        player_stats.apply([player_stats.make_state(*current[1:], partner_ids)], 1)
+
+
+@receiver(m2m_changed, sender=Booking.partners.through)
+def update_player_stats_on_partners(sender, instance, action, reverse, pk_set, **kwargs):
+    """Смена партнёров: вклад бронирования убирается до изменения и добавляется после"""
+    if action not in ('pre_add', 'pre_remove', 'pre_clear', 'post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        booking_ids = [instance.pk]
+    elif action == 'pre_clear':
+        booking_ids = instance._stats_cleared_booking_ids = list(
+            sender.objects.filter(user_id=instance.pk).values_list('booking_id', flat=True)
+        )
+    elif action == 'post_clear':
+        booking_ids = getattr(instance, '_stats_cleared_booking_ids', [])
+    else:
+        booking_ids = list(pk_set or [])
+
+    if booking_ids:
+        sign = -1 if action.startswith('pre_') else 1
+        player_stats.apply(player_stats.booking_states(booking_ids), sign)
+
+
+@receiver(pre_delete, sender=Booking)
+def update_player_stats_on_delete(sender, instance, **kwargs):
+    # До удаления: партнёры удаляются вместе с бронированием без m2m_changed
+    player_stats.apply(player_stats.booking_states([instance.pk]), -1)
+
+
 # В apps.py добавим:
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
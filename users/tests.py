@@ -0,0 +1,156 @@
+from django.test import TestCase
+from django.contrib.auth.models import User
+from datetime import time, timedelta
+from unittest.mock import patch
+from django.utils import timezone
+
+from booking.models import Booking, Court
+
+
+class PlayerStatsSnapshotTest(TestCase):
+    """Статистика профиля считает только сыгранные игры"""
+
+    def test_future_games_are_not_counted(self):
+        from users.analytics import get_player_stats
+
+        court = Court.objects.create(name='Корт №1', description='', price_per_hour=1000)
+        user = User.objects.create_user(username='player')
+        partner = User.objects.create_user(username='partner')
+        today = timezone.now().date()
+
+        for days, hour in ((-7, 10), (0, 8), (5, 12), (30, 14)):
+            booking = Booking.objects.create(
+                user=user,
+                court=court,
+                date=today + timedelta(days=days),
+                start_time=time(hour, 0),
+                end_time=time(hour + 1, 30),
+                status='confirmed'
+            )
+            booking.partners.add(partner)
+
+        stats = get_player_stats(user)
+        self.assertEqual(stats['total_games'], 2)
+        self.assertEqual(stats['total_hours'], 3.0)
+        self.assertEqual(stats['total_spent'], 3000.0)
+        self.assertEqual(stats['upcoming_games'], 3)
+        self.assertEqual(stats['favorite_partners'][0]['games_count'], 2)
+        self.assertEqual(sum(day['games'] for day in stats['weekday_stats']), 2)
+
+        partner_stats = get_player_stats(partner)
+        self.assertEqual(partner_stats['total_games'], 2)
+        self.assertEqual(partner_stats['total_spent'], 1500.0)
+
+        # Будущие игры остаются в сохранённом снимке и войдут в статистику, когда наступят
+        self.assertEqual(user.stats_snapshot.total_games, 4)
+
+
+class DetailedWorkbookTest(TestCase):
+    """Подробный Excel-отчёт в режиме write-only"""
+
+    def test_sheets_rows_and_progress(self):
+        try:
+            import openpyxl
+        except ImportError:
+            self.skipTest('openpyxl не установлен')
+        from io import BytesIO
+        from users.excel_export import write_detailed_workbook
+
+        court = Court.objects.create(name='Корт №1', description='', price_per_hour=1000)
+        user = User.objects.create_user(
+            username='player', email='player@example.com', first_name='Иван', last_name='Петров'
+        )
+        end_date = timezone.now().date()
+        start_date = end_date - timedelta(days=6)
+        for day in range(5):
+            Booking.objects.create(
+                user=user,
+                court=court,
+                date=start_date + timedelta(days=day),
+                start_time=time(10, 0),
+                end_time=time(11, 30),
+                status='confirmed' if day % 2 == 0 else 'pending'
+            )
+
+        calls = []
+        output = BytesIO()
+        with patch('users.excel_export.EXCEL_CHUNK_SIZE', 2):
+            write_detailed_workbook(
+                start_date, end_date, output, progress=lambda done, total: calls.append((done, total))
+            )
+        self.assertEqual(calls, [(2, 5), (4, 5), (5, 5)])
+
+        output.seek(0)
+        wb = openpyxl.load_workbook(output, read_only=True)
+        self.assertEqual(wb.sheetnames, ['Сводка', 'Бронирования', 'Выручка по кортам', 'Клиенты'])
+
+        bookings = list(wb['Бронирования'].iter_rows(values_only=True))
+        self.assertEqual(len(bookings), 6)
+        self.assertEqual(bookings[0][0], 'ID')
+        self.assertEqual(bookings[1][2:7], ('10:00', '11:30', 'Корт №1', 'game', 'Иван Петров'))
+        self.assertEqual(bookings[1][10:], (90, 'confirmed', 1500))
+
+        courts = list(wb['Выручка по кортам'].iter_rows(values_only=True))
+        self.assertEqual(len(courts), 6)
+        self.assertEqual(sum(row[5] for row in courts[1:]), 4500)
+
+        clients = list(wb['Клиенты'].iter_rows(values_only=True))
+        self.assertEqual(clients[1][1:7], ('player', 'Иван Петров', 'player@example.com', 3, 4.5, 4500))
+        wb.close()
+
+
+class FrequentPartnersTest(TestCase):
+    """Частые партнёры: ранжирование по совместным играм и API подсказок"""
+
+    def setUp(self):
+        self.court = Court.objects.create(name='Корт №1', description='', price_per_hour=1000)
+        self.user = User.objects.create_user(username='player')
+        self.first = User.objects.create_user(username='first', first_name='Первый')
+        self.second = User.objects.create_user(username='second')
+        self.third = User.objects.create_user(username='third')
+        self.stranger = User.objects.create_user(username='stranger')
+        self.day = timezone.now().date() - timedelta(days=10)
+
+    def _booking(self, owner, partners, hour, status='confirmed'):
+        booking = Booking.objects.create(
+            user=owner,
+            court=self.court,
+            date=self.day,
+            start_time=time(hour, 0),
+            end_time=time(hour + 1, 0),
+            status=status
+        )
+        booking.partners.add(*partners)
+        return booking
+
+    def test_ranking_and_api(self):
+        from users.analytics import get_frequent_partners
+
+        self._booking(self.user, [self.first], 8)
+        self._booking(self.user, [self.first, self.second], 10)
+        # Игрок - партнёр в чужой брони: создатель и другие партнёры тоже соигроки
+        self._booking(self.third, [self.user, self.first], 12)
+        # Отменённые игры не учитываются
+        self._booking(self.user, [self.stranger], 14, status='cancelled')
+
+        partners = list(get_frequent_partners(self.user))
+        self.assertEqual([p.username for p in partners], ['first', 'second', 'third'])
+        self.assertEqual([p.games_count for p in partners], [3, 1, 1])
+
+        self.client.force_login(self.user)
+        url = '/booking/api/frequent-partners/'
+
+        response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200)
+        users = response.json()['users']
+        self.assertEqual([u['id'] for u in users], [self.first.id, self.second.id, self.third.id])
+        self.assertEqual(users[0]['full_name'], 'Первый')
+        self.assertEqual(users[0]['games_count'], 3)
+
+        response = self.client.get(url, {'limit': 'abc'}, secure=True)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
+
+        response = self.client.get(url, {'limit': -1}, secure=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 1)